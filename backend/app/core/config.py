@@ -26,16 +26,96 @@ class Settings(BaseSettings):
     SF311_SCOPE: str = "refresh_token read write openid"
     SF311_GRAPHQL_URL: str = "https://san-francisco2-production.spotmobile.net/graphql"
     
+    # Shared SF 311 HTTP client (one pooled, keep-alive client per process)
+    SF311_HTTP_MAX_CONNECTIONS: int = 20
+    SF311_HTTP_TIMEOUT: float = 15.0
+    # The system token is cached per process and served without touching the DB
+    # until REFRESH_MARGIN before expiry. MAX_AGE bounds how long an instance can
+    # keep serving a token that another instance (or /admin) has replaced.
+    SYSTEM_TOKEN_REFRESH_MARGIN_SECONDS: int = 300
+    SYSTEM_TOKEN_CACHE_MAX_AGE_SECONDS: int = 3600
+    # Refreshes are single-flight across instances; others wait this long for
+    # the refreshing instance's token before refreshing themselves.
+    SYSTEM_TOKEN_REFRESH_WAIT_SECONDS: float = 35.0
+    # Guest/fallback traffic is spread over this many system tokens (separate
+    # SystemConfig keys, least recently used first); a token that gets a 429
+    # from SF 311 is left out of rotation for EJECT_SECONDS.
+    SYSTEM_TOKEN_POOL_SIZE: int = 1
+    SYSTEM_TOKEN_EJECT_SECONDS: int = 60
+    # Proactive user token refresh: users are refreshed BATCH_SIZE at a time with
+    # up to CONCURRENCY requests in flight, one commit per batch. A run stops
+    # after the budget and the next one resumes from the stored user-id cursor.
+    TOKEN_REFRESH_BATCH_SIZE: int = 200
+    TOKEN_REFRESH_CONCURRENCY: int = 16
+    TOKEN_REFRESH_RUN_BUDGET_SECONDS: float = 45.0
+    
     # Twilio
     TWILIO_ACCOUNT_SID: str
     TWILIO_AUTH_TOKEN: str
     TWILIO_VERIFY_SERVICE_SID: str  # For phone verification
     TWILIO_FROM_NUMBER: Optional[str] = None  # For sending SMS alerts
+    # Public URL of /webhooks/twilio/status. When set, sends request delivery
+    # callbacks there and incoming callbacks are signature-checked against it.
+    # Unset: /webhooks/twilio/status answers 404.
+    TWILIO_STATUS_CALLBACK_URL: Optional[str] = None
+    # "unicode": emoji template (UCS-2, 70 chars/segment, usually 2-3 segments).
+    # "gsm7": emoji-free template trimmed to one 160-char GSM-7 segment.
+    SMS_ENCODING: str = "unicode"
+    
+    # SMS dispatcher: sends are paced to our sender's Twilio messages-per-second
+    # limit (1 for a long code, 3 toll-free, 100+ short code / Messaging Service)
+    # and run on a bounded thread pool. A 429 halves the rate, then it recovers.
+    SMS_RATE_PER_SECOND: float = 10.0
+    SMS_DISPATCH_CONCURRENCY: int = 8
+    SMS_MAX_THROTTLE_RETRIES: int = 3
+    # SMS outbox: workers lease pending reports in batches (FOR UPDATE SKIP
+    # LOCKED). An unsent row is retried once its lease expires; a run stops
+    # claiming new batches after the budget to stay inside the function timeout.
+    SMS_BATCH_SIZE: int = 100
+    SMS_LEASE_SECONDS: int = 300
+    SMS_RUN_BUDGET_SECONDS: float = 45.0
+    # Accepted sends are written to the idempotency ledger every N messages
+    SMS_LEDGER_FLUSH_SIZE: int = 10
+    # Buffered Twilio status callbacks folded into the ledger per batch
+    SMS_STATUS_BATCH_SIZE: int = 1000
+    # Retries: transient failures back off exponentially from BASE (capped at
+    # MAX) and are dead-lettered after MAX_ATTEMPTS; permanent errors immediately.
+    SMS_MAX_ATTEMPTS: int = 5
+    SMS_RETRY_BASE_SECONDS: int = 60
+    SMS_RETRY_MAX_SECONDS: int = 6 * 3600
+    # Digest mode: pending reports are held until they are DIGEST_WINDOW old,
+    # then each user's reports in a batch go out as one message.
+    SMS_DIGEST_ENABLED: bool = False
+    SMS_DIGEST_WINDOW_SECONDS: int = 120
+    # Optional cap on messages per user per hour; capped reports wait for a later run
+    SMS_USER_MAX_PER_HOUR: Optional[int] = None
     
     # Report Types (hardcoded defaults, can expand later)
     DEFAULT_REPORT_TYPE_ID: str = Field(default="963f1454-7c22-43be-aacb-3f34ae5d0dc7")  # Parking on sidewalk
     DEFAULT_REPORT_TYPE_NAME: str = Field(default="Parking on Sidewalk")
     
+    # Poller: alerts are grouped into (lat, lng) grid cells of this size (degrees)
+    # and one upstream query is issued per cell + report type. 0.002° ≈ 200m in SF.
+    POLL_CELL_SIZE_DEG: float = 0.002
+    # Max upstream queries in flight at once during a poll run
+    POLL_CONCURRENCY: int = 16
+    # Paginated fetch: page size adapts to each cell's observed ticket rate
+    # within [MIN, MAX]; MAX_PAGES caps upstream calls per cell per run.
+    POLL_MIN_PAGE_SIZE: int = 10
+    POLL_MAX_PAGE_SIZE: int = 100
+    POLL_MAX_PAGES: int = 5
+    # "cell": one nearby query per grid cell. "citywide": page through the
+    # citywide recently-opened stream per watched report type and match each
+    # ticket locally against a spatial index of alerts within POLL_MATCH_RADIUS_M.
+    POLL_MODE: str = "cell"
+    POLL_CITYWIDE_PAGE_SIZE: int = 100
+    POLL_CITYWIDE_MAX_PAGES: int = 20
+    POLL_MATCH_RADIUS_M: float = 150.0
+    # Pipeline mode: send SMS for newly matched reports in the same poll run
+    # instead of waiting for the next /cron/send-alerts (which stays the sweeper).
+    # Has no effect with SMS_DIGEST_ENABLED: new reports wait out the digest window.
+    POLL_NOTIFY_INLINE: bool = False
+    
     # Cron Job Auth (simple bearer token for Vercel Cron)
     CRON_SECRET: str
     
@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import Generator, Iterator, Optional
 
 from .config import settings
 from ..models.base import Base
@@ -14,6 +16,44 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+class RoundTripCounter:
+    """Number of statements + commits sent to the database inside count_db_round_trips()."""
+    
+    def __init__(self):
+        self.count = 0
+
+
+# Per-task counter, so concurrent requests in the same process don't mix counts
+_round_trip_counter: ContextVar[Optional[RoundTripCounter]] = ContextVar(
+    "round_trip_counter", default=None
+)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _round_trip_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+@event.listens_for(engine, "commit")
+def _count_commit(conn):
+    counter = _round_trip_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+@contextmanager
+def count_db_round_trips() -> Iterator[RoundTripCounter]:
+    """Count DB round-trips made by the current task (used by cron run summaries)."""
+    counter = RoundTripCounter()
+    token = _round_trip_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _round_trip_counter.reset(token)
+
+
 def get_db() -> Generator[Session, None, None]:
     """Dependency for FastAPI routes to get DB session."""
     db = SessionLocal()
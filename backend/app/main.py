@@ -12,7 +12,7 @@ from pathlib import Path
 
 from .core.config import settings
 from .core.database import init_db
-from .routes import auth, alerts, reports, cron, sf311_auth, admin
+from .routes import auth, alerts, reports, cron, sf311_auth, admin, webhooks
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -115,6 +115,7 @@ app.include_router(reports.router)
 app.include_router(cron.router)
 app.include_router(sf311_auth.router)
 app.include_router(admin.router)
+app.include_router(webhooks.router)
 
 # Serve static files for SEO and PWA
 static_dir = Path(__file__).parent / "static"
@@ -143,6 +144,10 @@ async def startup_event():
         init_db()
         logger.info("Database initialized successfully")
         
+        # Open the shared, connection-pooled SF 311 HTTP client
+        from .services.sf311 import sf311_client
+        sf311_client.start()
+        
         # Ensure system SF 311 token exists
         from .core.database import SessionLocal
         from .services.token_manager import TokenManager
@@ -162,6 +167,13 @@ async def startup_event():
         logger.info("Application will continue, database will retry on first request")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the pooled SF 311 HTTP client."""
+    from .services.sf311 import sf311_client
+    await sf311_client.aclose()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
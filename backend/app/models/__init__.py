@@ -1,6 +1,8 @@
 from .user import User
 from .alert import Alert
-from .report import Report
+from .report import Report, SMSStatus
 from .system_config import SystemConfig
+from .poll_cursor import PollCursor
+from .sms_delivery import SMSDelivery, SMSStatusEvent
 
-__all__ = ["User", "Alert", "Report", "SystemConfig"]
+__all__ = ["User", "Alert", "Report", "SMSStatus", "SystemConfig", "PollCursor", "SMSDelivery", "SMSStatusEvent"]
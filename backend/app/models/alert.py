@@ -15,6 +15,11 @@ class Alert(Base, TimestampMixin):
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     
+    # Computed once on write from `address` (services.address_utils.address_fields)
+    address_normalized = Column(String, nullable=True)
+    address_key = Column(String, nullable=True, index=True)  # "<number> <street> <suffix>"
+    address_key_version = Column(Integer, nullable=True)  # address_utils.ADDRESS_KEY_VERSION
+    
     # Report type (311 ticket_type_id)
     # For "parking on sidewalk": 963f1454-7c22-43be-aacb-3f34ae5d0dc7
     report_type_id = Column(String, nullable=False)
@@ -0,0 +1,31 @@
+"""
+Per-bucket high-water marks for incremental 311 polling.
+"""
+from sqlalchemy import Column, String, DateTime, Float
+from .base import Base, TimestampMixin
+
+
+class PollCursor(Base, TimestampMixin):
+    """Newest ticket seen for a poll bucket (grid cell + report type)."""
+    __tablename__ = "poll_cursors"
+
+    # Bucket key from services.poller.cell_key(), e.g. "<type_id>:18872:-61200"
+    key = Column(String, primary_key=True, index=True)
+    
+    # Max openedAt (else submittedAt) seen (UTC). Tickets at or before this are skipped.
+    last_seen_at = Column(DateTime, nullable=True)
+    
+    # Citywide buckets only. Set while a run that hit the page budget is being
+    # caught up: the endCursor to resume from (last_seen_at stays put until the
+    # gap is read)
+    end_cursor = Column(String, nullable=True)
+    
+    # Mark to move to once the catch-up completes
+    catchup_seen_at = Column(DateTime, nullable=True)
+    
+    # Moving average per poll run of new tickets (citywide) or of tickets within
+    # the cell's search radius (cells) — sizes the next run's pages
+    ticket_rate = Column(Float, nullable=True)
+
+    def __repr__(self):
+        return f"<PollCursor(key={self.key}, last_seen_at={self.last_seen_at})>"
@@ -1,9 +1,19 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
+import enum
+from datetime import datetime
 
 from .base import Base, TimestampMixin
 
 
+class SMSStatus(str, enum.Enum):
+    PENDING = "pending"  # waiting to be sent (or retried at sms_next_attempt_at)
+    SENT = "sent"
+    CANCELLED = "cancelled"  # alert (or its user) deleted/deactivated before sending
+    DEFERRED = "deferred"  # held for quiet hours until deliver_after (no deliver_after: user unverified)
+    DEAD = "dead"  # permanent error or out of attempts; never retried
+
+
 class Report(Base, TimestampMixin):
     __tablename__ = "reports"
 
@@ -16,12 +26,49 @@ class Report(Base, TimestampMixin):
     # Full report data from 311 API (JSON)
     report_data = Column(JSON, nullable=False)
     
+    # Ticket address, computed once on insert (services.address_utils.address_fields)
+    address_normalized = Column(String, nullable=True)
+    address_key = Column(String, nullable=True, index=True)  # "<number> <street> <suffix>"
+    address_key_version = Column(Integer, nullable=True)  # address_utils.ADDRESS_KEY_VERSION
+    
     # SMS notification status
     # Indexed for cron job queries (finding unsent reports)
     sms_sent = Column(Boolean, default=False, nullable=False, index=True)
     
+    # Delivery state machine (services.sms_outbox). sms_sent mirrors SENT /
+    # CANCELLED for existing readers.
+    sms_status = Column(Enum(SMSStatus), default=SMSStatus.PENDING, nullable=False)
+    sms_attempts = Column(Integer, default=0, nullable=False)
+    # Pending rows are due at this time; pushed back on retry and while leased
+    sms_next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+    sms_last_error = Column(String, nullable=True)
+    # Quiet hours: when the user's window ends. Set when a report is DEFERRED;
+    # kept afterwards so the deferred batch is sent as one digest.
+    deliver_after = Column(DateTime, nullable=True)
+    # Dispatch lane: 0 = paid account, 1 = free (set on insert). Lower goes first.
+    sms_priority = Column(Integer, default=1, nullable=False)
+    
+    # Outbox lease: a send worker claims a batch of due rows by stamping its
+    # owner id and an expiry (also pushing sms_next_attempt_at to the expiry),
+    # so other workers skip them until the lease runs out.
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    
+    # When the SMS went out. Reports coalesced into one digest share a value,
+    # so distinct values per user count messages (per-user rate cap).
+    sms_sent_at = Column(DateTime, nullable=True, index=True)
+    
     # Relationships
     alert = relationship("Alert", back_populates="reports")
 
+    __table_args__ = (
+        # Outbox scans only touch rows that are due
+        Index("ix_reports_sms_status_next_attempt", "sms_status", "sms_next_attempt_at"),
+        # Claim order: paid lane first, then oldest due
+        Index("ix_reports_sms_status_priority_next_attempt", "sms_status", "sms_priority", "sms_next_attempt_at"),
+        # Deferred rows are only looked at once due
+        Index("ix_reports_sms_status_deliver_after", "sms_status", "deliver_after"),
+    )
+
     def __repr__(self):
-        return f"<Report(id={self.id}, report_id={self.report_id}, sms_sent={self.sms_sent})>"
+        return f"<Report(id={self.id}, report_id={self.report_id}, sms_status={self.sms_status})>"
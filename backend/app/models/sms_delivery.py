@@ -0,0 +1,48 @@
+"""
+Idempotency ledger of SMS sends, plus the raw Twilio status callbacks that
+update it (services.sms_status).
+"""
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from .base import Base, TimestampMixin
+
+
+class SMSDelivery(Base, TimestampMixin):
+    """Twilio message accepted for a (report, recipient) — written as soon as the SID exists."""
+    __tablename__ = "sms_deliveries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), nullable=False, index=True)
+    phone = Column(String, nullable=False)
+    
+    # Twilio message SID (shared by the reports of one digest message)
+    twilio_sid = Column(String, nullable=False, index=True)
+    
+    # Latest delivery status from Twilio's status callback (queued, sent,
+    # delivered, undelivered, failed) and its error code, if any
+    status = Column(String, nullable=True)
+    error_code = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("report_id", "phone", name="uq_sms_deliveries_report_phone"),
+    )
+
+    def __repr__(self):
+        return f"<SMSDelivery(report_id={self.report_id}, phone={self.phone}, sid={self.twilio_sid})>"
+
+
+class SMSStatusEvent(Base, TimestampMixin):
+    """
+    One Twilio status callback, appended as received.
+
+    The webhook only inserts here; events are folded into sms_deliveries (and
+    failed sends back into the retry queue) in batches, then deleted.
+    """
+    __tablename__ = "sms_status_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    message_sid = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    error_code = Column(Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<SMSStatusEvent(sid={self.message_sid}, status={self.status})>"
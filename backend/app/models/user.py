@@ -26,6 +26,12 @@ class User(Base, TimestampMixin):
     sf311_refresh_token = Column(String, nullable=True)
     sf311_token_expires_at = Column(Integer, nullable=True)  # Unix timestamp
     
+    # Quiet hours: local "HH:MM" window (may wrap midnight) with no SMS.
+    # Alerts due inside it are deferred and sent as one digest when it ends.
+    quiet_hours_start = Column(String, nullable=True)
+    quiet_hours_end = Column(String, nullable=True)
+    timezone = Column(String, default="America/Los_Angeles", nullable=True)
+    
     # Relationships
     alerts = relationship("Alert", back_populates="user", cascade="all, delete-orphan")
 
@@ -9,6 +9,7 @@ import json
 
 from ..core.database import get_db
 from ..models import SystemConfig, User, Alert, Report
+from ..services.token_manager import system_token_key, system_token_pool
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -18,18 +19,23 @@ class SetTokenRequest(BaseModel):
     refresh_token: str
     expires_in: int
     obtained_at: int
+    slot: int = 0  # system token pool slot
 
 
 @router.post("/set-system-token")
 async def set_system_token(token_data: SetTokenRequest, db: Session = Depends(get_db)):
     """
-    Manually set the system SF 311 token.
+    Manually set the system SF 311 token (slot 0 unless `slot` is given).
     Use this to initialize the token with working credentials.
     """
+    if not 0 <= token_data.slot < len(system_token_pool.slots):
+        raise HTTPException(status_code=400, detail=f"slot must be 0..{len(system_token_pool.slots) - 1}")
+    key = system_token_key(token_data.slot)
+    
     try:
         # Check if system token already exists
         existing = db.query(SystemConfig).filter(
-            SystemConfig.key == "sf311_system_token"
+            SystemConfig.key == key
         ).first()
         
         token_dict = {
@@ -45,7 +51,7 @@ async def set_system_token(token_data: SetTokenRequest, db: Session = Depends(ge
             message = "System token updated"
         else:
             config = SystemConfig(
-                key="sf311_system_token",
+                key=key,
                 value=json.dumps(token_dict),
                 last_updated_timestamp=token_data.obtained_at,
             )
@@ -53,6 +59,8 @@ async def set_system_token(token_data: SetTokenRequest, db: Session = Depends(ge
             message = "System token created"
         
         db.commit()
+        # Drop this process's cached token so the next request reads the new one
+        system_token_pool.invalidate(token_data.slot)
         
         return {
             "status": "success",
@@ -110,6 +118,7 @@ async def get_stats(db: Session = Depends(get_db)):
             "reports": {
                 "total_stored": total_reports,
             },
+            "system_token_pool": system_token_pool.stats(),
         }
 
     except Exception as e:
@@ -10,6 +10,8 @@ from ..core.config import settings
 from ..models import User, Alert
 from ..schemas import AlertCreate, AlertUpdate, AlertResponse, SuccessResponse
 from ..services.geocoding import geocoding_service
+from ..services.spatial_index import alert_index
+from ..services.address_utils import address_fields
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
@@ -68,11 +70,13 @@ async def create_alert(
         report_type_id=report_type_id,
         report_type_name=report_type_name,
         active=True,
+        **address_fields(alert_data.address),
     )
     
     db.add(alert)
     db.commit()
     db.refresh(alert)
+    alert_index.upsert(alert)
     
     return alert
 
@@ -136,6 +140,12 @@ async def update_alert(
     db.commit()
     db.refresh(alert)
     
+    # Keep the in-process spatial index in step (it only holds active alerts)
+    if alert.active:
+        alert_index.upsert(alert)
+    else:
+        alert_index.remove(alert.id)
+    
     return alert
 
 
@@ -158,5 +168,6 @@ async def delete_alert(alert_id: int, phone: str, db: Session = Depends(get_db))
     
     db.delete(alert)
     db.commit()
+    alert_index.remove(alert_id)
     
     return SuccessResponse(success=True, message="Alert deleted")
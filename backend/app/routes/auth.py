@@ -7,7 +7,8 @@ from sqlalchemy.orm import Session
 
 from ..core.database import get_db
 from ..models import User
-from ..schemas import UserRegister, UserVerify, UserResponse, SuccessResponse
+from ..schemas import UserRegister, UserVerify, UserResponse, SuccessResponse, QuietHoursUpdate
+from ..services.sms_outbox import release_verified
 from ..services.twilio_verify import twilio_verify_service
 
 logger = logging.getLogger(__name__)
@@ -70,8 +71,9 @@ async def verify_phone(verify_data: UserVerify, db: Session = Depends(get_db)):
     if not success:
         raise HTTPException(status_code=400, detail="Invalid verification code")
     
-    # Mark user as verified
+    # Mark user as verified; reports held while unverified go back to the outbox
     user.verified = True
+    release_verified(db, user.id)
     db.commit()
     db.refresh(user)
     
@@ -97,3 +99,26 @@ async def get_current_user(phone: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     
     return user
+
+
+@router.put("/me/quiet-hours", response_model=UserResponse)
+async def set_quiet_hours(phone: str, quiet_hours: QuietHoursUpdate, db: Session = Depends(get_db)):
+    """
+    Set (or clear, with start/end null) the user's quiet hours.
+    Alerts that come due inside the window are sent as one digest when it ends.
+    """
+    user = db.query(User).filter(User.phone == phone).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if (quiet_hours.start is None) != (quiet_hours.end is None):
+        raise HTTPException(status_code=400, detail="Set both start and end, or neither")
+    
+    user.quiet_hours_start = quiet_hours.start
+    user.quiet_hours_end = quiet_hours.end
+    if quiet_hours.timezone:
+        user.timezone = quiet_hours.timezone
+    db.commit()
+    db.refresh(user)
+    
+    return user
@@ -3,17 +3,35 @@ Cron job endpoints for Vercel Cron.
 These endpoints should be called by Vercel Cron on a schedule.
 """
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 import logging
 
-from ..core.database import get_db
+from ..core.database import get_db, count_db_round_trips
 from ..core.config import settings
-from ..models import Alert, Report
+from ..models import Alert
 from ..schemas import SuccessResponse
-from ..services.sf311 import sf311_client
-from ..services.sms_alert import sms_alert_service
-from ..services.address_utils import addresses_match
+from ..services.sf311 import is_rate_limited, sf311_client, ticket_coordinates
+from ..services.spatial_index import alert_index
+from ..services.sms_outbox import deliver_reports, drain_outbox
+from ..services.sms_status import drain_status_events
+from ..services.poller import (
+    PollStats,
+    bucket_alerts,
+    bucket_alerts_by_type,
+    build_address_index,
+    fetch_bucket,
+    fetch_buckets,
+    load_cursors,
+    match_alert,
+    next_cursor_state,
+    next_ticket_rate,
+    page_size_for_rate,
+    save_cursors,
+    store_new_reports,
+    tickets_after,
+    tickets_in_radius,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -38,91 +56,189 @@ async def poll_311_reports(
     Poll 311 API for new reports matching active alerts.
     Run this every 5 minutes via Vercel Cron.
     """
-    # Get all active alerts
-    active_alerts = db.query(Alert).filter(Alert.active == True).all()
+    stats = PollStats()
+    with count_db_round_trips() as round_trips:
+        await _poll_reports(db, stats)
+    stats.db_round_trips = round_trips.count
     
-    if not active_alerts:
+    if not stats.alerts:
         return SuccessResponse(
             success=True,
             message="No active alerts to check"
         )
     
-    new_reports_count = 0
+    logger.info(f"Poll run complete: {stats.summary()}")
     
-    # Get system token for API calls (fallback if user doesn't have tokens)
-    from ..services.token_manager import TokenManager
-    system_token = await TokenManager.get_system_token(db)
+    return SuccessResponse(
+        success=True,
+        message=f"Polled reports. {stats.summary()}"
+    )
+
+
+async def _poll_reports(db: Session, stats: PollStats) -> None:
+    """Run one poll pass, accumulating counters into stats."""
+    # Get all active alerts (users eager-loaded: one query instead of N+1)
+    active_alerts = db.query(Alert).options(joinedload(Alert.user)).filter(
+        Alert.active == True
+    ).all()
     
-    for alert in active_alerts:
-        try:
-            # Get the user for this alert
-            user = alert.user
-            
-            # Try to get user-specific token, fall back to system token
+    if not active_alerts:
+        return
+    
+    stats.alerts = len(active_alerts)
+    
+    from ..services.token_manager import TokenManager, system_token_pool
+    
+    # One upstream query per (grid cell, report type) instead of one per alert.
+    # Nearby alerts share the same "recently opened" tickets, so the results are
+    # fanned back out to every alert in the bucket below.
+    # In citywide mode there is one bucket per report type instead, matched
+    # locally through a spatial index.
+    citywide = settings.POLL_MODE == "citywide"
+    buckets = bucket_alerts_by_type(active_alerts) if citywide else bucket_alerts(active_alerts)
+    # Paid accounts' buckets first: they start fetching (and win the
+    # concurrency slots) ahead of free ones, and their matches own a ticket
+    buckets.sort(key=lambda bucket: bucket.priority)
+    
+    # Sync the process-wide spatial index with the DB's view of active alerts:
+    # a rebuild only on cold start or when another instance changed alerts
+    if citywide:
+        alert_index.sync(active_alerts)
+    # Address index shared by every bucket: one hash probe per ticket
+    address_index = build_address_index(active_alerts)
+    
+    # Phase 1 (sequential): resolve a token per bucket. Token refresh writes to
+    # the DB session, which must not be shared across concurrent tasks.
+    for bucket in buckets:
+        # Use the first user in the bucket with their own tokens (spreads load
+        # across user credentials like before), fall back to a token from the
+        # system pool (round-robin, so fallback buckets spread across it too).
+        bucket.access_token = None
+        for alert in bucket.alerts:
             try:
-                access_token = await TokenManager.get_user_token(user, db)
-            except RuntimeError:
-                # User doesn't have tokens yet, use system token
-                access_token = system_token
-            
-            # Search for reports near this alert's location using raw token
-            reports = await sf311_client.search_reports(
-                latitude=alert.latitude,
-                longitude=alert.longitude,
-                ticket_type_id=alert.report_type_id,
-                limit=20,
-                scope="recently_opened",
-                access_token=access_token,
+                bucket.access_token = await TokenManager.get_user_token(alert.user, db)
+                break
+            except Exception:
+                # User doesn't have (working) tokens, try the next one
+                continue
+        if bucket.access_token is None:
+            bucket.access_token = await TokenManager.get_system_token(db)
+    
+    # High-water marks for every bucket, one query for the whole run
+    cursors = load_cursors(db, (bucket.key for bucket in buckets))
+    for bucket in buckets:
+        bucket.cursor = cursors.get(bucket.key)
+    
+    # Phase 2 (concurrent): upstream queries under a semaphore, pooled client.
+    # Cells page out to the edge of their search radius; a citywide bucket
+    # that runs out of page budget keeps its mark and resumes from its
+    # endCursor next run.
+    async def fetch(bucket):
+        return await fetch_bucket(sf311_client, bucket)
+    
+    results = await fetch_buckets(buckets, fetch, stats)
+    
+    # Phase 3 (sequential): drop tickets at/before each bucket's mark, match in
+    # memory, then dedupe + insert in bulk
+    candidates = {}
+    cursor_updates = {}
+    for bucket, page in results:
+        if isinstance(page, BaseException):
+            stats.failed_buckets += 1
+            if is_rate_limited(page):
+                # Takes a system token out of rotation (no-op for user tokens)
+                system_token_pool.report_rate_limited(bucket.access_token)
+            logger.error(
+                f"Error polling reports for bucket {bucket.key} "
+                f"(alerts {[a.id for a in bucket.alerts]}): {page}"
             )
+            continue
+        
+        mark = bucket.last_seen_at
+        # Cells: the last page runs past the search radius; nothing out there can match
+        tickets = tickets_in_radius(bucket, page.tickets)
+        reports, newest = tickets_after(tickets, mark)
+        stats.tickets_seen += len(tickets)
+        stats.tickets_skipped += len(tickets) - len(reports)
+        if page.truncated:
+            stats.truncated_buckets += 1
+            logger.warning(
+                f"Bucket {bucket.key} hit the page budget ({page.pages} pages), "
+                + ("resuming from its endCursor next run" if bucket.time_ordered else "keeping its mark")
+            )
+        
+        # Persist the cursor when it changes, or when the rate change would resize pages.
+        # Opened-order pages only hold new tickets; a cell's pages hold everything
+        # within its radius, so that is what sizes them.
+        # Compared with what is stored, so a cell's leftover endCursor is cleared
+        state = next_cursor_state(bucket, page, newest)
+        old_state = bucket.stored_state
+        old_rate = bucket.cursor.ticket_rate if bucket.cursor else None
+        rate = next_ticket_rate(old_rate, len(reports) if bucket.time_ordered else len(tickets))
+        if state != old_state or page_size_for_rate(rate) != bucket.page_size:
+            cursor_updates[bucket.key] = (*state, rate)
+        
+        if not reports:
+            # Quiet cell: nothing newer than the mark, no DB work
+            stats.quiet_buckets += 1
+            continue
+        
+        # Match each ticket to the bucket's alerts by parsed address: a probe on
+        # (number, street name), so "580 California St" matches
+        # "580 California St, San Francisco, CA" and "61 Chattanooga Street"
+        # matches "61 Chattanooga St", but "1 Main St" no longer matches
+        # "11 Main St". Alerts without a street number still match fuzzily.
+        bucket_alert_ids = {alert.id for alert in bucket.alerts}
+        for report_data in reports:
+            report_id = report_data.get("id")
+            if not report_id or report_id in candidates:
+                continue
             
-            # Filter reports to address match.
-            # Uses fuzzy normalization (abbreviations + substring) so that
-            # "580 California St" matches "580 California St, San Francisco, CA"
-            # and "61 Chattanooga Street" matches "61 Chattanooga St".
-            # Previously used exact case-insensitive match which would NEVER fire
-            # because geocoded alert addresses include city/state suffix that SF311 omits.
-            for report_data in reports:
-                report_address = report_data.get("address", "").strip()
-                
-                if not addresses_match(report_address, alert.address):
-                    continue
-                
-                report_id = report_data.get("id")
-                if not report_id:
-                    continue
-                
-                # Check if we've already stored this report
-                existing_report = db.query(Report).filter(
-                    Report.report_id == report_id
-                ).first()
-                
-                if existing_report:
-                    continue
-                
-                # Store new report
-                new_report = Report(
-                    alert_id=alert.id,
-                    report_id=report_id,
-                    report_data=report_data,
-                    sms_sent=False,
-                )
-                db.add(new_report)
-                new_reports_count += 1
-                logger.info(
-                    f"[Alert {alert.id}] New report found for '{alert.address}' - "
-                    f"Report ID: {report_id}, Type: {report_data.get('ticketType', {}).get('name', 'Unknown')}"
-                )
-            
-            db.commit()
+            # Citywide: only alerts near the ticket (grid lookup + bbox prefilter)
+            alert_ids = bucket_alert_ids
+            coords = ticket_coordinates(report_data) if bucket.citywide else None
+            if coords:
+                alert_ids = set(alert_index.within(
+                    coords[0], coords[1], settings.POLL_MATCH_RADIUS_M, bucket.report_type_id
+                ))
             
-        except Exception as e:
-            logger.error(f"Error polling reports for alert {alert.id}: {e}")
-            continue
+            # report_id is unique — first matching alert owns it
+            alert = match_alert(report_data, address_index, alert_ids)
+            if alert is not None:
+                candidates[report_id] = (alert, report_data)
     
-    return SuccessResponse(
-        success=True,
-        message=f"Polled reports. Found {new_reports_count} new matches."
-    )
+    try:
+        inserted = store_new_reports(db, candidates)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error storing {len(candidates)} matched reports: {e}")
+        raise HTTPException(status_code=500, detail="Failed to store matched reports")
+    
+    stats.new_reports = len(inserted)
+    
+    # Advance marks only after the matched tickets are safely stored
+    try:
+        save_cursors(db, cursor_updates)
+    except Exception as e:
+        # Not fatal: next run re-reads from the old marks and dedupes on report_id
+        db.rollback()
+        logger.error(f"Error saving {len(cursor_updates)} poll cursors: {e}")
+    
+    for report_id in inserted:
+        alert, report_data = candidates[report_id]
+        logger.info(
+            f"[Alert {alert.id}] New report found for '{alert.address}' - "
+            f"Report ID: {report_id}, Type: {report_data.get('ticketType', {}).get('name', 'Unknown')}"
+        )
+    
+    # Pipeline mode: text the new matches now rather than on the next
+    # /cron/send-alerts run. Failures are left pending for that sweeper.
+    if settings.POLL_NOTIFY_INLINE and inserted:
+        try:
+            stats.delivery = await deliver_reports(db, inserted)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Inline delivery of {len(inserted)} reports failed: {e}")
 
 
 @router.post("/send-alerts", response_model=SuccessResponse)
@@ -134,50 +250,33 @@ async def send_pending_alerts(
     Send SMS alerts for reports that haven't been sent yet.
     Run this every 5 minutes via Vercel Cron.
     """
-    # Get all reports that need SMS sent
-    pending_reports = db.query(Report).filter(Report.sms_sent == False).all()
+    # Fold buffered Twilio status callbacks into the delivery ledger first,
+    # so undelivered messages are back in the outbox for this run
+    status_message = ""
+    try:
+        status_stats = drain_status_events(db)
+        if status_stats.events:
+            status_message = f" Delivery status: {status_stats.summary()}."
+            logger.info(f"Applied SMS status callbacks: {status_stats.summary()}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error applying SMS status callbacks: {e}")
     
-    if not pending_reports:
+    # Claim pending reports in leased batches (safe with overlapping runs),
+    # send each batch concurrently and commit it before claiming the next
+    stats = await drain_outbox(db)
+    
+    if not stats.claimed:
         return SuccessResponse(
             success=True,
-            message="No pending alerts to send"
+            message="No pending alerts to send" + (f".{status_message}" if status_message else "")
         )
     
-    sent_count = 0
-    
-    for report in pending_reports:
-        try:
-            # Get the alert and user info
-            alert = report.alert
-            if not alert or not alert.active:
-                # Alert was deleted or deactivated, skip
-                report.sms_sent = True  # Mark as sent to avoid retrying
-                continue
-            
-            user = alert.user
-            if not user or not user.verified:
-                # User not verified, skip
-                continue
-            
-            # Send SMS alert
-            success = sms_alert_service.send_alert(
-                to_phone=user.phone,
-                report_data=report.report_data
-            )
-            
-            if success:
-                report.sms_sent = True
-                sent_count += 1
-            
-        except Exception as e:
-            logger.error(f"Error sending alert for report {report.id}: {e}")
-            continue
-    
-    db.commit()
+    logger.info(f"Send run complete: {stats.summary()}")
     
     return SuccessResponse(
         success=True,
-        message=f"Sent {sent_count} SMS alerts"
+        message=f"Sent {stats.sent} SMS alerts. {stats.summary()}.{status_message}"
     )
 
 
@@ -198,12 +297,16 @@ async def refresh_sf311_tokens(
         # Refresh system token
         await TokenManager.refresh_system_token_proactively(db)
         
-        # Refresh user tokens expiring within 24 hours
+        # Refresh user tokens expiring within 24 hours (batched, concurrent,
+        # resumes from its cursor if the previous run ran out of time)
         user_results = await TokenManager.refresh_user_tokens_proactively(db)
         
         return {
             "success": True,
-            "message": "Token refresh complete",
+            "message": (
+                "Token refresh complete" if user_results["complete"]
+                else f"Token refresh paused after user {user_results['cursor']}; the next run resumes there"
+            ),
             "system_token": "refreshed",
             "user_tokens": user_results,
         }
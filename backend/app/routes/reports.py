@@ -19,8 +19,8 @@ logger = logging.getLogger(__name__)
 from ..core.database import get_db
 from ..models import User, Report, Alert
 from ..schemas import ReportResponse
-from ..services.token_manager import TokenManager
-from ..services.address_utils import normalize_addr, addresses_match
+from ..services.token_manager import TokenManager, system_token_pool
+from ..services.address_utils import normalize_addr, AddressIndex
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
@@ -163,6 +163,9 @@ async def get_nearby_reports(
             logger.warning("SF311 recently_opened fetch failed: %s", results[0])
         if isinstance(results[1], BaseException):
             logger.warning("SF311 recently_closed fetch failed: %s", results[1])
+        if any(isinstance(r, urllib.error.HTTPError) and r.code == 429 for r in results):
+            # Rotate this system token out for a while; later requests use the others
+            system_token_pool.report_rate_limited(token)
         raw_tickets = opened_tickets + closed_tickets
         
         # Deduplicate by ticket ID (same ticket can appear in both recently_opened and recently_closed)
@@ -234,29 +237,13 @@ async def get_nearby_reports(
         
         # Filter by address if provided
         if address:
-            # Normalize the target address
-            target_addr = _normalize_addr(address)
+            # Same matcher as the poller: the target address is parsed once and
+            # each ticket is a probe on (number, street name), falling back to
+            # the fuzzy substring match only when the target has no number.
+            target_index = AddressIndex()
+            target_index.add(address, True)
             
-            # Filter to only include tickets that match the address
-            filtered_reports = []
-            for r in reports:
-                ticket_addr = _normalize_addr(r["report"].address)
-                
-                # Extract street number and name for comparison
-                # E.g., "61 Chattanooga St" -> "61 chattanooga st"
-                if target_addr in ticket_addr or ticket_addr in target_addr:
-                    filtered_reports.append(r)
-                # Also try matching just the street number
-                elif address.split()[0].isdigit():
-                    target_number = address.split()[0]
-                    if ticket_addr.startswith(target_number + " "):
-                        # Same street number - check if street name matches
-                        target_street = " ".join(target_addr.split()[1:])
-                        ticket_street = " ".join(ticket_addr.split()[1:])
-                        if target_street in ticket_street or ticket_street in target_street:
-                            filtered_reports.append(r)
-            
-            reports = filtered_reports
+            reports = [r for r in reports if target_index.lookup(r["report"].address)]
         
         # Sort by distance (closest first) — most spatially relevant for map exploration.
         # Ties (same distance) break on recency (newest first) so fresh reports surface naturally.
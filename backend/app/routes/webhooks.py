@@ -0,0 +1,52 @@
+"""
+Inbound webhooks from third-party services.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from twilio.request_validator import RequestValidator
+from urllib.parse import parse_qsl
+import logging
+
+from ..core.config import settings
+from ..core.database import get_db
+from ..services.sms_status import record_status_event
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+
+
+@router.post("/twilio/status", status_code=204)
+async def twilio_status_callback(request: Request, db: Session = Depends(get_db)):
+    """
+    Twilio message status callback (configured via TWILIO_STATUS_CALLBACK_URL).
+
+    Only appends the event and returns, so callback bursts stay cheap; events
+    are applied to the delivery ledger in batches by /cron/send-alerts.
+
+    Without TWILIO_STATUS_CALLBACK_URL there is nothing to check signatures
+    against, so the endpoint is disabled (404) rather than accepting unsigned
+    events.
+    """
+    if not settings.TWILIO_STATUS_CALLBACK_URL:
+        raise HTTPException(status_code=404, detail="Status callbacks are not enabled")
+    
+    params = dict(parse_qsl((await request.body()).decode()))
+    
+    validator = RequestValidator(settings.TWILIO_AUTH_TOKEN)
+    signature = request.headers.get("X-Twilio-Signature", "")
+    if not validator.validate(settings.TWILIO_STATUS_CALLBACK_URL, params, signature):
+        raise HTTPException(status_code=403, detail="Invalid Twilio signature")
+    
+    if not params.get("MessageSid"):
+        raise HTTPException(status_code=400, detail="Missing MessageSid")
+    
+    try:
+        record_status_event(db, params)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error recording status callback for {params.get('MessageSid')}: {e}")
+        # 5xx makes Twilio retry the callback
+        raise HTTPException(status_code=500, detail="Failed to record status")
+    
+    return Response(status_code=204)
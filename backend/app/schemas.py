@@ -6,6 +6,7 @@ from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 import re
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
 # ============ User Schemas ============
@@ -58,12 +59,43 @@ class UserResponse(BaseModel):
     phone: str
     verified: bool
     account_type: AccountType
+    quiet_hours_start: Optional[str] = None
+    quiet_hours_end: Optional[str] = None
+    timezone: Optional[str] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
 
+class QuietHoursUpdate(BaseModel):
+    # Both null to turn quiet hours off
+    start: Optional[str] = Field(None, description="Local start time, HH:MM (e.g. 22:00)")
+    end: Optional[str] = Field(None, description="Local end time, HH:MM (e.g. 07:00)")
+    timezone: Optional[str] = Field(None, description="IANA timezone (default America/Los_Angeles)")
+    
+    @field_validator('start', 'end')
+    @classmethod
+    def validate_hhmm(cls, v: Optional[str]) -> Optional[str]:
+        if v is None:
+            return v
+        match = re.fullmatch(r'([01]?\d|2[0-3]):([0-5]\d)', v.strip())
+        if not match:
+            raise ValueError("Time must be HH:MM (24-hour), e.g. 22:00")
+        return f"{int(match.group(1)):02d}:{match.group(2)}"
+    
+    @field_validator('timezone')
+    @classmethod
+    def validate_timezone(cls, v: Optional[str]) -> Optional[str]:
+        if v is None:
+            return v
+        try:
+            ZoneInfo(v)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {v}")
+        return v
+
+
 # ============ Alert Schemas ============
 
 class AlertCreate(BaseModel):
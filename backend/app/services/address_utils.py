@@ -3,41 +3,290 @@ Address normalization and matching utilities.
 
 Shared between routes/reports.py (nearby API) and routes/cron.py (alert matching)
 so both use the same fuzzy-match logic for street type abbreviations.
+
+Addresses are parsed into a structured form (parse_address: number, number
+range, street name, suffix, unit, intersection). Alerts persist their normalized
+address and canonical key ("<number> <street name> <suffix>") computed once on
+write, and AddressIndex turns ticket -> alert matching into a hash probe
+on (number, street name), falling back to the fuzzy substring path only for
+addresses without a street number.
 """
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Full street type → abbreviation (13 common types). The alternation below is
+# built in this order, longer names first, matching the original replace chain.
+STREET_TYPE_ABBREVIATIONS = {
+    "boulevard": "blvd",
+    "terrace": "ter",
+    "avenue": "ave",
+    "street": "st",
+    "drive": "dr",
+    "court": "ct",
+    "place": "pl",
+    "lane": "ln",
+    "road": "rd",
+    "circle": "cir",
+    "highway": "hwy",
+    "parkway": "pkwy",
+    "square": "sq",
+}
+
+# Street suffix tokens as they appear after normalize_addr()
+STREET_SUFFIXES = frozenset(STREET_TYPE_ABBREVIATIONS.values()) | {"way", "aly", "alley"}
+
+_STREET_TYPE_RE = re.compile(" (?:" + "|".join(STREET_TYPE_ABBREVIATIONS) + ")")
+_SPACED_ABBREVIATIONS = {f" {full}": f" {abbr}" for full, abbr in STREET_TYPE_ABBREVIATIONS.items()}
+
+
+def _abbreviate(match: "re.Match[str]") -> str:
+    return _SPACED_ABBREVIATIONS[match.group()]
 
 
+@lru_cache(maxsize=8192)
 def normalize_addr(a: str) -> str:
     """
     Normalize street-type abbreviations for address fuzzy matching.
     Covers 13 common street types, applied symmetrically to both query and ticket address.
-    Defined at module level so it's compiled once at import time (not per-request).
+
+    Single pass: after lowercasing and dropping punctuation, every street type
+    is abbreviated by one precompiled regex alternation. Results are
+    memoized on the raw string — the same alert/ticket addresses recur on every
+    poll run. Output is identical to the old chain of 15 str.replace calls
+    (scripts/bench_address_normalizer.py checks this on real SF311 addresses).
 
     Examples:
         "580 California Street, San Francisco, CA" → "580 california st san francisco ca"
         "580 California St"                         → "580 california st"
     """
-    a = a.lower().strip()
-    # Remove punctuation
-    a = a.replace(".", "").replace(",", "")
-    # Full → abbreviated (longer strings first to avoid partial matches)
-    replacements = [
-        (" boulevard", " blvd"),
-        (" terrace", " ter"),
-        (" avenue", " ave"),
-        (" street", " st"),
-        (" drive", " dr"),
-        (" court", " ct"),
-        (" place", " pl"),
-        (" lane", " ln"),
-        (" road", " rd"),
-        (" circle", " cir"),
-        (" highway", " hwy"),
-        (" parkway", " pkwy"),
-        (" square", " sq"),
-    ]
-    for full, abbr in replacements:
-        a = a.replace(full, abbr)
-    return a
+    # str.replace beats str.translate for deleting two characters
+    a = a.lower().strip().replace(".", "").replace(",", "")
+    return _STREET_TYPE_RE.sub(_abbreviate, a)
+
+
+# Unit designators ("Apt 4", "Suite 400", "#2") — matched on the raw lowercase text
+_UNIT_RE = re.compile(r"(?:\b(?:apt|apartment|unit|ste|suite|rm|room|fl|floor)\b\.?|#)\s*([\w-]+)")
+# Street number, optionally a range ("100-110") and/or a letter ("12a")
+_NUMBER_RE = re.compile(r"^(\d+)(?:-(\d+))?[a-z]?$")
+# Separators between the two streets of an intersection
+_INTERSECTION_SPLIT_RE = re.compile(r"\s*(?:&|/|\band\b)\s*")
+_ORDINAL_ENDINGS = frozenset({"st", "nd", "rd", "th"})
+# Street numbers probed for a ticket with a number range
+MAX_RANGE_PROBES = 50
+# Bump whenever parse_address() can produce a different key for the same input;
+# persisted keys with another version are ignored until recomputed
+# (scripts/add_address_key_version.py). 1 = pre-parser keys, 2 = parse_address.
+ADDRESS_KEY_VERSION = 2
+
+
+@dataclass(frozen=True)
+class ParsedAddress:
+    """
+    Structured form of a street address.
+
+        "580 California Street, San Francisco, CA" → number="580", street="california", suffix="st"
+        "100-110 Main St"                          → number="100", number_high="110", street="main"
+        "1000 Bush Street, Apt. 4"                 → ..., unit="4"
+        "Intersection Annie St, Stevenson St"      → street="annie", suffix="st", cross_street="stevenson st"
+    """
+    number: Optional[str] = None
+    number_high: Optional[str] = None
+    street: Optional[str] = None
+    suffix: Optional[str] = None
+    unit: Optional[str] = None
+    cross_street: Optional[str] = None
+
+    @property
+    def is_intersection(self) -> bool:
+        return self.cross_street is not None
+
+    @property
+    def key(self) -> Optional[str]:
+        """Canonical "<number> <street name> <suffix>", or None when ambiguous."""
+        if self.number and self.street and self.suffix and not self.number_high and not self.is_intersection:
+            return f"{self.number} {self.street} {self.suffix}"
+        return None
+
+    @property
+    def intersection_key(self) -> Optional[str]:
+        """Order-independent key for an intersection ("annie st & stevenson st")."""
+        if not self.is_intersection:
+            return None
+        first = f"{self.street} {self.suffix}" if self.suffix else self.street
+        return " & ".join(sorted([first, self.cross_street]))
+
+    def street_probes(self) -> List[Tuple[str, str]]:
+        """(number, street name) keys to look up; a number range probes each same-parity number."""
+        if not self.number or not self.street or self.is_intersection:
+            return []
+        if not self.number_high:
+            return [(self.number, self.street)]
+        low, high = int(self.number), int(self.number_high)
+        if high < low or (high - low) // 2 >= MAX_RANGE_PROBES:
+            return [(self.number, self.street)]
+        return [(str(n), self.street) for n in range(low, high + 1, 2)]
+
+
+def _street_name_and_suffix(tokens: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Split normalized street tokens into (name, suffix); anything after the suffix is dropped."""
+    # SF311 splits ordinals: "32 11 Th St" → street "11th"
+    merged: List[str] = []
+    for i, token in enumerate(tokens):
+        if merged and merged[-1].isdigit() and token in _ORDINAL_ENDINGS and i + 1 < len(tokens):
+            merged[-1] += token
+        else:
+            merged.append(token)
+
+    name: List[str] = []
+    for token in merged:
+        # "St" right after the number is "Saint" (e.g. "100 St Francis Blvd")
+        if token in STREET_SUFFIXES and name:
+            return " ".join(name), token
+        name.append(token)
+    return (" ".join(name) or None), None
+
+
+@lru_cache(maxsize=8192)
+def parse_address(addr: Optional[str]) -> ParsedAddress:
+    """Parse a street address, street range, or intersection (see ParsedAddress)."""
+    if not addr:
+        return ParsedAddress()
+    raw = addr.lower().strip()
+
+    # Intersections: "Intersection Annie St, Stevenson St", "Mission St & 16th St"
+    is_intersection = raw.startswith("intersection")
+    if is_intersection:
+        raw = re.sub(r"^intersection(?:\s+of)?\s+", "", raw)
+        parts = [p for p in re.split(r"\s*(?:,|&|/|\band\b)\s*", raw) if p]
+    else:
+        parts = [p for p in _INTERSECTION_SPLIT_RE.split(raw.split(",")[0]) if p]
+    if len(parts) >= 2 and (is_intersection or not _NUMBER_RE.match(parts[0].split()[0])):
+        street, suffix = _street_name_and_suffix(normalize_addr(parts[0]).split())
+        cross_name, cross_suffix = _street_name_and_suffix(normalize_addr(parts[1]).split())
+        if street and cross_name:
+            cross = f"{cross_name} {cross_suffix}" if cross_suffix else cross_name
+            return ParsedAddress(street=street, suffix=suffix, cross_street=cross)
+
+    unit_match = _UNIT_RE.search(raw)
+    unit = unit_match.group(1) if unit_match else None
+
+    # Street part is everything before the first comma, minus any unit designator
+    street_part = raw.split(",")[0]
+    if unit_match and unit_match.start() < len(street_part):
+        street_part = street_part[:unit_match.start()]
+    tokens = normalize_addr(street_part).split()
+    if not tokens:
+        return ParsedAddress(unit=unit)
+
+    number = number_high = None
+    number_match = _NUMBER_RE.match(tokens[0])
+    if number_match:
+        number, number_high = number_match.group(1), number_match.group(2)
+        tokens = tokens[1:]
+
+    street, suffix = _street_name_and_suffix(tokens)
+    return ParsedAddress(
+        number=number,
+        number_high=number_high,
+        street=street,
+        suffix=suffix,
+        unit=unit,
+    )
+
+
+def address_key(addr: Optional[str]) -> Optional[str]:
+    """
+    Canonical "<number> <street name> <suffix>" key, or None when ambiguous.
+
+    Anything after the suffix (city, state, zip, unit) is dropped, so both
+    "580 California Street, San Francisco, CA" and "580 California St" give
+    "580 california st". Addresses without a plain street number or without a
+    recognizable suffix return None and are matched fuzzily instead.
+    """
+    return parse_address(addr).key
+
+
+def address_fields(addr: Optional[str]) -> Dict[str, Optional[str]]:
+    """Persisted address columns (address_normalized, address_key + its version) for a raw address."""
+    return {
+        "address_normalized": normalize_addr(addr) if addr else None,
+        "address_key": address_key(addr),
+        "address_key_version": ADDRESS_KEY_VERSION,
+    }
+
+
+class AddressIndex(Generic[T]):
+    """
+    Dictionary index of addresses (alerts, or a single search address) for
+    O(1) ticket matching.
+
+    Entries with a street number + name are keyed by (number, street name) and
+    a ticket is matched with a hash probe (one per number for ranges), checking
+    that suffixes agree when both sides have one — so "1 Main St" never matches
+    "11 Main St". Intersections are keyed by their two streets. Only entries
+    without a number (e.g. "Market St", "Golden Gate Park") fall back to the
+    fuzzy substring match, and only against keyed tickets' normalized text.
+    """
+
+    def __init__(self):
+        self._streets: Dict[Tuple[str, str], List[Tuple[Optional[str], T]]] = {}
+        self._intersections: Dict[str, List[T]] = {}
+        self._fuzzy: List[Tuple[str, T]] = []
+
+    def add(
+        self,
+        address: str,
+        item: T,
+        key: Optional[str] = None,
+        normalized: Optional[str] = None,
+    ) -> None:
+        """
+        Index an item under its address. `key` and `normalized` are the optional
+        pre-computed address_key / address_normalized (persisted columns); a key
+        skips parsing, and a normalized address is used as-is for fuzzy entries.
+        """
+        if key:
+            number, rest = key.split(" ", 1)
+            street, suffix = rest.rsplit(" ", 1)
+            self._streets.setdefault((number, street), []).append((suffix, item))
+            return
+
+        parsed = parse_address(address)
+        probes = parsed.street_probes()
+        if probes:
+            for probe in probes:
+                self._streets.setdefault(probe, []).append((parsed.suffix, item))
+        elif parsed.is_intersection:
+            self._intersections.setdefault(parsed.intersection_key, []).append(item)
+        elif address:
+            self._fuzzy.append((normalized or normalize_addr(address), item))
+
+    def lookup(self, address: str) -> List[T]:
+        """Items whose address matches the given (ticket) address."""
+        if not address:
+            return []
+        parsed = parse_address(address)
+        hits: List[T] = []
+
+        for probe in parsed.street_probes():
+            for suffix, item in self._streets.get(probe, ()):
+                if suffix and parsed.suffix and suffix != parsed.suffix:
+                    continue
+                hits.append(item)
+        if parsed.is_intersection:
+            hits.extend(self._intersections.get(parsed.intersection_key, ()))
+
+        if self._fuzzy:
+            normalized = normalize_addr(address)
+            hits.extend(
+                item for entry_normalized, item in self._fuzzy
+                if normalized_addresses_match(normalized, entry_normalized)
+            )
+        return hits
 
 
 def addresses_match(addr1: str, addr2: str) -> bool:
@@ -53,8 +302,13 @@ def addresses_match(addr1: str, addr2: str) -> bool:
     Also applies street-number-only logic: if one address starts with a digit,
     verify the street number matches before doing the substring check.
     """
-    n1 = normalize_addr(addr1)
-    n2 = normalize_addr(addr2)
+    return normalized_addresses_match(normalize_addr(addr1), normalize_addr(addr2))
+
+
+def normalized_addresses_match(n1: str, n2: str) -> bool:
+    """addresses_match() on already-normalized addresses."""
+    if not n1 or not n2:
+        return False
 
     # Fast path: direct substring match
     if n1 in n2 or n2 in n1:
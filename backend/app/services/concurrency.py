@@ -0,0 +1,33 @@
+"""
+Bounded-concurrency helper for fan-out over upstream calls.
+
+Dependency-free on purpose: the poller (SF 311 bucket fetches) and the token
+manager (user token refresh) both use it, and importing one must not pull in
+the other's stack (SMS outbox, Twilio, ...).
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+async def run_bounded(
+    items: List[T],
+    worker: Callable[[T], Awaitable[Any]],
+    concurrency: int,
+) -> List[Tuple[T, Any]]:
+    """
+    Run worker(item) for every item with at most `concurrency` in flight.
+
+    Returns (item, result) pairs in input order. A worker exception is returned
+    as the result instead of raised, so one failing upstream call doesn't abort
+    the whole run — callers check isinstance(result, BaseException).
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def _run(item: T) -> Any:
+        async with semaphore:
+            return await worker(item)
+
+    results = await asyncio.gather(*(_run(item) for item in items), return_exceptions=True)
+    return list(zip(items, results))
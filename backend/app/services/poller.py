@@ -0,0 +1,512 @@
+"""
+Alert polling helpers for the /cron/poll-reports job.
+
+Active alerts are grouped into buckets keyed by a quantized (lat, lng) grid cell
+plus report type. One upstream SF311 query is issued per bucket and the returned
+tickets are fanned back out to every alert in that bucket, so upstream call
+volume grows with the number of distinct cells instead of the number of alerts.
+
+Upstream queries run concurrently under a semaphore (POLL_CONCURRENCY), so a run
+takes roughly max-latency × (buckets / concurrency) instead of sum-of-latencies.
+
+Each bucket keeps a high-water mark (PollCursor): tickets opened at or before
+the newest one already processed are dropped before any matching or DB work, so
+a quiet cell costs one cursor lookup (shared by the whole run) and nothing else.
+
+A cell's query is ordered by distance from its alerts, so it is read from the
+top every run and paging stops at the first page reaching past the cell's
+search radius (its farthest alert + POLL_MATCH_RADIUS_M): a quiet cell costs
+one call. Pages are sized from the number of tickets the cell had within its
+radius on recent runs. Cells persist only their high-water mark.
+
+The citywide stream is in opened order and is paged (pageInfo.endCursor) down
+to the mark. When the page budget runs out first, the mark stays where it was
+and the next run resumes from the saved endCursor, so the unread tickets are
+caught up rather than skipped (see fetch_bucket()).
+
+In citywide mode (POLL_MODE="citywide") there is one bucket per watched report
+type instead: the citywide recently-opened stream is paged through once and each
+ticket is matched locally against a spatial index of that type's alerts, so
+upstream cost follows ticket volume rather than alert count.
+
+Ticket -> alert address matching goes through one AddressIndex built per run,
+so each ticket costs a dict probe on (number, street name) rather than a scan
+of the bucket's alerts.
+"""
+import math
+import time
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import Alert, PollCursor, Report, SMSStatus
+from .address_utils import ADDRESS_KEY_VERSION, AddressIndex, address_fields
+from .concurrency import run_bounded
+from .sf311 import TicketPage, count_upstream_calls, ticket_address, ticket_distance_m, ticket_opened_at
+from .spatial_index import haversine_meters
+from .sms_outbox import LANE_FREE, LANE_PAID, OutboxStats, priority_for
+
+
+@dataclass
+class AlertBucket:
+    """Active alerts sharing a grid cell and report type."""
+    key: str
+    report_type_id: str
+    alerts: List[Alert] = field(default_factory=list)
+    # Resolved before the concurrent fetch phase (token lookup touches the DB)
+    access_token: Optional[str] = None
+    cursor: Optional[PollCursor] = None
+    # Citywide buckets hold every alert of one type and query without a location
+    citywide: bool = False
+
+    @property
+    def latitude(self) -> Optional[float]:
+        """Centroid latitude — queries are centered on the alerts, not the cell corner."""
+        if self.citywide:
+            return None
+        return sum(a.latitude for a in self.alerts) / len(self.alerts)
+
+    @property
+    def longitude(self) -> Optional[float]:
+        """Centroid longitude."""
+        if self.citywide:
+            return None
+        return sum(a.longitude for a in self.alerts) / len(self.alerts)
+
+    @property
+    def priority(self) -> int:
+        """Paid lane if any alert in the bucket belongs to a paid account."""
+        if any(priority_for(alert.user) == LANE_PAID for alert in self.alerts):
+            return LANE_PAID
+        return LANE_FREE
+
+    @property
+    def max_pages(self) -> int:
+        return settings.POLL_CITYWIDE_MAX_PAGES if self.citywide else settings.POLL_MAX_PAGES
+
+    @property
+    def last_seen_at(self) -> Optional[datetime]:
+        return self.cursor.last_seen_at if self.cursor else None
+
+    @property
+    def stored_state(self) -> Tuple[Optional[datetime], Optional[str], Optional[datetime]]:
+        """(last_seen_at, end_cursor, catchup_seen_at) as persisted, for change detection."""
+        if not self.cursor:
+            return None, None, None
+        return self.cursor.last_seen_at, self.cursor.end_cursor, self.cursor.catchup_seen_at
+
+    @property
+    def resume_cursor(self) -> Optional[str]:
+        """endCursor to resume an unfinished catch-up from (opened-order streams only)."""
+        if not self.time_ordered or not self.cursor:
+            return None
+        return self.cursor.end_cursor
+
+    @property
+    def catchup_seen_at(self) -> Optional[datetime]:
+        return self.cursor.catchup_seen_at if self.resume_cursor else None
+
+    @property
+    def time_ordered(self) -> bool:
+        """Citywide streams come newest-opened first; cell queries are ordered by distance."""
+        return self.citywide
+
+    @property
+    def search_radius_m(self) -> Optional[float]:
+        """
+        Distance from the centroid beyond which no ticket can match: the
+        farthest alert plus POLL_MATCH_RADIUS_M. None for citywide buckets.
+        """
+        if self.citywide:
+            return None
+        lat, lng = self.latitude, self.longitude
+        farthest = max(haversine_meters(lat, lng, a.latitude, a.longitude) for a in self.alerts)
+        return farthest + settings.POLL_MATCH_RADIUS_M
+
+    @property
+    def page_size(self) -> int:
+        """Page size for this cell: ~2x its recent ticket rate (see PollCursor.ticket_rate), clamped."""
+        if self.citywide:
+            return settings.POLL_CITYWIDE_PAGE_SIZE
+        rate = self.cursor.ticket_rate if self.cursor else None
+        return page_size_for_rate(rate)
+
+
+@dataclass
+class PollStats:
+    """Counters reported in the poll run summary."""
+    alerts: int = 0
+    upstream_calls: int = 0
+    new_reports: int = 0
+    failed_buckets: int = 0
+    fetch_seconds: float = 0.0
+    db_round_trips: int = 0
+    tickets_seen: int = 0
+    tickets_skipped: int = 0  # at or before the bucket's high-water mark
+    quiet_buckets: int = 0  # buckets with nothing newer than the mark
+    truncated_buckets: int = 0  # page budget ran out before the mark / search radius
+    # Pipeline mode: inline delivery of this run's new reports
+    delivery: Optional[OutboxStats] = None
+
+    @property
+    def calls_saved(self) -> int:
+        """
+        Upstream calls avoided versus the old one-query-per-alert loop, against
+        the calls actually made (a bucket can take several pages).
+        """
+        return max(self.alerts - self.upstream_calls, 0)
+
+    def summary(self) -> str:
+        message = (
+            f"Found {self.new_reports} new matches. "
+            f"{self.upstream_calls} upstream calls for {self.alerts} alerts "
+            f"({self.calls_saved} calls saved) in {self.fetch_seconds:.1f}s, "
+            f"{self.db_round_trips} DB round-trips. "
+            f"{self.tickets_skipped}/{self.tickets_seen} tickets skipped by cursor, "
+            f"{self.quiet_buckets} quiet buckets."
+        )
+        if self.failed_buckets:
+            message += f" {self.failed_buckets} buckets failed."
+        if self.truncated_buckets:
+            message += f" {self.truncated_buckets} buckets hit the page budget."
+        if self.delivery is not None:
+            message += f" Inline delivery: {self.delivery.summary()}."
+        return message
+
+
+def cell_index(latitude: float, longitude: float, cell_size: float = None) -> Tuple[int, int]:
+    """Quantize a coordinate to integer grid cell indices."""
+    size = cell_size or settings.POLL_CELL_SIZE_DEG
+    return math.floor(latitude / size), math.floor(longitude / size)
+
+
+def cell_key(latitude: float, longitude: float, report_type_id: str) -> str:
+    """Stable string key for a (cell, report type) bucket."""
+    lat_idx, lng_idx = cell_index(latitude, longitude)
+    return f"{report_type_id}:{lat_idx}:{lng_idx}"
+
+
+def bucket_alerts(alerts: Iterable[Alert]) -> List[AlertBucket]:
+    """Group alerts by quantized location + report type."""
+    buckets: Dict[str, AlertBucket] = {}
+    for alert in alerts:
+        key = cell_key(alert.latitude, alert.longitude, alert.report_type_id)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = AlertBucket(key=key, report_type_id=alert.report_type_id)
+        bucket.alerts.append(alert)
+    return list(buckets.values())
+
+
+def bucket_alerts_by_type(alerts: Iterable[Alert]) -> List[AlertBucket]:
+    """One citywide bucket per watched report type."""
+    buckets: Dict[str, AlertBucket] = {}
+    for alert in alerts:
+        key = f"citywide:{alert.report_type_id}"
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = AlertBucket(
+                key=key, report_type_id=alert.report_type_id, citywide=True
+            )
+        bucket.alerts.append(alert)
+    return list(buckets.values())
+
+
+def build_address_index(alerts: Iterable[Alert]) -> AddressIndex[Alert]:
+    """
+    Address index over the run's active alerts.
+
+    Alerts with a persisted address_key from the current parser version are
+    indexed straight from it; rows that predate the column, carry a key from an
+    older parser, or have an ambiguous address are parsed on the fly. Fuzzy
+    entries reuse the persisted address_normalized.
+    """
+    index: AddressIndex[Alert] = AddressIndex()
+    for alert in alerts:
+        current = alert.address_key_version == ADDRESS_KEY_VERSION
+        index.add(
+            alert.address,
+            alert,
+            key=alert.address_key if current else None,
+            normalized=alert.address_normalized,
+        )
+    return index
+
+
+def match_alert(
+    report_data: Dict[str, Any],
+    index: AddressIndex[Alert],
+    alert_ids: Optional[Set[int]] = None,
+) -> Optional[Alert]:
+    """
+    First alert whose address matches the ticket's.
+
+    The ticket address is parsed once and probed against the index by
+    (number, street name); `alert_ids` restricts matches to the alerts the
+    ticket was fetched for (the bucket, or the spatial-index neighbours).
+    """
+    raw = ticket_address(report_data)
+    if not raw:
+        return None
+    for alert in index.lookup(raw):
+        if alert_ids is None or alert.id in alert_ids:
+            return alert
+    return None
+
+
+# Weight of the latest run in the per-cell ticket rate moving average
+RATE_SMOOTHING = 0.3
+
+
+def page_size_for_rate(rate: Optional[float]) -> int:
+    """Adaptive page size: quiet cells use small pages, hot cells larger ones."""
+    if rate is None:
+        return max(settings.POLL_MIN_PAGE_SIZE, min(20, settings.POLL_MAX_PAGE_SIZE))
+    return max(settings.POLL_MIN_PAGE_SIZE, min(math.ceil(rate * 2), settings.POLL_MAX_PAGE_SIZE))
+
+
+def next_ticket_rate(rate: Optional[float], new_tickets: int) -> float:
+    """Update a cell's moving average of new tickets per run."""
+    if rate is None:
+        return float(new_tickets)
+    return RATE_SMOOTHING * new_tickets + (1 - RATE_SMOOTHING) * rate
+
+
+def tickets_after(
+    tickets: List[Dict[str, Any]],
+    mark: Optional[datetime],
+) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
+    """
+    Split off tickets newer than the high-water mark.
+
+    Returns (new tickets, newest openedAt seen). Tickets without a parseable
+    timestamp are always treated as new — dedupe on report_id still applies.
+    """
+    newest = mark
+    fresh = []
+    for ticket in tickets:
+        ts = ticket_opened_at(ticket)
+        if ts is not None and mark is not None and ts <= mark:
+            continue
+        fresh.append(ticket)
+        if ts is not None and (newest is None or ts > newest):
+            newest = ts
+    return fresh, newest
+
+
+def tickets_in_radius(bucket: AlertBucket, tickets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """A cell's tickets within its search radius (tickets without a location are kept)."""
+    radius = bucket.search_radius_m
+    if radius is None:
+        return tickets
+    lat, lng = bucket.latitude, bucket.longitude
+    return [ticket for ticket in tickets if ticket_distance_m(ticket, lat, lng) <= radius]
+
+
+def _latest(*times: Optional[datetime]) -> Optional[datetime]:
+    present = [t for t in times if t is not None]
+    return max(present) if present else None
+
+
+async def fetch_bucket(client, bucket: AlertBucket) -> TicketPage:
+    """
+    Fetch this run's tickets for a bucket within its page budget.
+
+    Opened-order (citywide) streams are read newest first and stop at the mark.
+    If an earlier run was truncated, the head is read down to what that run
+    already saw, then the remaining budget continues the gap from the saved
+    endCursor down to the mark. The returned page is `truncated` when the
+    budget ran out first; its end_cursor is where the next run resumes.
+
+    Distance-ordered (cell) streams have no time order to stop on, so every run
+    re-reads the head and stops at the edge of the cell's search radius; new
+    tickets near the alerts are always on the first pages.
+    """
+    def fetch(
+        max_pages: int,
+        since: Optional[datetime],
+        after: Optional[str] = None,
+        max_distance_m: Optional[float] = None,
+    ):
+        return client.search_reports_paginated(
+            latitude=bucket.latitude,
+            longitude=bucket.longitude,
+            ticket_type_id=bucket.report_type_id,
+            page_size=bucket.page_size,
+            max_pages=max_pages,
+            since=since,
+            scope="recently_opened",
+            access_token=bucket.access_token,
+            after=after,
+            max_distance_m=max_distance_m,
+        )
+
+    if not bucket.time_ordered:
+        return await fetch(bucket.max_pages, None, max_distance_m=bucket.search_radius_m)
+
+    resume = bucket.resume_cursor
+
+    head = await fetch(bucket.max_pages, bucket.catchup_seen_at if resume else bucket.last_seen_at)
+    if not resume or head.truncated:
+        # A truncated head restarts the catch-up from its own endCursor, which
+        # still leads down through the old gap to the mark
+        return head
+    if head.pages >= bucket.max_pages:
+        tail = TicketPage(tickets=[], end_cursor=resume, has_next_page=True, pages=0, truncated=True)
+    else:
+        tail = await fetch(bucket.max_pages - head.pages, bucket.last_seen_at, resume)
+    return TicketPage(
+        tickets=head.tickets + tail.tickets,
+        end_cursor=tail.end_cursor,
+        has_next_page=tail.has_next_page,
+        pages=head.pages + tail.pages,
+        truncated=tail.truncated,
+    )
+
+
+def next_cursor_state(
+    bucket: AlertBucket,
+    page: TicketPage,
+    newest: Optional[datetime],
+) -> Tuple[Optional[datetime], Optional[str], Optional[datetime]]:
+    """
+    (last_seen_at, end_cursor, catchup_seen_at) to store after a run.
+
+    The mark only moves once everything down to it has been read; while a
+    truncated opened-order run is being caught up it stays put, end_cursor says
+    where to continue, and the eventual mark is the newest ticket seen during
+    the catch-up.
+
+    Distance-ordered (cell) buckets store only the mark: it moves to the newest
+    ticket when the run read out to the search radius, and stays put when the
+    page budget ran out first — tickets past the budget were not read, and the
+    next run re-reads from the head anyway.
+    """
+    mark = bucket.last_seen_at
+    if not bucket.time_ordered:
+        return (mark if page.truncated else _latest(mark, newest)), None, None
+
+    catchup = bucket.catchup_seen_at
+    seen = _latest(catchup, newest)
+    if page.truncated:
+        return mark, page.end_cursor, seen
+    return _latest(mark, seen), None, None
+
+
+def load_cursors(db: Session, keys: Iterable[str]) -> Dict[str, PollCursor]:
+    """Fetch the high-water marks for all buckets in one query."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    return {c.key: c for c in db.query(PollCursor).filter(PollCursor.key.in_(keys))}
+
+
+def save_cursors(
+    db: Session,
+    updates: Dict[str, Tuple[Optional[datetime], Optional[str], Optional[datetime], Optional[float]]],
+) -> None:
+    """
+    Upsert changed marks in one statement.
+
+    updates maps key -> (last_seen_at, end_cursor, catchup_seen_at, ticket_rate).
+    """
+    if not updates:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {
+            "key": key,
+            "last_seen_at": last_seen_at,
+            "end_cursor": end_cursor,
+            "catchup_seen_at": catchup_seen_at,
+            "ticket_rate": ticket_rate,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for key, (last_seen_at, end_cursor, catchup_seen_at, ticket_rate) in updates.items()
+    ]
+    stmt = pg_insert(PollCursor.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={
+            "last_seen_at": stmt.excluded.last_seen_at,
+            "end_cursor": stmt.excluded.end_cursor,
+            "catchup_seen_at": stmt.excluded.catchup_seen_at,
+            "ticket_rate": stmt.excluded.ticket_rate,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+async def fetch_buckets(
+    buckets: List[AlertBucket],
+    fetch: Callable[[AlertBucket], Awaitable[Any]],
+    stats: PollStats,
+) -> List[Tuple[AlertBucket, Any]]:
+    """
+    Concurrently run the upstream fetch for each bucket, recording wall time and
+    the GraphQL calls actually made (every page, including those of failed fetches).
+    """
+    start = time.monotonic()
+    with count_upstream_calls() as counter:
+        results = await run_bounded(buckets, fetch, settings.POLL_CONCURRENCY)
+    stats.fetch_seconds += time.monotonic() - start
+    stats.upstream_calls += counter.calls
+    return results
+
+
+def store_new_reports(db: Session, candidates: Dict[str, Tuple[Alert, Dict[str, Any]]]) -> List[str]:
+    """
+    Persist matched tickets with a constant number of DB round-trips.
+
+    candidates maps SF311 report_id -> (matching alert, ticket data) for the whole
+    run. Already-stored IDs are resolved with one IN query, and the remainder is
+    written with one multi-row INSERT ... ON CONFLICT (report_id) DO NOTHING, so a
+    concurrent poll run inserting the same ticket is a no-op instead of an error.
+
+    Returns the report_ids that were actually inserted.
+    """
+    if not candidates:
+        return []
+
+    existing = {
+        report_id
+        for (report_id,) in db.query(Report.report_id).filter(
+            Report.report_id.in_(list(candidates))
+        )
+    }
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "alert_id": alert.id,
+            "report_id": report_id,
+            "report_data": report_data,
+            "sms_sent": False,
+            "sms_status": SMSStatus.PENDING,
+            "sms_attempts": 0,
+            "sms_next_attempt_at": now,
+            "sms_priority": priority_for(alert.user),
+            **address_fields(ticket_address(report_data)),
+        }
+        for report_id, (alert, report_data) in candidates.items()
+        if report_id not in existing
+    ]
+    if not rows:
+        return []
+
+    stmt = (
+        pg_insert(Report.__table__)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["report_id"])
+        .returning(Report.__table__.c.report_id)
+    )
+    inserted = [report_id for (report_id,) in db.execute(stmt)]
+    db.commit()
+    return inserted
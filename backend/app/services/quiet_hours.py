@@ -0,0 +1,65 @@
+"""
+Per-user quiet hours.
+
+A user may set a daily window (local "HH:MM" start/end in their timezone,
+e.g. 22:00-07:00) during which no SMS is sent. Notifications that come due
+inside the window are deferred until it ends (see services.sms_outbox).
+"""
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+
+
+def parse_hhmm(value: str) -> time:
+    """Parse "22:30" into time(22, 30). Raises ValueError for anything else."""
+    hours, minutes = value.split(":")
+    return time(int(hours), int(minutes))
+
+
+def _zone(name: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def quiet_until(
+    start: Optional[str],
+    end: Optional[str],
+    tz_name: Optional[str],
+    now: Optional[datetime] = None,
+) -> Optional[datetime]:
+    """
+    End of the current quiet window as naive UTC, or None when not in one.
+
+    `now` is naive UTC (defaults to utcnow). A window whose start is after its
+    end wraps past midnight; equal start and end means no quiet hours.
+    """
+    if not start or not end:
+        return None
+    try:
+        start_t, end_t = parse_hhmm(start), parse_hhmm(end)
+    except ValueError:
+        return None
+    if start_t == end_t:
+        return None
+
+    zone = _zone(tz_name)
+    now = now or datetime.utcnow()
+    local = now.replace(tzinfo=timezone.utc).astimezone(zone)
+    clock = local.time().replace(tzinfo=None)
+
+    if start_t < end_t:
+        inside = start_t <= clock < end_t
+    else:
+        inside = clock >= start_t or clock < end_t
+    if not inside:
+        return None
+
+    end_date = local.date()
+    if clock >= end_t:
+        end_date += timedelta(days=1)
+    window_end = datetime.combine(end_date, end_t, tzinfo=zone)
+    return window_end.astimezone(timezone.utc).replace(tzinfo=None)
@@ -6,18 +6,163 @@ from __future__ import annotations
 
 import time
 import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
 import httpx
 import sys
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from dataclasses import dataclass
 
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx when installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 # Add reporter_lib directory to path for reporter code
 lib_path = Path(__file__).parent.parent.parent / "reporter_lib"
 if str(lib_path) not in sys.path:
     sys.path.insert(0, str(lib_path))
 
 from ..core.config import settings
+from .spatial_index import haversine_meters
+
+
+# `tickets` connection query, trimmed from reporter_lib/spotclient/graphql.py's
+# DEFAULT_PAYLOAD. pageInfo drives incremental polling and pagination.
+TICKETS_QUERY = """query ExploreQuery($scope: TicketsScopeEnum, $order: Json, $filters: Json, $limit: Int, $after: String) {
+  tickets(first: $limit, after: $after, scope: $scope, order: $order, filters: $filters) {
+    nodes {
+      id
+      publicId
+      description
+      status
+      statusLabel
+      submittedAt
+      openedAt
+      closedAt
+      ticketType {
+        id
+        name
+      }
+      location {
+        address
+        latitude
+        longitude
+      }
+      photos {
+        url
+      }
+    }
+    pageInfo {
+      endCursor
+      hasNextPage
+    }
+  }
+}"""
+
+
+def ticket_address(ticket: Dict[str, Any]) -> str:
+    """Address of a ticket: nested location.address (GraphQL) or flat address (legacy)."""
+    location = ticket.get("location")
+    if isinstance(location, dict) and location.get("address"):
+        return location["address"].strip()
+    return (ticket.get("address") or "").strip()
+
+
+def ticket_coordinates(ticket: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) of a ticket, or None if the ticket has no location."""
+    location = ticket.get("location")
+    source = location if isinstance(location, dict) else ticket
+    lat, lng = source.get("latitude"), source.get("longitude")
+    if lat is None or lng is None:
+        return None
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+def ticket_distance_m(ticket: Dict[str, Any], latitude: float, longitude: float) -> float:
+    """Meters from a point to a ticket (0 for a ticket without a location)."""
+    coords = ticket_coordinates(ticket)
+    if coords is None:
+        return 0.0
+    return haversine_meters(latitude, longitude, coords[0], coords[1])
+
+
+def _parse_timestamp(raw: Any) -> Optional[datetime]:
+    """ISO timestamp from the API as naive UTC (matches DateTime columns), or None."""
+    if not raw:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def ticket_timestamp(ticket: Dict[str, Any]) -> Optional[datetime]:
+    """submittedAt/openedAt of a ticket as naive UTC (matches DateTime columns), or None."""
+    return _parse_timestamp(
+        ticket.get("submittedAt") or ticket.get("openedAt") or ticket.get("created_at")
+    )
+
+
+def ticket_opened_at(ticket: Dict[str, Any]) -> Optional[datetime]:
+    """
+    openedAt of a ticket (submittedAt if it has none) as naive UTC, or None.
+
+    This is the time the `recently_opened` scope is ordered by, so it is what
+    poll high-water marks compare against: a ticket submitted before the mark
+    but opened after it is still new.
+    """
+    return _parse_timestamp(
+        ticket.get("openedAt") or ticket.get("submittedAt") or ticket.get("created_at")
+    )
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True when an SF 311 call failed with HTTP 429 (too many requests for that token)."""
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+
+
+@dataclass
+class TicketPage:
+    """One page (or several concatenated pages) of the `tickets` connection."""
+    tickets: List[Dict[str, Any]]
+    end_cursor: Optional[str] = None
+    has_next_page: bool = False
+    pages: int = 1
+    # Page budget ran out with tickets left to read (resume from end_cursor)
+    truncated: bool = False
+
+
+@dataclass
+class UpstreamCallCounter:
+    """GraphQL calls made while counting (see count_upstream_calls)."""
+    calls: int = 0
+
+
+_upstream_calls: ContextVar[Optional[UpstreamCallCounter]] = ContextVar("sf311_upstream_calls", default=None)
+
+
+@contextmanager
+def count_upstream_calls() -> Iterator[UpstreamCallCounter]:
+    """
+    Count every GraphQL request made in this context, including by tasks it
+    spawns (asyncio copies the context) and by fetches that later fail.
+    """
+    counter = UpstreamCallCounter()
+    token = _upstream_calls.set(counter)
+    try:
+        yield counter
+    finally:
+        _upstream_calls.reset(token)
 
 
 @dataclass
@@ -37,6 +182,53 @@ class SF311Client:
         self.redirect_uri = settings.SF311_REDIRECT_URI
         self.scope = settings.SF311_SCOPE
         self.graphql_url = settings.SF311_GRAPHQL_URL
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._http: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """
+        Long-lived, connection-pooled HTTP client shared by all requests.
+        Created by the app lifespan (start()), or lazily on first use when the
+        lifespan doesn't run (Mangum on Vercel uses lifespan="off").
+        """
+        if self._http is None or self._http.is_closed:
+            self.start()
+        return self._http
+    
+    @property
+    def transport(self) -> httpx.AsyncHTTPTransport:
+        """
+        The connection pool behind `http`. Auth flows (reporter_lib/auth_async)
+        run their own short-lived clients on it, so their session cookies never
+        end up in the shared client's cookie jar.
+        """
+        if self._http is None or self._http.is_closed:
+            self.start()
+        return self._transport
+    
+    def start(self) -> None:
+        """Create the pooled HTTP client (HTTP/2 when the h2 package is installed)."""
+        if self._http is not None and not self._http.is_closed:
+            return
+        self._transport = httpx.AsyncHTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings.SF311_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SF311_HTTP_MAX_CONNECTIONS,
+            ),
+        )
+        self._http = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=settings.SF311_HTTP_TIMEOUT,
+        )
+    
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client and its transport (app shutdown)."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._transport = None
     
     async def _acquire_tokens(self) -> SF311Tokens:
         """
@@ -51,10 +243,11 @@ class SF311Client:
     async def _refresh_tokens(self, refresh_token: str) -> SF311Tokens:
         """Refresh access token using refresh_token."""
         try:
-            import auth
+            import auth_async
             
-            # Use the auth module's refresh function (it's synchronous)
-            tokens = auth.refresh_tokens(
+            # Async refresh grant on the pooled transport (doesn't block the event loop)
+            tokens = await auth_async.refresh_tokens(
+                self.transport,
                 base_url=self.base_url,
                 client_id=self.client_id,
                 redirect_uri=self.redirect_uri,
@@ -81,17 +274,16 @@ class SF311Client:
                 "scope": self.scope,
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, data=data, timeout=30.0)
-                response.raise_for_status()
-                
-                token_data = response.json()
-                return SF311Tokens(
-                    access_token=token_data["access_token"],
-                    refresh_token=token_data.get("refresh_token", refresh_token),
-                    expires_in=token_data.get("expires_in", 3600),
-                    obtained_at=int(time.time()),
-                )
+            response = await self.http.post(url, data=data, timeout=30.0)
+            response.raise_for_status()
+            
+            token_data = response.json()
+            return SF311Tokens(
+                access_token=token_data["access_token"],
+                refresh_token=token_data.get("refresh_token", refresh_token),
+                expires_in=token_data.get("expires_in", 3600),
+                obtained_at=int(time.time()),
+            )
     
     async def _get_valid_token_for_user(self, user, db) -> str:
         """
@@ -154,6 +346,38 @@ class SF311Client:
         Returns:
             List of report dictionaries
         """
+        page = await self.search_reports_page(
+            latitude=latitude,
+            longitude=longitude,
+            ticket_type_id=ticket_type_id,
+            search=search,
+            limit=limit,
+            scope=scope,
+            access_token=access_token,
+            user=user,
+            db=db,
+        )
+        return page.tickets
+    
+    async def search_reports_page(
+        self,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        ticket_type_id: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: int = 20,
+        scope: str = "recently_opened",
+        after: Optional[str] = None,
+        access_token: Optional[str] = None,
+        user=None,
+        db=None,
+    ) -> TicketPage:
+        """
+        Fetch one page of the `tickets` connection near a location.
+        Same arguments as search_reports(), plus `after` (a pageInfo.endCursor
+        from a previous page). Returns the tickets with their pageInfo.
+        With latitude/longitude of None the query is citywide (no distance order).
+        """
         if access_token:
             # Use the provided token directly
             token = access_token
@@ -171,6 +395,7 @@ class SF311Client:
             search=search,
             limit=limit,
             scope=scope,
+            after=after,
         )
 
         headers = {
@@ -180,80 +405,149 @@ class SF311Client:
             "User-Agent": "Alert311/1.0",
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.graphql_url,
-                json=payload,
-                headers=headers,
-                timeout=30.0,
+        counter = _upstream_calls.get()
+        if counter is not None:
+            counter.calls += 1
+        
+        # Reuses pooled keep-alive connections (no TLS handshake per call)
+        response = await self.http.post(
+            self.graphql_url,
+            json=payload,
+            headers=headers,
+        )
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        # Extract tickets + pageInfo from GraphQL response
+        return self._extract_page(data)
+    
+    async def search_reports_paginated(
+        self,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        ticket_type_id: Optional[str] = None,
+        page_size: int = 20,
+        max_pages: int = 5,
+        since: Optional[datetime] = None,
+        scope: str = "recently_opened",
+        access_token: Optional[str] = None,
+        after: Optional[str] = None,
+        max_distance_m: Optional[float] = None,
+    ) -> TicketPage:
+        """
+        Follow pageInfo.hasNextPage/endCursor until the previous high-water mark,
+        the edge of the search radius, or the page budget is reached.
+
+        Args:
+            page_size: Tickets per page (`first`)
+            max_pages: Page budget for this call
+            since: High-water mark (naive UTC). Paging stops after the first page
+                with no ticket opened after this — everything further out was
+                already seen on earlier runs. Only valid for streams in opened
+                order (citywide); distance-ordered queries must pass None.
+            after: endCursor to start from (resuming an earlier truncated run)
+            max_distance_m: Search radius around (latitude, longitude) for
+                distance-ordered queries. Paging stops after the first page
+                reaching a ticket farther out — every later ticket is farther still.
+
+        Returns:
+            All fetched tickets as one TicketPage; `pages` is the number of
+            upstream calls made and `truncated` is True if the budget ran out
+            before the end of the stream (or the mark).
+        """
+        tickets: List[Dict[str, Any]] = []
+        page = TicketPage(tickets=[], end_cursor=after, has_next_page=True, pages=0)
+        pages = 0
+        caught_up = False
+        
+        while pages < max_pages:
+            page = await self.search_reports_page(
+                latitude=latitude,
+                longitude=longitude,
+                ticket_type_id=ticket_type_id,
+                limit=page_size,
+                scope=scope,
+                after=after,
+                access_token=access_token,
             )
-            response.raise_for_status()
-            
-            data = response.json()
+            pages += 1
+            tickets.extend(page.tickets)
             
-            # Extract tickets from GraphQL response
-            return self._extract_tickets(data)
+            if not page.has_next_page or not page.end_cursor:
+                break
+            if since is not None and not any(
+                ticket_opened_at(t) is None or ticket_opened_at(t) > since
+                for t in page.tickets
+            ):
+                caught_up = True
+                break
+            if max_distance_m is not None and latitude is not None and any(
+                ticket_distance_m(t, latitude, longitude) > max_distance_m
+                for t in page.tickets
+            ):
+                caught_up = True
+                break
+            after = page.end_cursor
+        
+        return TicketPage(
+            tickets=tickets,
+            end_cursor=page.end_cursor,
+            has_next_page=page.has_next_page,
+            pages=pages,
+            truncated=bool(page.has_next_page and page.end_cursor) and not caught_up,
+        )
     
     def _build_search_payload(
         self,
-        latitude: float,
-        longitude: float,
+        latitude: Optional[float],
+        longitude: Optional[float],
         ticket_type_id: Optional[str],
         search: Optional[str],
         limit: int,
         scope: str,
+        after: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Build GraphQL query payload."""
+        """Build GraphQL query payload (same `tickets` connection as reporter_lib's ExploreQuery)."""
         variables: Dict[str, Any] = {
             "scope": scope,
             "limit": limit,
-            "order": {
-                "latitude": latitude,
-                "longitude": longitude,
-            },
             "filters": {},
         }
         
+        # Nearby search orders by distance; citywide keeps the scope's default order
+        if latitude is not None and longitude is not None:
+            variables["order"] = {
+                "by": "distance",
+                "direction": "ascending",
+                "latitude": latitude,
+                "longitude": longitude,
+            }
+        
         if ticket_type_id:
-            variables["filters"]["ticket_type_id"] = ticket_type_id
+            variables["filters"]["ticket_type_id"] = [ticket_type_id]
         if search:
             variables["filters"]["search"] = search
-        
-        # GraphQL query (simplified from reporter code)
-        query = """
-        query ExploreQuery($scope: Scope!, $limit: Int, $order: OrderInput, $filters: FiltersInput) {
-          explore(scope: $scope, limit: $limit, order: $order, filters: $filters) {
-            id
-            description
-            address
-            latitude
-            longitude
-            status
-            ticket_type_id
-            ticket_type_name
-            created_at
-            updated_at
-            closed_at
-          }
-        }
-        """
+        if after:
+            variables["after"] = after
         
         return {
             "operationName": "ExploreQuery",
-            "query": query,
+            "query": TICKETS_QUERY,
             "variables": variables,
         }
     
-    def _extract_tickets(self, response_data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Extract ticket list from GraphQL response."""
-        if "data" not in response_data:
-            return []
+    def _extract_page(self, response_data: Dict[str, Any]) -> TicketPage:
+        """Extract ticket nodes and pageInfo from GraphQL response."""
+        tickets_data = (response_data.get("data") or {}).get("tickets") or {}
+        nodes = tickets_data.get("nodes") or []
+        page_info = tickets_data.get("pageInfo") or {}
         
-        explore_data = response_data["data"].get("explore")
-        if not explore_data:
-            return []
-        
-        return explore_data if isinstance(explore_data, list) else []
+        return TicketPage(
+            tickets=nodes if isinstance(nodes, list) else [],
+            end_cursor=page_info.get("endCursor"),
+            has_next_page=bool(page_info.get("hasNextPage")),
+        )
     
     def save_tokens_to_user(self, user, db, access_token: str, refresh_token: str, expires_in: int = 3600):
         """
@@ -3,13 +3,55 @@ SMS alert service using Twilio for sending notifications.
 """
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Union
 import logging
+import re
 
 from ..core.config import settings
+from .address_utils import STREET_TYPE_ABBREVIATIONS
+from .sms_encoding import GSM7, SINGLE_SEGMENT, encoded_length, to_gsm7, truncate_to
 
 logger = logging.getLogger(__name__)
 
+# Reports listed in a digest message before collapsing into "+N more"
+DIGEST_MAX_LINES = 5
+# GSM-7 template: address is never truncated below this before other fields give way
+MIN_ADDRESS_CHARS = 30
+# GSM-7 digest: max septets of "- address type" per report line
+DIGEST_LINE_CHARS = 48
+
+
+def _short_address(address: str) -> str:
+    """
+    Street part only ("580 California Street, San Francisco, CA" -> "580 California St").
+
+    Only the street type itself is abbreviated: the last word, or the last one
+    before a unit ("Apt 4", "#2"). "Long Street Name Blvd" is left alone.
+    """
+    street = address.split(",")[0].strip() or address
+    return _LONG_STREET_TYPE_RE.sub(lambda m: " " + _STREET_TYPE_TITLES[m.group(1).lower()], street, count=1)
+
+
+def _short_status(status: str) -> str:
+    return "OPEN" if status == "open" else status.upper()[:16]
+
+
+def _short_time(created_at: str) -> str:
+    """ISO timestamp -> "MM/DD HH:MM" (unparseable values are cut to 16 chars)."""
+    try:
+        return datetime.fromisoformat(created_at.replace("Z", "+00:00")).strftime("%m/%d %H:%M")
+    except (ValueError, AttributeError):
+        return str(created_at)[:16]
+
+
+_STREET_TYPE_TITLES = {full: abbr.title() for full, abbr in STREET_TYPE_ABBREVIATIONS.items()}
+# A full street type that ends the street part, optionally followed by a unit
+_UNIT_TAIL = r"(?:\s+(?:apt|apartment|unit|ste|suite|rm|room|fl|floor)\b.*|\s*#.*)?"
+_LONG_STREET_TYPE_RE = re.compile(
+    r" (" + "|".join(STREET_TYPE_ABBREVIATIONS) + r")(?=" + _UNIT_TAIL + r"$)", re.IGNORECASE
+)
+
 
 class SMSAlertService:
     def __init__(self):
@@ -30,13 +72,9 @@ class SMSAlertService:
         message_body = self._format_alert_message(report_data)
 
         try:
-            message = self.client.messages.create(
-                body=message_body,
-                from_=self.from_number,
-                to=to_phone,
-            )
-            if message.sid:
-                logger.info(f"SMS alert sent successfully to {to_phone} (SID: {message.sid})")
+            sid = self.deliver(to_phone, message_body)
+            if sid:
+                logger.info(f"SMS alert sent successfully to {to_phone} (SID: {sid})")
                 return True
             logger.warning(f"SMS alert created but no SID returned for {to_phone}")
             return False
@@ -44,32 +82,47 @@ class SMSAlertService:
             logger.error(f"SMS alert send error to {to_phone}: {e}")
             return False
     
-    def _format_alert_message(self, report_data: Dict[str, Any]) -> str:
+    def deliver(self, to_phone: str, message_body: str) -> Optional[str]:
+        """
+        Send a pre-formatted SMS and return its Twilio SID.
+
+        Unlike send_alert, Twilio errors are raised (TwilioRestException) so
+        callers such as the dispatcher can react to the status/error code.
+        """
+        params = {}
+        if settings.TWILIO_STATUS_CALLBACK_URL:
+            # Delivery receipts land on /webhooks/twilio/status
+            params["status_callback"] = settings.TWILIO_STATUS_CALLBACK_URL
+        message = self.client.messages.create(
+            body=message_body,
+            from_=self.from_number,
+            to=to_phone,
+            **params,
+        )
+        return message.sid
+    
+    def _format_alert_message(self, report_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> str:
         """
         Format 311 report data into SMS message.
 
         Handles both formats from SF 311 API:
         - GraphQL tickets: { ticketType: { name }, location: { address }, submittedAt, publicId, status }
         - Legacy format: { ticket_type_name, address, description, created_at, id }
-        """
-        # Extract type name from nested ticketType object (GraphQL) or direct field (legacy)
-        ticket_type_obj = report_data.get("ticketType", {})
-        if isinstance(ticket_type_obj, dict):
-            ticket_type = ticket_type_obj.get("name", "Unknown")
-        else:
-            ticket_type = ticket_type_obj if ticket_type_obj else report_data.get("ticket_type_name", "Unknown")
 
-        # Extract address from nested location object (GraphQL) or direct field (legacy)
-        location_obj = report_data.get("location", {})
-        if isinstance(location_obj, dict):
-            address = location_obj.get("address", "Unknown location")
-        else:
-            address = location_obj if location_obj else report_data.get("address", "Unknown location")
+        A list of reports (digest mode) renders one compact message listing
+        each report on a line; a single-item list renders like a dict.
 
-        # Extract ID from publicId (GraphQL) or id (legacy)
-        report_id = report_data.get("publicId") or report_data.get("id", "")
-        created_at = report_data.get("submittedAt") or report_data.get("openedAt") or report_data.get("created_at", "")
-        status = report_data.get("status", "").lower()
+        With SMS_ENCODING="gsm7" the emoji-free template is used instead and
+        trimmed to fit one 160-character GSM-7 segment.
+        """
+        reports = report_data if isinstance(report_data, list) else [report_data]
+        if settings.SMS_ENCODING == GSM7:
+            return self._format_gsm7_message(reports)
+        if len(reports) != 1:
+            return self._format_digest_message(reports)
+        report_data = reports[0]
+
+        ticket_type, address, report_id, created_at, status = self._report_fields(report_data)
 
         message = f"🚨 Alert311: New {ticket_type}\n\n"
         message += f"📍 {address}\n"
@@ -91,6 +144,103 @@ class SMSAlertService:
                 message += f"\nID: {internal_id}"
 
         return message
+    
+    def _format_digest_message(self, reports: List[Dict[str, Any]]) -> str:
+        """One message for several reports: a count header and a line per report."""
+        lines = [f"🚨 Alert311: {len(reports)} new reports\n"]
+        for report_data in reports[:DIGEST_MAX_LINES]:
+            ticket_type, address, report_id, _, _ = self._report_fields(report_data)
+            line = f"📍 {_short_address(address)} - {ticket_type}"
+            if report_id:
+                line += f" #{report_id}"
+            lines.append(line)
+        if len(reports) > DIGEST_MAX_LINES:
+            lines.append(f"+{len(reports) - DIGEST_MAX_LINES} more")
+        return "\n".join(lines)
+    
+    def _format_gsm7_message(self, reports: List[Dict[str, Any]]) -> str:
+        """
+        GSM-7-only template that fits a single segment (160 septets).
+
+        Emoji would force UCS-2 (70 chars/segment), so there are none; the
+        address drops city/state/zip and is truncated before anything else,
+        then the timestamp is dropped, then the header is truncated.
+        """
+        limit = SINGLE_SEGMENT[GSM7]
+        if len(reports) != 1:
+            return self._format_gsm7_digest(reports, limit)
+
+        report_data = reports[0]
+        ticket_type, address, report_id, created_at, status = self._report_fields(report_data)
+        header = to_gsm7(f"Alert311: New {ticket_type}")
+        address = to_gsm7(_short_address(address))
+        tail = []
+        if status:
+            tail.append(to_gsm7(f"Status: {_short_status(status)}"))
+        if report_id:
+            tail.append(to_gsm7(f"Case #{report_id}"))
+        else:
+            internal_id = report_data.get("id")
+            if internal_id:
+                tail.append(to_gsm7(f"ID: {internal_id}"))
+        when = _short_time(created_at) if created_at else ""
+
+        def render() -> str:
+            return "\n".join(line for line in [header, address, when, *tail] if line)
+
+        over = encoded_length(render(), GSM7) - limit
+        if over > 0:
+            address = truncate_to(address, max(encoded_length(address, GSM7) - over, MIN_ADDRESS_CHARS))
+            over = encoded_length(render(), GSM7) - limit
+        if over > 0:
+            when = ""
+            over = encoded_length(render(), GSM7) - limit
+        if over > 0:
+            header = truncate_to(header, max(encoded_length(header, GSM7) - over, 0))
+            over = encoded_length(render(), GSM7) - limit
+        if over > 0:
+            address = truncate_to(address, max(encoded_length(address, GSM7) - over, 0))
+        return render()
+    
+    def _format_gsm7_digest(self, reports: List[Dict[str, Any]], limit: int) -> str:
+        """GSM-7 digest: as many report lines as fit in one segment, then "+N more"."""
+        lines = [f"Alert311: {len(reports)} new reports"]
+        for i, report_data in enumerate(reports):
+            ticket_type, address, report_id, _, _ = self._report_fields(report_data)
+            line = to_gsm7(f"- {_short_address(address)} {ticket_type}")
+            line = truncate_to(line, DIGEST_LINE_CHARS)
+            if report_id:
+                line += to_gsm7(f" #{report_id}")
+            remaining = len(reports) - i - 1
+            more = f"\n+{remaining} more" if remaining else ""
+            candidate = "\n".join(lines + [line]) + more
+            if encoded_length(candidate, GSM7) > limit:
+                lines.append(f"+{len(reports) - i} more")
+                break
+            lines.append(line)
+        return "\n".join(lines)
+    
+    def _report_fields(self, report_data: Dict[str, Any]) -> Tuple[str, str, str, str, str]:
+        """(ticket type, address, public id, created at, status) from either API format."""
+        # Extract type name from nested ticketType object (GraphQL) or direct field (legacy)
+        ticket_type_obj = report_data.get("ticketType", {})
+        if isinstance(ticket_type_obj, dict):
+            ticket_type = ticket_type_obj.get("name", "Unknown")
+        else:
+            ticket_type = ticket_type_obj if ticket_type_obj else report_data.get("ticket_type_name", "Unknown")
+
+        # Extract address from nested location object (GraphQL) or direct field (legacy)
+        location_obj = report_data.get("location", {})
+        if isinstance(location_obj, dict):
+            address = location_obj.get("address", "Unknown location")
+        else:
+            address = location_obj if location_obj else report_data.get("address", "Unknown location")
+
+        # Extract ID from publicId (GraphQL) or id (legacy)
+        report_id = report_data.get("publicId") or report_data.get("id", "")
+        created_at = report_data.get("submittedAt") or report_data.get("openedAt") or report_data.get("created_at", "")
+        status = report_data.get("status", "").lower()
+        return ticket_type, address, report_id, created_at, status
 
 
 sms_alert_service = SMSAlertService()
@@ -0,0 +1,269 @@
+"""
+Concurrent SMS dispatcher for the /cron/send-alerts job.
+
+Twilio's client is synchronous, so sends run on a small dedicated thread pool
+(SMS_DISPATCH_CONCURRENCY workers) and the event loop only awaits them. Every
+send first takes a token from a token-bucket pacer set to our sender's
+messages-per-second limit (SMS_RATE_PER_SECOND), so a backlog drains at the
+rate Twilio will accept instead of one round-trip at a time.
+
+When Twilio answers 429 (too many requests) the pacer halves its rate and the
+message is retried after a short backoff; the rate creeps back up towards the
+configured limit as sends succeed again.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+from ..core.config import settings
+from .sms_alert import SMSAlertService, sms_alert_service
+from .sms_encoding import segment_count
+
+logger = logging.getLogger(__name__)
+
+# Floor for the adaptive rate after repeated 429s (messages/sec)
+MIN_RATE = 0.2
+# Fraction of the configured rate regained per successful send after a 429
+RECOVERY_STEP = 0.05
+
+
+# Twilio error codes that will fail the same way on every retry
+# (https://www.twilio.com/docs/api/errors)
+PERMANENT_ERROR_CODES = frozenset({
+    21211,  # invalid 'To' phone number
+    21214,  # 'To' number cannot be reached
+    21217,  # phone number does not appear to be valid
+    21401,  # invalid phone number
+    21407,  # destination not supported for SMS
+    21408,  # permission to send to this region not enabled
+    21421,  # phone number is invalid
+    21610,  # recipient replied STOP (unsubscribed)
+    21612,  # cannot route between 'From' and 'To'
+    21614,  # 'To' number is not a mobile number
+    30003,  # unreachable destination handset
+    30004,  # message blocked
+    30005,  # unknown destination handset
+    30006,  # landline or unreachable carrier
+})
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for Twilio's "too many requests" (HTTP 429 / error 20429)."""
+    return isinstance(error, TwilioRestException) and (
+        error.status == 429 or error.code == 20429
+    )
+
+
+def is_permanent_failure(error: BaseException) -> bool:
+    """
+    True when retrying cannot help: a known bad-recipient code, or any other
+    4xx from Twilio except 429. Network errors, 5xx and throttling are transient,
+    and so are 401/403 — bad credentials are ours to fix, not the recipient's.
+    """
+    if not isinstance(error, TwilioRestException):
+        return False
+    if error.code in PERMANENT_ERROR_CODES:
+        return True
+    status = error.status or 0
+    return 400 <= status < 500 and not is_rate_limited(error) and status not in (401, 403)
+
+
+class TokenBucket:
+    """
+    Async token-bucket pacer with adaptive rate.
+
+    acquire() waits until a token is available; tokens refill at `rate` per
+    second up to `capacity`. throttle() halves the rate (and empties the
+    bucket) on a 429, recover() steps it back up towards max_rate.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def throttle(self) -> None:
+        self._refill()
+        self.rate = max(self.rate / 2, MIN_RATE)
+        self._tokens = 0
+
+    def recover(self) -> None:
+        if self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
+
+
+@dataclass
+class SMSJob:
+    """One message to send. The dispatcher fills in sid or error."""
+    to_phone: str
+    body: str
+    # Caller's handles (the Report rows, several for a digest) for applying results afterwards
+    reports: List[Any] = field(default_factory=list)
+    sid: Optional[str] = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+    # Lower is dispatched first (see sms_outbox lanes)
+    priority: int = 1
+
+    @property
+    def delivered(self) -> bool:
+        return self.sid is not None
+
+    @property
+    def segments(self) -> int:
+        """Segments Twilio bills for the body (GSM-7 vs UCS-2 aware)."""
+        return segment_count(self.body)
+
+
+@dataclass
+class DispatchStats:
+    """Counters reported in the send run summary."""
+    sent: int = 0
+    failed: int = 0
+    throttled: int = 0  # 429 responses from Twilio
+    segments: int = 0  # billed segments of sent messages
+    seconds: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.sent / self.seconds if self.seconds else 0.0
+
+    @property
+    def segments_per_message(self) -> float:
+        return self.segments / self.sent if self.sent else 0.0
+
+    def add(self, other: "DispatchStats") -> None:
+        """Accumulate another batch's counters."""
+        self.sent += other.sent
+        self.failed += other.failed
+        self.throttled += other.throttled
+        self.segments += other.segments
+        self.seconds += other.seconds
+
+    def summary(self) -> str:
+        message = (
+            f"{self.sent} sent, {self.failed} failed in {self.seconds:.1f}s "
+            f"({self.per_second:.1f} msg/s, {self.segments_per_message:.2f} segments/msg)"
+        )
+        if self.throttled:
+            message += f", {self.throttled} throttled by Twilio"
+        return message
+
+
+class SMSDispatcher:
+    """Bounded-concurrency, rate-paced sender shared by the cron jobs."""
+
+    def __init__(
+        self,
+        service: SMSAlertService = sms_alert_service,
+        rate: float = None,
+        concurrency: int = None,
+        max_throttle_retries: int = None,
+    ):
+        self.service = service
+        self.pacer = TokenBucket(rate or settings.SMS_RATE_PER_SECOND)
+        self.concurrency = max(concurrency or settings.SMS_DISPATCH_CONCURRENCY, 1)
+        self.max_throttle_retries = (
+            settings.SMS_MAX_THROTTLE_RETRIES if max_throttle_retries is None else max_throttle_retries
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="sms-dispatch"
+            )
+        return self._executor
+
+    async def _send(self, job: SMSJob, stats: DispatchStats) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.pacer.acquire()
+            job.attempts += 1
+            try:
+                job.sid = await loop.run_in_executor(
+                    self.executor, self.service.deliver, job.to_phone, job.body
+                )
+                job.error = None
+                self.pacer.recover()
+                return
+            except Exception as e:
+                job.error = e
+                if not is_rate_limited(e) or job.attempts > self.max_throttle_retries:
+                    return
+                stats.throttled += 1
+                self.pacer.throttle()
+                # Back off a little longer each time this message is throttled
+                await asyncio.sleep(min(2 ** job.attempts, 30) / max(self.pacer.rate, 1.0))
+
+    async def dispatch(
+        self,
+        jobs: List[SMSJob],
+        on_delivered: Optional[Callable[[SMSJob], None]] = None,
+    ) -> DispatchStats:
+        """
+        Send every job with at most `concurrency` in flight, paced by the token bucket.
+
+        on_delivered(job) runs on the event loop as soon as each message has a
+        SID, so callers can persist it before the whole batch finishes.
+        """
+        stats = DispatchStats()
+        if not jobs:
+            return stats
+
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Tasks queue on the semaphore and pacer in creation order, so
+        # higher-priority jobs get the Twilio rate first when it is saturated
+        jobs = sorted(jobs, key=lambda job: job.priority)
+
+        async def _run(job: SMSJob) -> None:
+            async with semaphore:
+                await self._send(job, stats)
+            if on_delivered is not None and job.delivered:
+                try:
+                    on_delivered(job)
+                except Exception as e:
+                    logger.error(f"on_delivered failed for {job.to_phone} (SID {job.sid}): {e}")
+
+        await asyncio.gather(*(_run(job) for job in jobs))
+        stats.seconds = time.monotonic() - start
+
+        for job in jobs:
+            if job.delivered:
+                stats.sent += 1
+                stats.segments += job.segments
+            else:
+                stats.failed += 1
+                logger.error(f"SMS alert send error to {job.to_phone}: {job.error}")
+        return stats
+
+
+sms_dispatcher = SMSDispatcher()
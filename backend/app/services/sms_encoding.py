@@ -0,0 +1,89 @@
+"""
+SMS encoding and segment accounting.
+
+A message that only uses the GSM 03.38 alphabet is sent as GSM-7: 160
+characters in a single segment, 153 per segment once it is split. A single
+character outside it (an emoji, a curly quote) switches the whole message to
+UCS-2: 70 UTF-16 code units in one segment, 67 per segment when split — and
+most emoji take two code units. Twilio bills (and rate-limits) per segment.
+"""
+import unicodedata
+from typing import Tuple
+
+GSM7 = "gsm7"
+UCS2 = "ucs2"
+
+# GSM 03.38 basic character set (one septet each)
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Extension table: escape + char, two septets each
+GSM7_EXTENDED = frozenset("^{}\\[~]|€\f")
+
+SINGLE_SEGMENT = {GSM7: 160, UCS2: 70}
+MULTI_SEGMENT = {GSM7: 153, UCS2: 67}
+
+# Common non-GSM characters with a close GSM-7 equivalent
+_TRANSLITERATIONS = {
+    "‘": "'", "’": "'", "‚": "'", "“": '"', "”": '"', "„": '"',
+    "–": "-", "—": "-", "−": "-", "…": "...", "•": "-", "·": "-",
+    "\u00a0": " ", "\t": " ", "`": "'", "´": "'",
+}
+
+
+def is_gsm7(text: str) -> bool:
+    return all(ch in GSM7_BASIC or ch in GSM7_EXTENDED for ch in text)
+
+
+def encoded_length(text: str, encoding: str) -> int:
+    """Length in septets (GSM-7) or UTF-16 code units (UCS-2)."""
+    if encoding == GSM7:
+        return sum(2 if ch in GSM7_EXTENDED else 1 for ch in text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def segment_info(text: str) -> Tuple[str, int]:
+    """(encoding, number of segments) the message will be billed as."""
+    encoding = GSM7 if is_gsm7(text) else UCS2
+    length = encoded_length(text, encoding)
+    if length <= SINGLE_SEGMENT[encoding]:
+        return encoding, 1
+    per_segment = MULTI_SEGMENT[encoding]
+    return encoding, -(-length // per_segment)
+
+
+def segment_count(text: str) -> int:
+    return segment_info(text)[1]
+
+
+def to_gsm7(text: str) -> str:
+    """Best-effort GSM-7 version of text: transliterate, strip accents, drop the rest."""
+    if is_gsm7(text):
+        return text
+    out = []
+    for ch in text:
+        if ch in GSM7_BASIC or ch in GSM7_EXTENDED:
+            out.append(ch)
+            continue
+        if ch in _TRANSLITERATIONS:
+            out.append(_TRANSLITERATIONS[ch])
+            continue
+        # "ó" -> "o" + combining accent -> "o"
+        base = "".join(
+            c for c in unicodedata.normalize("NFKD", ch)
+            if c in GSM7_BASIC or c in GSM7_EXTENDED
+        )
+        out.append(base)
+    return "".join(out)
+
+
+def truncate_to(text: str, limit: int) -> str:
+    """Cut text to `limit` septets, marking the cut with "..."."""
+    if encoded_length(text, GSM7) <= limit:
+        return text
+    if limit <= 3:
+        return text[:max(limit, 0)]
+    while text and encoded_length(text, GSM7) > limit - 3:
+        text = text[:-1]
+    return text.rstrip(" ,") + "..."
@@ -0,0 +1,624 @@
+"""
+Leased SMS outbox over the reports table.
+
+Pending reports that are due (sms_status = 'PENDING' AND sms_next_attempt_at
+<= now, served by the (sms_status, sms_next_attempt_at) index) are the outbox.
+A send worker claims a batch with one statement:
+
+    UPDATE reports SET lease_owner = :owner, lease_expires_at = now + ttl,
+                       sms_next_attempt_at = now + ttl
+    WHERE id IN (SELECT id FROM reports
+                 WHERE sms_status = 'PENDING' AND sms_next_attempt_at <= now
+                 ORDER BY sms_priority, sms_next_attempt_at, id
+                 LIMIT :n FOR UPDATE SKIP LOCKED)
+    RETURNING id
+
+SKIP LOCKED means overlapping cron invocations (or any number of shards) get
+disjoint batches instead of blocking on, or double-sending, each other's rows.
+Each batch is sent and committed before the next one is claimed, so only one
+batch is ever held in memory and a timeout loses at most one batch of progress.
+
+Idempotency: every accepted message is written to the sms_deliveries ledger
+((report, phone) -> Twilio SID) in small committed batches of
+SMS_LEDGER_FLUSH_SIZE while the batch is still sending, on a connection of its
+own in a worker thread, so sends never wait on the database. If the run dies
+before the batch's status flip is committed, the next claim finds those reports
+in the ledger and marks them sent without texting again — at most the last few
+unflushed sends can repeat.
+
+Failed sends are classified: permanent Twilio errors (invalid or unsubscribed
+numbers, ...) move the report straight to DEAD; transient ones are rescheduled
+with exponential backoff (SMS_RETRY_BASE_SECONDS doubling per attempt) until
+SMS_MAX_ATTEMPTS, then DEAD. Rows held by the per-user cap stay due at the lease
+expiry, so they are not re-claimed within the same run. Reports of unverified
+users are parked as DEFERRED with no deliver_after, outside the claimable range,
+until the user verifies (release_verified).
+
+Pipeline mode (POLL_NOTIFY_INLINE): the poll run hands the reports it just
+inserted to deliver_reports(), which claims exactly those rows the same way and
+sends them in the same invocation; /cron/send-alerts remains the sweeper for
+anything left over (failures, digest holds, rows a crashed run never sent).
+With digests on, inline delivery is skipped (logged): new reports only become
+claimable after the digest window.
+Both paths record the ticket submittedAt -> SMS latency.
+
+Priority lanes: reports of PAID accounts are inserted with sms_priority 0 and
+free ones with 1. Claims take the paid lane first (then oldest due), and
+within a batch paid jobs are queued on the pacer first, so when the Twilio
+rate is the bottleneck paid users are texted ahead of free ones. Queue wait
+(report stored -> SMS sent) is reported per lane.
+
+Quiet hours: a report claimed while its user is inside their quiet-hours
+window is parked as DEFERRED with deliver_after = the window's end. DEFERRED
+rows fall outside the PENDING index range, so dispatcher scans never see
+them; each run first promotes the ones that are due (one UPDATE over the
+(sms_status, deliver_after) index), and a user's deferred reports are then
+claimed together (claim_batch) and sent as one digest.
+
+In digest mode (SMS_DIGEST_ENABLED) reports are only claimable once they are
+SMS_DIGEST_WINDOW_SECONDS old, so a burst on one block accumulates, and each
+user's reports in a batch are sent as one message.
+"""
+import asyncio
+import logging
+import random
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import distinct, func, or_, select, union, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased, joinedload
+
+from ..core.config import settings
+from ..core.database import engine
+from ..models import Alert, Report, SMSDelivery, SMSStatus, User
+from ..models.user import AccountType
+from .quiet_hours import quiet_until
+from .sf311 import ticket_timestamp
+from .sms_alert import sms_alert_service
+from .sms_dispatcher import DispatchStats, SMSDispatcher, SMSJob, is_permanent_failure, sms_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Dispatch lanes (Report.sms_priority); lower is served first
+LANE_PAID = 0
+LANE_FREE = 1
+LANE_NAMES = {LANE_PAID: "paid", LANE_FREE: "free"}
+
+
+def priority_for(user: Optional[User]) -> int:
+    """Dispatch lane for a user's reports."""
+    if user is not None and user.account_type == AccountType.PAID:
+        return LANE_PAID
+    return LANE_FREE
+
+
+@dataclass
+class OutboxStats:
+    """Counters reported in the send run summary."""
+    batches: int = 0
+    claimed: int = 0
+    skipped: int = 0  # alert gone/inactive or user unverified
+    deferred: int = 0  # parked for the user's quiet hours
+    promoted: int = 0  # deferred reports whose window ended
+    already_delivered: int = 0  # found in the ledger, not resent
+    retried: int = 0  # transient failure, rescheduled
+    dead: int = 0  # dead-lettered this run
+    capped: int = 0  # held back by the per-user rate cap
+    held_for_digest: int = 0  # inline delivery skipped: digest window not over
+    reports_sent: int = 0
+    dispatch: DispatchStats = field(default_factory=DispatchStats)
+    # Ticket submittedAt -> SMS sent, seconds, per delivered report
+    latencies: List[float] = field(default_factory=list)
+    # Report stored -> SMS sent, seconds, per lane name
+    lane_waits: Dict[str, List[float]] = field(default_factory=dict)
+
+    @property
+    def sent(self) -> int:
+        return self.dispatch.sent
+
+    @property
+    def reports_per_message(self) -> float:
+        """Alerts delivered per Twilio call (> 1 when digests coalesce bursts)."""
+        return self.reports_sent / self.dispatch.sent if self.dispatch.sent else 0.0
+
+    @property
+    def p50_latency(self) -> Optional[float]:
+        return statistics.median(self.latencies) if self.latencies else None
+
+    def summary(self) -> str:
+        message = (
+            f"{self.claimed} claimed in {self.batches} batches, {self.skipped} skipped; "
+            f"{self.dispatch.summary()}; {self.reports_per_message:.2f} reports/message"
+        )
+        if self.already_delivered:
+            message += f"; {self.already_delivered} already delivered (ledger)"
+        if self.retried or self.dead:
+            message += f"; {self.retried} rescheduled, {self.dead} dead-lettered"
+        if self.capped:
+            message += f"; {self.capped} held by per-user cap"
+        if self.held_for_digest:
+            message += f"; {self.held_for_digest} left for the digest sweep"
+        if self.deferred or self.promoted:
+            message += f"; {self.deferred} deferred for quiet hours, {self.promoted} released"
+        if self.p50_latency is not None:
+            message += f"; p50 ticket->SMS latency {self.p50_latency:.0f}s"
+        for lane, waits in sorted(self.lane_waits.items()):
+            message += f"; {lane} lane p50 queue wait {statistics.median(waits):.0f}s ({len(waits)})"
+        return message
+
+
+def new_lease_owner() -> str:
+    """Unique id for one send worker / run."""
+    return uuid.uuid4().hex
+
+
+def claim_batch(
+    db: Session,
+    owner: str,
+    limit: int = None,
+    lease_seconds: int = None,
+    report_ids: Optional[List[str]] = None,
+) -> List[int]:
+    """
+    Lease up to `limit` due reports to `owner` and commit. Returns their ids.
+
+    `report_ids` (SF311 ids) restricts the claim to those reports (pipeline mode).
+
+    Reports released from quiet hours go out as one digest per user, so when
+    the batch picks up any of a user's released reports, the same statement
+    also leases the user's other released, due reports (past `limit`). Another
+    batch or worker can't take part of the digest and send it separately.
+    """
+    now = datetime.utcnow()
+    claimable = (
+        select(Report.id)
+        .where(
+            Report.sms_status == SMSStatus.PENDING,
+            Report.sms_next_attempt_at <= now,
+        )
+    )
+    if report_ids is not None:
+        claimable = claimable.where(Report.report_id.in_(report_ids))
+    if settings.SMS_DIGEST_ENABLED:
+        # Let a burst accumulate before its first report is sent
+        window = timedelta(seconds=settings.SMS_DIGEST_WINDOW_SECONDS)
+        claimable = claimable.where(Report.created_at <= now - window)
+    claimable = (
+        claimable
+        .order_by(Report.sms_priority, Report.sms_next_attempt_at, Report.id)
+        .limit(limit or settings.SMS_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .cte("claimed")
+    )
+    # Released (deliver_after set) reports of the users in the batch
+    seed, sibling = aliased(Report), aliased(Report)
+    released_users = (
+        select(Alert.user_id)
+        .join(seed, seed.alert_id == Alert.id)
+        .where(seed.id.in_(select(claimable.c.id)), seed.deliver_after.isnot(None))
+    )
+    companions = (
+        select(sibling.id)
+        .join(Alert, sibling.alert_id == Alert.id)
+        .where(
+            sibling.sms_status == SMSStatus.PENDING,
+            sibling.sms_next_attempt_at <= now,
+            sibling.deliver_after.isnot(None),
+            Alert.user_id.in_(released_users),
+        )
+        .with_for_update(of=sibling, skip_locked=True)
+        .cte("companions")
+    )
+    lease_expires_at = now + timedelta(seconds=lease_seconds or settings.SMS_LEASE_SECONDS)
+    stmt = (
+        update(Report)
+        .where(Report.id.in_(union(select(claimable.c.id), select(companions.c.id))))
+        .values(
+            lease_owner=owner,
+            lease_expires_at=lease_expires_at,
+            # Not due again until the lease runs out (retried then if abandoned)
+            sms_next_attempt_at=lease_expires_at,
+        )
+        .returning(Report.id)
+        .execution_options(synchronize_session=False)
+    )
+    ids = [report_id for (report_id,) in db.execute(stmt)]
+    db.commit()
+    return ids
+
+
+def load_claimed(db: Session, ids: List[int]) -> List[Report]:
+    """Claimed reports with their alert and user (one query)."""
+    if not ids:
+        return []
+    return (
+        db.query(Report)
+        .options(joinedload(Report.alert).joinedload(Alert.user))
+        .filter(Report.id.in_(ids))
+        .order_by(Report.sms_priority, Report.id)
+        .all()
+    )
+
+
+class DeliveryLedger:
+    """
+    Buffers (report, phone) -> SID rows and writes them in small batches.
+
+    Writes go through their own short transaction on the engine, so flushing
+    mid-batch neither commits nor expires the send worker's session. The
+    engine is synchronous, so each write runs in a worker thread
+    (asyncio.to_thread) started from record(); the event loop keeps sending
+    while it commits, and flush() waits for all of them.
+    """
+
+    def __init__(self, flush_size: int = None):
+        self.flush_size = flush_size or settings.SMS_LEDGER_FLUSH_SIZE
+        self.rows: List[Dict] = []
+        self.pending: List[asyncio.Task] = []
+        self.failed_rows = 0
+
+    def record(self, job: SMSJob) -> None:
+        """on_delivered hook: buffer the job's rows; never blocks the event loop."""
+        now = datetime.utcnow()
+        for report in job.reports:
+            self.rows.append({
+                "report_id": report.id,
+                "phone": job.to_phone,
+                "twilio_sid": job.sid,
+                "created_at": now,
+                "updated_at": now,
+            })
+        if len(self.rows) >= self.flush_size:
+            self._start_write()
+
+    def _start_write(self) -> None:
+        rows, self.rows = self.rows, []
+        self.pending.append(asyncio.get_running_loop().create_task(self._write(rows)))
+
+    async def _write(self, rows: List[Dict]) -> None:
+        try:
+            await asyncio.to_thread(self._insert, rows)
+        except Exception:
+            self.failed_rows += len(rows)
+            raise
+
+    @staticmethod
+    def _insert(rows: List[Dict]) -> None:
+        stmt = pg_insert(SMSDelivery.__table__).values(rows)
+        # A resend after an undelivered status callback replaces the old SID
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["report_id", "phone"],
+            set_={
+                "twilio_sid": stmt.excluded.twilio_sid,
+                "status": None,
+                "error_code": None,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        with engine.begin() as conn:
+            conn.execute(stmt)
+
+    async def flush(self) -> None:
+        """Write what is buffered and wait for every write; raises the first error."""
+        if self.rows:
+            self._start_write()
+        pending, self.pending = self.pending, []
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+
+def skip_delivered(db: Session, reports: List[Report], stats: OutboxStats) -> List[Report]:
+    """
+    Close out reports the ledger says were already texted to their current
+    recipient (a previous run died before committing), returning the rest.
+    """
+    if not reports:
+        return reports
+    delivered = {
+        (report_id, phone): sent_at
+        for report_id, phone, sent_at in db.query(
+            SMSDelivery.report_id, SMSDelivery.phone, SMSDelivery.created_at
+        ).filter(
+            SMSDelivery.report_id.in_([report.id for report in reports]),
+            # Undelivered per Twilio's status callback: not a delivery
+            or_(SMSDelivery.status.is_(None), SMSDelivery.status.notin_(["undelivered", "failed"])),
+        )
+    }
+    if not delivered:
+        return reports
+
+    remaining = []
+    for report in reports:
+        user = report.alert.user if report.alert else None
+        sent_at = delivered.get((report.id, user.phone)) if user else None
+        if sent_at is None:
+            remaining.append(report)
+            continue
+        report.sms_status = SMSStatus.SENT
+        report.sms_sent = True
+        report.sms_sent_at = sent_at
+        report.sms_next_attempt_at = None
+        release(report)
+        stats.already_delivered += 1
+    return remaining
+
+
+def recent_message_counts(db: Session, user_ids: List[int], since: datetime) -> Dict[int, int]:
+    """Messages sent per user since `since` (a digest's reports share sms_sent_at)."""
+    if not user_ids:
+        return {}
+    rows = (
+        db.query(Alert.user_id, func.count(distinct(Report.sms_sent_at)))
+        .join(Report.alert)
+        .filter(Alert.user_id.in_(user_ids), Report.sms_sent_at >= since)
+        .group_by(Alert.user_id)
+    )
+    return dict(rows)
+
+
+def build_jobs(db: Session, reports: List[Report], stats: OutboxStats) -> List[SMSJob]:
+    """
+    SMS jobs for deliverable reports; reports of inactive alerts are closed out.
+
+    One job per report, or one per user in digest mode; reports released from
+    quiet hours are always sent as one digest. Users inside their quiet hours
+    have their reports deferred. With SMS_USER_MAX_PER_HOUR set, users already
+    at the cap get no job this run.
+    """
+    by_user: Dict[int, List[Report]] = {}
+    for report in reports:
+        try:
+            alert = report.alert
+            if not alert or not alert.active:
+                # Alert was deleted or deactivated, close it out to avoid retrying
+                report.sms_status = SMSStatus.CANCELLED
+                report.sms_sent = True
+                release(report)
+                stats.skipped += 1
+                continue
+
+            user = alert.user
+            if not user:
+                report.sms_status = SMSStatus.CANCELLED
+                report.sms_sent = True
+                release(report)
+                stats.skipped += 1
+                continue
+            if not user.verified:
+                # Parked until the user verifies; re-claiming it every run would never send it
+                defer(report, None)
+                stats.skipped += 1
+                continue
+
+            until = quiet_until(user.quiet_hours_start, user.quiet_hours_end, user.timezone)
+            if until is not None:
+                defer(report, until)
+                stats.deferred += 1
+                continue
+
+            by_user.setdefault(user.id, []).append(report)
+        except Exception as e:
+            logger.error(f"Error preparing alert for report {report.id}: {e}")
+
+    cap = settings.SMS_USER_MAX_PER_HOUR
+    sent_recently = {}
+    if cap is not None:
+        sent_recently = recent_message_counts(
+            db, list(by_user), datetime.utcnow() - timedelta(hours=1)
+        )
+
+    jobs = []
+    for user_id, user_reports in by_user.items():
+        budget = None if cap is None else cap - sent_recently.get(user_id, 0)
+        if settings.SMS_DIGEST_ENABLED:
+            groups = [user_reports]
+        else:
+            # Reports released from quiet hours go out together
+            released = [report for report in user_reports if report.deliver_after is not None]
+            groups = [released] if released else []
+            groups += [[report] for report in user_reports if report.deliver_after is None]
+        if budget is not None:
+            # Capped reports keep their lease and wait for a later run
+            held = groups[max(budget, 0):]
+            stats.capped += sum(len(group) for group in held)
+            groups = groups[:max(budget, 0)]
+
+        phone = user_reports[0].alert.user.phone
+        for group in groups:
+            jobs.append(SMSJob(
+                to_phone=phone,
+                body=sms_alert_service._format_alert_message(
+                    [report.report_data for report in group]
+                ),
+                reports=group,
+                priority=min(report.sms_priority for report in group),
+            ))
+    # Paid lane first in line for the pacer
+    jobs.sort(key=lambda job: job.priority)
+    return jobs
+
+
+def release(report: Report) -> None:
+    report.lease_owner = None
+    report.lease_expires_at = None
+
+
+def defer(report: Report, until: Optional[datetime]) -> None:
+    """
+    Park a report until the end of its user's quiet hours, or with no `until`
+    until its user verifies.
+    """
+    report.sms_status = SMSStatus.DEFERRED
+    report.deliver_after = until
+    report.sms_next_attempt_at = None
+    release(report)
+
+
+def release_deferred(db: Session) -> int:
+    """Move deferred reports whose quiet hours have ended back into the outbox."""
+    result = db.execute(
+        update(Report)
+        .where(
+            Report.sms_status == SMSStatus.DEFERRED,
+            Report.deliver_after <= datetime.utcnow(),
+        )
+        .values(sms_status=SMSStatus.PENDING, sms_next_attempt_at=Report.deliver_after)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def release_verified(db: Session, user_id: int) -> int:
+    """Move a newly verified user's parked reports back into the outbox. Caller commits."""
+    alert_ids = select(Alert.id).where(Alert.user_id == user_id)
+    result = db.execute(
+        update(Report)
+        .where(
+            Report.alert_id.in_(alert_ids),
+            Report.sms_status == SMSStatus.DEFERRED,
+            Report.deliver_after.is_(None),
+        )
+        .values(sms_status=SMSStatus.PENDING, sms_next_attempt_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff with jitter: base * 2^(attempts-1), capped."""
+    delay = min(
+        settings.SMS_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0),
+        settings.SMS_RETRY_MAX_SECONDS,
+    )
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def record_failure(report: Report, error: Optional[BaseException], stats: OutboxStats) -> None:
+    """Reschedule a failed send, or dead-letter it if permanent / out of attempts."""
+    report.sms_last_error = str(error)[:500] if error else None
+    release(report)
+    permanent = error is not None and is_permanent_failure(error)
+    if permanent or report.sms_attempts >= settings.SMS_MAX_ATTEMPTS:
+        report.sms_status = SMSStatus.DEAD
+        report.sms_next_attempt_at = None
+        stats.dead += 1
+        logger.warning(f"Report {report.id} dead-lettered after {report.sms_attempts} attempts: {error}")
+    else:
+        report.sms_next_attempt_at = datetime.utcnow() + retry_delay(report.sms_attempts)
+        stats.retried += 1
+
+
+def complete_jobs(jobs: List[SMSJob], stats: OutboxStats) -> None:
+    """Mark delivered reports sent; reschedule or dead-letter failed ones."""
+    for job in jobs:
+        # One timestamp per message: a digest's reports share it
+        sent_at = datetime.utcnow()
+        for report in job.reports:
+            report.sms_attempts = (report.sms_attempts or 0) + 1
+            if job.delivered:
+                submitted_at = ticket_timestamp(report.report_data or {})
+                if submitted_at is not None:
+                    stats.latencies.append((sent_at - submitted_at).total_seconds())
+                if report.created_at is not None:
+                    lane = LANE_NAMES.get(report.sms_priority, str(report.sms_priority))
+                    stats.lane_waits.setdefault(lane, []).append(
+                        (sent_at - report.created_at).total_seconds()
+                    )
+                report.sms_status = SMSStatus.SENT
+                report.sms_sent = True
+                report.sms_sent_at = sent_at
+                report.sms_next_attempt_at = None
+                report.sms_last_error = None
+                release(report)
+            else:
+                record_failure(report, job.error, stats)
+        if job.delivered:
+            stats.reports_sent += len(job.reports)
+
+
+async def send_batch(db: Session, ids: List[int], dispatcher: SMSDispatcher, stats: OutboxStats) -> None:
+    """Send one claimed batch and commit its results."""
+    stats.batches += 1
+    stats.claimed += len(ids)
+
+    reports = load_claimed(db, ids)
+    jobs = build_jobs(db, skip_delivered(db, reports, stats), stats)
+    ledger = DeliveryLedger()
+    stats.dispatch.add(await dispatcher.dispatch(jobs, on_delivered=ledger.record))
+    try:
+        await ledger.flush()
+    except Exception as e:
+        # The status flip below still records these sends
+        logger.error(f"Error writing {ledger.failed_rows} SMS ledger rows: {e}")
+    complete_jobs(jobs, stats)
+    db.commit()
+    # Drop the batch's reports before claiming the next one
+    for report in reports:
+        db.expunge(report)
+
+
+async def drain_outbox(
+    db: Session,
+    dispatcher: SMSDispatcher = sms_dispatcher,
+    owner: Optional[str] = None,
+    budget_seconds: float = None,
+) -> OutboxStats:
+    """
+    Claim, send and commit batches until the outbox is empty or the time budget
+    (SMS_RUN_BUDGET_SECONDS) is spent.
+    """
+    owner = owner or new_lease_owner()
+    budget = budget_seconds or settings.SMS_RUN_BUDGET_SECONDS
+    deadline = time.monotonic() + budget
+    stats = OutboxStats()
+    stats.promoted = release_deferred(db)
+
+    while time.monotonic() < deadline:
+        ids = claim_batch(db, owner)
+        if not ids:
+            break
+        await send_batch(db, ids, dispatcher, stats)
+
+    return stats
+
+
+async def deliver_reports(
+    db: Session,
+    report_ids: List[str],
+    dispatcher: SMSDispatcher = sms_dispatcher,
+) -> OutboxStats:
+    """
+    Pipeline mode: send the given just-inserted reports (SF311 ids) right away.
+
+    Claims go through the same lease, so a concurrent sweeper never sends the
+    same report twice; anything not claimable now is left to the sweeper.
+
+    In digest mode nothing just stored is claimable (reports wait out
+    SMS_DIGEST_WINDOW_SECONDS to coalesce), so inline delivery is skipped and
+    the reports are left to /cron/send-alerts.
+    """
+    stats = OutboxStats()
+    if settings.SMS_DIGEST_ENABLED:
+        stats.held_for_digest = len(report_ids)
+        logger.info(
+            f"Inline delivery skipped for {len(report_ids)} reports: SMS_DIGEST_ENABLED "
+            f"holds them for {settings.SMS_DIGEST_WINDOW_SECONDS}s, /cron/send-alerts sends the digests"
+        )
+        return stats
+    
+    owner = new_lease_owner()
+    batch_size = settings.SMS_BATCH_SIZE
+    for start in range(0, len(report_ids), batch_size):
+        chunk = report_ids[start:start + batch_size]
+        ids = claim_batch(db, owner, limit=len(chunk), report_ids=chunk)
+        if ids:
+            await send_batch(db, ids, dispatcher, stats)
+    return stats
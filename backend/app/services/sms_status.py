@@ -0,0 +1,164 @@
+"""
+Twilio delivery-status ingestion.
+
+Twilio POSTs a status callback for every message state change (queued, sent,
+delivered, undelivered, failed) to /webhooks/twilio/status. The webhook only
+appends the event to sms_status_events and returns, so a burst of callbacks
+costs one INSERT each and never waits on the rest of the pipeline.
+
+apply_status_events() later folds the buffered events into the sms_deliveries
+ledger in batches: events are claimed with FOR UPDATE SKIP LOCKED, collapsed to
+the furthest state per message SID, applied with one bulk update, and deleted
+in the same transaction. Messages that end up undelivered / failed send their
+reports back to the outbox: permanent error codes dead-letter them, anything
+else is rescheduled with the usual backoff.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import Report, SMSDelivery, SMSStatus, SMSStatusEvent
+from .sms_dispatcher import PERMANENT_ERROR_CODES
+from .sms_outbox import release, retry_delay
+
+logger = logging.getLogger(__name__)
+
+# Later states win when events arrive out of order
+STATUS_RANK = {
+    "accepted": 0,
+    "queued": 0,
+    "sending": 1,
+    "sent": 2,
+    "delivered": 3,
+    "undelivered": 3,
+    "failed": 3,
+    "read": 4,
+}
+FAILED_STATUSES = frozenset({"undelivered", "failed"})
+
+
+@dataclass
+class StatusStats:
+    """Counters reported by the send run."""
+    events: int = 0
+    messages: int = 0
+    delivered: int = 0
+    failed: int = 0
+    requeued: int = 0
+    dead: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.events} status events for {self.messages} messages: "
+            f"{self.delivered} delivered, {self.failed} failed "
+            f"({self.requeued} requeued, {self.dead} dead-lettered)"
+        )
+
+
+def record_status_event(db: Session, params: Dict[str, str]) -> None:
+    """Append one callback (webhook path: a single INSERT, nothing else)."""
+    error_code = params.get("ErrorCode")
+    db.add(SMSStatusEvent(
+        message_sid=params["MessageSid"],
+        status=params.get("MessageStatus") or params.get("SmsStatus") or "unknown",
+        error_code=int(error_code) if error_code and error_code.isdigit() else None,
+    ))
+    db.commit()
+
+
+def _rank(status: Optional[str]) -> int:
+    return STATUS_RANK.get(status, -1)
+
+
+def collapse_events(events: List[SMSStatusEvent]) -> Dict[str, Tuple[str, Optional[int]]]:
+    """Furthest (status, error_code) per message SID."""
+    latest: Dict[str, Tuple[str, Optional[int]]] = {}
+    for event in events:
+        current = latest.get(event.message_sid)
+        if current is None or _rank(event.status) >= _rank(current[0]):
+            latest[event.message_sid] = (event.status, event.error_code)
+    return latest
+
+
+def requeue_failed(report: Report, status: str, error_code: Optional[int], stats: StatusStats) -> None:
+    """Send an undelivered report back to the outbox, or dead-letter it."""
+    if report.sms_status != SMSStatus.SENT:
+        return  # already cancelled / dead / pending again
+    report.sms_sent = False
+    report.sms_sent_at = None
+    report.sms_last_error = f"Twilio {status}" + (f" (error {error_code})" if error_code else "")
+    release(report)
+    if error_code in PERMANENT_ERROR_CODES or (report.sms_attempts or 0) >= settings.SMS_MAX_ATTEMPTS:
+        report.sms_status = SMSStatus.DEAD
+        report.sms_next_attempt_at = None
+        stats.dead += 1
+    else:
+        report.sms_status = SMSStatus.PENDING
+        report.sms_next_attempt_at = datetime.utcnow() + retry_delay(report.sms_attempts or 1)
+        stats.requeued += 1
+
+
+def apply_status_events(db: Session, limit: int = None) -> StatusStats:
+    """Fold up to `limit` buffered callbacks into the ledger and outbox, in one transaction."""
+    stats = StatusStats()
+    events = (
+        db.query(SMSStatusEvent)
+        .order_by(SMSStatusEvent.id)
+        .limit(limit or settings.SMS_STATUS_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not events:
+        return stats
+    stats.events = len(events)
+
+    latest = collapse_events(events)
+    stats.messages = len(latest)
+
+    deliveries = (
+        db.query(SMSDelivery)
+        .filter(SMSDelivery.twilio_sid.in_(list(latest)))
+        .all()
+    )
+    updates = []
+    failed_report_ids: Dict[int, Tuple[str, Optional[int]]] = {}
+    for delivery in deliveries:
+        status, error_code = latest[delivery.twilio_sid]
+        if _rank(status) < _rank(delivery.status):
+            continue  # stale event
+        updates.append({"id": delivery.id, "status": status, "error_code": error_code})
+        if status in FAILED_STATUSES:
+            failed_report_ids[delivery.report_id] = (status, error_code)
+
+    stats.delivered = sum(1 for status, _ in latest.values() if status == "delivered")
+    stats.failed = sum(1 for status, _ in latest.values() if status in FAILED_STATUSES)
+
+    if updates:
+        db.bulk_update_mappings(SMSDelivery, updates)
+    if failed_report_ids:
+        for report in db.query(Report).filter(Report.id.in_(list(failed_report_ids))):
+            status, error_code = failed_report_ids[report.id]
+            requeue_failed(report, status, error_code, stats)
+
+    db.query(SMSStatusEvent).filter(
+        SMSStatusEvent.id.in_([event.id for event in events])
+    ).delete(synchronize_session=False)
+    db.commit()
+    return stats
+
+
+def drain_status_events(db: Session, max_batches: int = 10) -> StatusStats:
+    """Apply buffered callbacks batch by batch until the buffer is empty (or max_batches)."""
+    total = StatusStats()
+    limit = settings.SMS_STATUS_BATCH_SIZE
+    for _ in range(max_batches):
+        stats = apply_status_events(db, limit)
+        for name in ("events", "messages", "delivered", "failed", "requeued", "dead"):
+            setattr(total, name, getattr(total, name) + getattr(stats, name))
+        if stats.events < limit:
+            break
+    return total
@@ -0,0 +1,264 @@
+"""
+In-memory spatial index of active alerts for ticket -> alert fan-out.
+
+Alerts are bucketed into a lat/lng grid. The bulk of the index is a compact,
+array-backed layout: entries sorted by grid cell in parallel arrays (ids, lats,
+lngs, report type codes) plus a cell -> (start, end) range map, so 100k alerts
+cost a few MB and a radius query touches only the handful of cells around the
+ticket. Writes between rebuilds (alert created / patched / deleted through
+routes/alerts.py) go to a small overlay — an upsert dict and a tombstone set —
+which is folded back into the arrays once it grows past a threshold.
+
+Each poll run hands the index the DB's active alerts via sync(). The index
+keeps a cheap generation (count, id sum, newest updated_at) of what it holds,
+maintained by the incremental updates too, and only rebuilds when the DB's
+generation differs: on cold start, or after another instance changed alerts.
+
+Answers "which alerts are within R meters of this ticket" with a bounding-box
+prefilter followed by an exact haversine check.
+"""
+import math
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from ..models import Alert
+
+EARTH_RADIUS_M = 6_371_000
+# Same sphere as haversine_meters, so the bbox prefilter never cuts inside the radius
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+# Slack on the prefilter box for floating-point error at the boundary
+PREFILTER_PAD = 1.001
+
+# Fold the overlay into the arrays when it exceeds this many entries (or 10% of the index)
+COMPACT_THRESHOLD = 1024
+
+
+def radius_to_degrees(latitude: float, radius_m: float) -> Tuple[float, float]:
+    """Convert a radius in meters to (dlat, dlng) degrees at the given latitude (padded)."""
+    dlat = radius_m * PREFILTER_PAD / METERS_PER_DEGREE_LAT
+    dlng = dlat / max(math.cos(math.radians(latitude)), 1e-6)
+    return dlat, dlng
+
+
+Generation = Tuple[int, int, Optional[datetime]]
+
+
+def alert_generation(alerts: Iterable[Alert]) -> Generation:
+    """(count, id sum, newest updated_at) of a set of active alerts."""
+    count, id_sum, newest = 0, 0, None
+    for alert in alerts:
+        count += 1
+        id_sum += alert.id
+        if alert.updated_at is not None and (newest is None or alert.updated_at > newest):
+            newest = alert.updated_at
+    return count, id_sum, newest
+
+
+def haversine_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlam = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class AlertSpatialIndex:
+    """Grid-bucketed, array-backed index of alert locations with incremental updates."""
+
+    def __init__(self, cell_size: float = None):
+        self.cell_size = cell_size or settings.POLL_CELL_SIZE_DEG
+        self.loaded = False
+        # alert_generation() of the contents, kept current by upsert()/remove()
+        self.generation: Optional[Generation] = None
+        self._type_codes: Dict[str, int] = {}
+        self._reset_arrays()
+        # Overlay of writes since the last build
+        self._overlay: Dict[int, Tuple[float, float, int]] = {}
+        self._overlay_cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._tombstones: Set[int] = set()
+
+    def _reset_arrays(self) -> None:
+        self._ids = array("q")
+        self._lats = array("d")
+        self._lngs = array("d")
+        self._types = array("H")
+        self._cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self._base_ids: Set[int] = set()
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def _type_code(self, report_type_id: str) -> int:
+        code = self._type_codes.get(report_type_id)
+        if code is None:
+            code = self._type_codes[report_type_id] = len(self._type_codes)
+        return code
+
+    def __len__(self) -> int:
+        return len(self._base_ids - self._tombstones) + len(self._overlay)
+
+    # ---- building ----
+
+    def rebuild(self, alerts: Iterable[Alert]) -> None:
+        """Replace the index contents with the given (active) alerts."""
+        alerts = list(alerts)
+        entries = [
+            (alert.id, alert.latitude, alert.longitude, self._type_code(alert.report_type_id))
+            for alert in alerts
+            if alert.latitude is not None and alert.longitude is not None
+        ]
+        self._build(entries)
+        self.generation = alert_generation(alerts)
+        self.loaded = True
+
+    def sync(self, alerts: List[Alert]) -> bool:
+        """
+        Bring the index in line with the DB's active alerts.
+
+        Rebuilds only on cold start or when the alerts' generation differs from
+        the index's (changes this process didn't see). Returns True if it rebuilt.
+        """
+        if self.loaded and alert_generation(alerts) == self.generation:
+            return False
+        self.rebuild(alerts)
+        return True
+
+    def _build(self, entries: List[Tuple[int, float, float, int]]) -> None:
+        entries.sort(key=lambda e: self._cell(e[1], e[2]))
+        self._reset_arrays()
+        self._overlay.clear()
+        self._overlay_cells.clear()
+        self._tombstones.clear()
+
+        current_cell = None
+        start = 0
+        for pos, (alert_id, lat, lng, type_code) in enumerate(entries):
+            cell = self._cell(lat, lng)
+            if cell != current_cell:
+                if current_cell is not None:
+                    self._cells[current_cell] = (start, pos)
+                current_cell, start = cell, pos
+            self._ids.append(alert_id)
+            self._lats.append(lat)
+            self._lngs.append(lng)
+            self._types.append(type_code)
+        if current_cell is not None:
+            self._cells[current_cell] = (start, len(entries))
+        self._base_ids = set(self._ids)
+
+    def _compact(self) -> None:
+        """Fold overlay + tombstones back into the sorted arrays."""
+        entries = [
+            (self._ids[i], self._lats[i], self._lngs[i], self._types[i])
+            for i in range(len(self._ids))
+            if self._ids[i] not in self._tombstones
+        ]
+        entries.extend(
+            (alert_id, lat, lng, type_code)
+            for alert_id, (lat, lng, type_code) in self._overlay.items()
+        )
+        self._build(entries)
+
+    def _maybe_compact(self) -> None:
+        pending = len(self._overlay) + len(self._tombstones)
+        if pending > max(COMPACT_THRESHOLD, len(self._ids) // 10):
+            self._compact()
+
+    # ---- incremental updates ----
+
+    def _contains(self, alert_id: int) -> bool:
+        return alert_id in self._overlay or (
+            alert_id in self._base_ids and alert_id not in self._tombstones
+        )
+
+    def upsert(self, alert: Alert) -> None:
+        """Add or move an alert (created, or re-activated via PATCH)."""
+        if not self.loaded:
+            return  # Next sync() builds from the DB
+        count, id_sum, newest = self.generation
+        if not self._contains(alert.id):
+            count, id_sum = count + 1, id_sum + alert.id
+        if alert.updated_at is not None and (newest is None or alert.updated_at > newest):
+            newest = alert.updated_at
+        self.generation = (count, id_sum, newest)
+        self._discard_overlay(alert.id)
+        if alert.id in self._base_ids:
+            self._tombstones.add(alert.id)  # hide the stale array entry
+        entry = (alert.latitude, alert.longitude, self._type_code(alert.report_type_id))
+        self._overlay[alert.id] = entry
+        self._overlay_cells.setdefault(self._cell(entry[0], entry[1]), set()).add(alert.id)
+        self._maybe_compact()
+
+    def remove(self, alert_id: int) -> None:
+        """Drop an alert (deleted, or deactivated via PATCH)."""
+        if not self.loaded:
+            return
+        if self._contains(alert_id):
+            # Newest updated_at may now be stale; the next sync() then rebuilds
+            count, id_sum, newest = self.generation
+            self.generation = (count - 1, id_sum - alert_id, newest)
+        self._discard_overlay(alert_id)
+        if alert_id in self._base_ids:
+            self._tombstones.add(alert_id)
+        self._maybe_compact()
+
+    def _discard_overlay(self, alert_id: int) -> None:
+        entry = self._overlay.pop(alert_id, None)
+        if entry is not None:
+            ids = self._overlay_cells.get(self._cell(entry[0], entry[1]))
+            if ids:
+                ids.discard(alert_id)
+
+    # ---- queries ----
+
+    def within(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        report_type_id: Optional[str] = None,
+    ) -> List[int]:
+        """IDs of alerts within radius_m of the point, optionally of one report type."""
+        type_code = None
+        if report_type_id is not None:
+            type_code = self._type_codes.get(report_type_id)
+            if type_code is None:
+                return []
+
+        dlat, dlng = radius_to_degrees(latitude, radius_m)
+        lat_lo, lng_lo = self._cell(latitude - dlat, longitude - dlng)
+        lat_hi, lng_hi = self._cell(latitude + dlat, longitude + dlng)
+
+        ids, lats, lngs, types = self._ids, self._lats, self._lngs, self._types
+        tombstones = self._tombstones
+        found = []
+        for lat_idx in range(lat_lo, lat_hi + 1):
+            for lng_idx in range(lng_lo, lng_hi + 1):
+                cell = (lat_idx, lng_idx)
+                span = self._cells.get(cell)
+                if span:
+                    for i in range(span[0], span[1]):
+                        if type_code is not None and types[i] != type_code:
+                            continue
+                        lat, lng = lats[i], lngs[i]
+                        # Cheap bounding-box prefilter before the trig
+                        if abs(lat - latitude) > dlat or abs(lng - longitude) > dlng:
+                            continue
+                        if tombstones and ids[i] in tombstones:
+                            continue
+                        if haversine_meters(latitude, longitude, lat, lng) <= radius_m:
+                            found.append(ids[i])
+                for alert_id in self._overlay_cells.get(cell, ()):
+                    lat, lng, code = self._overlay[alert_id]
+                    if type_code is not None and code != type_code:
+                        continue
+                    if haversine_meters(latitude, longitude, lat, lng) <= radius_m:
+                        found.append(alert_id)
+        return found
+
+
+# Process-wide index, kept current by routes/alerts.py and synced by the poller
+alert_index = AlertSpatialIndex()
@@ -1,44 +1,289 @@
 """
 Token management for SF 311 OAuth tokens.
 Handles both system-wide tokens (for guests) and per-user tokens.
+
+System token refreshes are single-flight: within a process, callers queue on
+an asyncio lock and reuse the result of the refresh that ran while they
+waited; across instances, the refresher holds a Postgres advisory lock (on a
+connection of its own, outside any transaction) and writes with a
+compare-and-swap on SystemConfig.last_updated_timestamp, so a stale writer can
+never clobber a newer token. None of this touches the caller's session.
 """
+import asyncio
 import json
 import time
 import logging
-from typing import Optional
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-# Import the reporter_lib auth module
+# Import the reporter_lib auth module (async flows; auth.py keeps the sync API for scripts)
 import sys
 from pathlib import Path
 lib_path = Path(__file__).parent.parent.parent / "reporter_lib"
 if str(lib_path) not in sys.path:
     sys.path.insert(0, str(lib_path))
 
-import auth
+import auth_async
 
 from ..core.config import settings
+from ..core.database import SessionLocal, engine
 from ..models.system_config import SystemConfig
 from ..models.user import User
+from .concurrency import run_bounded
+from .sf311 import sf311_client
 
 logger = logging.getLogger(__name__)
 
 
 SYSTEM_TOKEN_KEY = "sf311_system_token"
+# pg_try_advisory_lock key (+ pool slot) guarding system token refreshes across instances
+SYSTEM_TOKEN_LOCK_ID = 3110001
+# How often a waiting instance re-reads the token while another one refreshes
+REFRESH_POLL_SECONDS = 0.5
+# SystemConfig key holding the proactive user refresh's resume point
+USER_REFRESH_CURSOR_KEY = "user_token_refresh_cursor"
+
+
+@dataclass
+class UserRefreshStats:
+    """Counters reported by the proactive user token refresh."""
+    refreshed: int = 0
+    failed: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    resumed_from: int = 0  # user id cursor the run started after
+    cursor: int = 0  # where the next run starts (0 once complete)
+    complete: bool = False
+
+    @property
+    def per_second(self) -> float:
+        return (self.refreshed + self.failed) / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        message = (
+            f"{self.refreshed} refreshed, {self.failed} failed in {self.batches} batches, "
+            f"{self.seconds:.1f}s ({self.per_second:.1f} refreshes/s)"
+        )
+        if not self.complete:
+            message += f", budget reached, resuming after user {self.cursor}"
+        return message
+
+    def as_dict(self) -> dict:
+        return {
+            "success_count": self.refreshed,
+            "failure_count": self.failed,
+            "total_users": self.refreshed + self.failed,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 2),
+            "refreshes_per_second": round(self.per_second, 2),
+            "resumed_from": self.resumed_from,
+            "cursor": self.cursor,
+            "complete": self.complete,
+        }
+
+
+def system_token_key(slot: int) -> str:
+    """SystemConfig key of a pool slot (slot 0 keeps the original key)."""
+    return SYSTEM_TOKEN_KEY if slot == 0 else f"{SYSTEM_TOKEN_KEY}_{slot}"
+
+
+@dataclass
+class _CachedToken:
+    token_data: dict
+    expires_at: int
+    cached_at: float
+
+
+@dataclass
+class _PoolSlot:
+    """One system token: its cached value plus usage and 429 accounting."""
+    slot: int
+    entry: Optional[_CachedToken] = None
+    requests: int = 0
+    rate_limited: int = 0
+    last_used: float = 0.0
+    ejected_until: float = 0.0
+
+    @property
+    def key(self) -> str:
+        return system_token_key(self.slot)
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+
+class SystemTokenPool:
+    """
+    Process-local pool of SYSTEM_TOKEN_POOL_SIZE system tokens.
+
+    Each token lives under its own SystemConfig key and is rate limited by
+    SF 311 on its own, so guest and fallback traffic is spread across them:
+    checkout() hands out the least recently used token that isn't ejected.
+    A 429 on a token ejects it for SYSTEM_TOKEN_EJECT_SECONDS.
+
+    Decoded tokens are cached per slot: get() serves the access token with no
+    DB I/O while it is more than SYSTEM_TOKEN_REFRESH_MARGIN_SECONDS from expiry
+    (and the entry is younger than SYSTEM_TOKEN_CACHE_MAX_AGE_SECONDS); after
+    that callers fall through to the DB and refresh path, which repopulates it
+    via set().
+    """
+
+    def __init__(self, size: int):
+        self.slots = [_PoolSlot(slot=i) for i in range(max(size, 1))]
+        self.hits = 0
+        self.misses = 0
+
+    def checkout(self) -> _PoolSlot:
+        """Least recently used slot, skipping ejected ones unless all are."""
+        available = [s for s in self.slots if not s.ejected]
+        if available:
+            chosen = min(available, key=lambda s: s.last_used)
+        else:
+            chosen = min(self.slots, key=lambda s: s.ejected_until)
+        chosen.requests += 1
+        chosen.last_used = time.monotonic()
+        return chosen
+
+    def get(self, slot: int) -> Optional[str]:
+        entry = self.slots[slot].entry
+        now = time.time()
+        if (
+            entry is not None
+            and now < entry.expires_at - settings.SYSTEM_TOKEN_REFRESH_MARGIN_SECONDS
+            and now - entry.cached_at < settings.SYSTEM_TOKEN_CACHE_MAX_AGE_SECONDS
+        ):
+            self.hits += 1
+            return entry.token_data["access_token"]
+        self.misses += 1
+        return None
+
+    def set(self, slot: int, token_data: dict) -> None:
+        self.slots[slot].entry = _CachedToken(
+            token_data=token_data,
+            expires_at=token_data["obtained_at"] + token_data["expires_in"],
+            cached_at=time.time(),
+        )
+
+    def invalidate(self, slot: Optional[int] = None) -> None:
+        for s in self.slots if slot is None else [self.slots[slot]]:
+            s.entry = None
+
+    def report_rate_limited(self, access_token: str) -> bool:
+        """Eject the slot holding access_token after a 429. False if it isn't a pool token."""
+        for s in self.slots:
+            if s.entry is not None and s.entry.token_data["access_token"] == access_token:
+                s.rate_limited += 1
+                s.ejected_until = time.monotonic() + settings.SYSTEM_TOKEN_EJECT_SECONDS
+                logger.warning(
+                    f"System token {s.slot} rate limited by SF 311, "
+                    f"ejected for {settings.SYSTEM_TOKEN_EJECT_SECONDS}s"
+                )
+                return True
+        return False
+
+    @property
+    def is_warm(self) -> bool:
+        return all(s.entry is not None for s in self.slots)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "tokens": [
+                {
+                    "key": s.key,
+                    "requests": s.requests,
+                    "rate_limited": s.rate_limited,
+                    "ejected": s.ejected,
+                    "expires_at": s.entry.expires_at if s.entry else None,
+                }
+                for s in self.slots
+            ],
+        }
+
+
+system_token_pool = SystemTokenPool(settings.SYSTEM_TOKEN_POOL_SIZE)
+
+# One per slot, created lazily so they bind to the running event loop
+_system_refresh_locks: Dict[int, asyncio.Lock] = {}
+
+
+def _refresh_lock(slot: int) -> asyncio.Lock:
+    if slot not in _system_refresh_locks:
+        _system_refresh_locks[slot] = asyncio.Lock()
+    return _system_refresh_locks[slot]
+
+
+def _load_system_config(db: Session, slot: int) -> Optional[SystemConfig]:
+    """Current row of a pool slot, bypassing any stale copy in the session."""
+    return (
+        db.query(SystemConfig)
+        .filter(SystemConfig.key == system_token_key(slot))
+        .populate_existing()
+        .first()
+    )
+
+
+def _read_system_config(slot: int) -> Optional[SystemConfig]:
+    """A pool slot's current row, read on a short-lived session (detached copy)."""
+    with SessionLocal() as session:
+        config = _load_system_config(session, slot)
+        if config is not None:
+            session.expunge(config)
+        return config
+
+
+@contextmanager
+def _system_token_lock(slot: int) -> Iterator[bool]:
+    """
+    Try the slot's cross-instance refresh lock; yields whether it was taken.
+
+    A session-level pg_try_advisory_lock on a dedicated autocommit connection,
+    released with pg_advisory_unlock on exit: no transaction stays open while
+    the holder waits on the SF 311 refresh.
+    """
+    lock_id = SYSTEM_TOKEN_LOCK_ID + slot
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        locked = bool(conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}).scalar())
+        try:
+            yield locked
+        finally:
+            if locked:
+                try:
+                    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+                except Exception as e:
+                    # Never hand a connection still holding the lock back to the pool
+                    logger.error(f"Failed to release system token lock {lock_id}: {e}")
+                    conn.invalidate()
 
 
 class TokenManager:
     """Manages SF 311 OAuth tokens for system and users."""
     
     @staticmethod
-    def _acquire_new_token() -> dict:
+    async def _acquire_new_token() -> dict:
         """
         Acquire a brand new token from SF 311 (no user interaction needed).
         Returns dict with access_token, refresh_token, expires_in, obtained_at.
         """
         logger.info("Acquiring new SF 311 token programmatically...")
         
-        tokens = auth.acquire_tokens(
+        # Runs on the shared SF 311 connection pool with its own cookie jar;
+        # never blocks the event loop
+        tokens = await auth_async.acquire_tokens(
+            sf311_client.transport,
             base_url=settings.SF311_BASE_URL,
             client_id=settings.SF311_CLIENT_ID,
             redirect_uri=settings.SF311_REDIRECT_URI,
@@ -57,14 +302,15 @@ class TokenManager:
         }
     
     @staticmethod
-    def _refresh_existing_token(refresh_token: str) -> dict:
+    async def _refresh_existing_token(refresh_token: str) -> dict:
         """
         Refresh an existing token using refresh_token.
         Returns dict with access_token, refresh_token, expires_in, obtained_at.
         """
         logger.info("Refreshing existing SF 311 token...")
         
-        tokens = auth.refresh_tokens(
+        tokens = await auth_async.refresh_tokens(
+            sf311_client.transport,
             base_url=settings.SF311_BASE_URL,
             client_id=settings.SF311_CLIENT_ID,
             redirect_uri=settings.SF311_REDIRECT_URI,
@@ -81,81 +327,176 @@ class TokenManager:
             "obtained_at": int(time.time()),
         }
     
+    @staticmethod
+    async def _create_system_token(slot: int) -> dict:
+        """Acquire a token for an empty pool slot and store it (on a session of its own)."""
+        logger.info(f"No system token in slot {slot}, acquiring one...")
+        token_data = await TokenManager._acquire_new_token()
+        
+        with SessionLocal() as session:
+            session.add(SystemConfig(
+                key=system_token_key(slot),
+                value=json.dumps(token_data),
+                last_updated_timestamp=token_data["obtained_at"],
+            ))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Another instance filled the slot first; use theirs
+                session.rollback()
+                token_data = json.loads(_load_system_config(session, slot).value)
+        system_token_pool.set(slot, token_data)
+        
+        logger.info(f"✓ System SF 311 token {slot} created and stored")
+        return token_data
+    
     @staticmethod
     async def ensure_system_token_exists(db: Session) -> None:
         """
-        Ensure system token exists. Create one if it doesn't.
+        Ensure every system token in the pool exists. Create missing ones.
         Call this on app startup.
         """
-        config = db.query(SystemConfig).filter(
-            SystemConfig.key == SYSTEM_TOKEN_KEY
-        ).first()
-        
-        if config:
-            logger.info("System SF 311 token already exists")
+        if system_token_pool.is_warm:
             return
         
-        logger.info("No system token found, acquiring initial token...")
-        token_data = TokenManager._acquire_new_token()
+        keys = [system_token_key(slot) for slot in range(len(system_token_pool.slots))]
+        existing = {
+            key for (key,) in db.query(SystemConfig.key).filter(SystemConfig.key.in_(keys))
+        }
         
-        # Store in database
-        config = SystemConfig(
-            key=SYSTEM_TOKEN_KEY,
-            value=json.dumps(token_data),
-            last_updated_timestamp=token_data["obtained_at"],
-        )
-        db.add(config)
-        db.commit()
+        if len(existing) == len(keys):
+            logger.info("System SF 311 tokens already exist")
+            return
         
-        logger.info("✓ System SF 311 token created and stored")
+        for slot, key in enumerate(keys):
+            if key not in existing:
+                await TokenManager._create_system_token(slot)
     
     @staticmethod
     async def get_system_token(db: Session) -> str:
         """
-        Get a valid system token (for guest users).
+        Get a valid system token (for guest users) from the pool.
         Automatically refreshes if expired or near expiration.
+        Served from the process-local cache when possible (no DB round-trip).
+        Report a 429 on the returned token with system_token_pool.report_rate_limited().
         """
-        config = db.query(SystemConfig).filter(
-            SystemConfig.key == SYSTEM_TOKEN_KEY
-        ).first()
+        slot = system_token_pool.checkout().slot
+        access_token = system_token_pool.get(slot)
+        if access_token:
+            return access_token
+        
+        config = _load_system_config(db, slot)
         
         if not config:
-            raise RuntimeError(
-                "System token not found. Run ensure_system_token_exists() first."
-            )
+            if slot == 0:
+                raise RuntimeError(
+                    "System token not found. Run ensure_system_token_exists() first."
+                )
+            # Pool grown since the tokens were last ensured
+            return (await TokenManager._create_system_token(slot))["access_token"]
         
         token_data = json.loads(config.value)
         now = int(time.time())
         expires_at = token_data["obtained_at"] + token_data["expires_in"]
         
-        # Refresh if expired or expiring within 5 minutes
-        if now >= (expires_at - 300):
-            logger.info("System token expired/expiring soon, refreshing...")
-            try:
-                new_token_data = TokenManager._refresh_existing_token(
-                    token_data["refresh_token"]
-                )
-                
-                # Update in database
-                config.value = json.dumps(new_token_data)
-                config.last_updated_timestamp = new_token_data["obtained_at"]
-                db.commit()
-                
-                logger.info("✓ System token refreshed")
-                return new_token_data["access_token"]
-            except Exception as e:
-                logger.error(f"Failed to refresh system token: {e}")
-                # Try acquiring a brand new token as fallback
-                logger.info("Attempting to acquire brand new token...")
-                new_token_data = TokenManager._acquire_new_token()
-                config.value = json.dumps(new_token_data)
-                config.last_updated_timestamp = new_token_data["obtained_at"]
-                db.commit()
-                logger.info("✓ New system token acquired")
-                return new_token_data["access_token"]
+        # Refresh if expired or expiring within the refresh margin (5 minutes)
+        if now >= (expires_at - settings.SYSTEM_TOKEN_REFRESH_MARGIN_SECONDS):
+            logger.info(f"System token {slot} expired/expiring soon, refreshing...")
+            return await TokenManager._refresh_system_token(slot, config.last_updated_timestamp)
         
+        system_token_pool.set(slot, token_data)
         return token_data["access_token"]
     
+    @staticmethod
+    def _swap_system_token(slot: int, seen_timestamp: Optional[int], token_data: dict) -> Optional[dict]:
+        """
+        Store token_data only if the row still has the timestamp we refreshed from,
+        on a short-lived session. Returns None when stored, else the token of the
+        writer that got there first (which is left in place).
+        """
+        with SessionLocal() as session:
+            updated = session.query(SystemConfig).filter(
+                SystemConfig.key == system_token_key(slot),
+                SystemConfig.last_updated_timestamp.is_(None)
+                if seen_timestamp is None
+                else SystemConfig.last_updated_timestamp == seen_timestamp,
+            ).update(
+                {
+                    SystemConfig.value: json.dumps(token_data),
+                    SystemConfig.last_updated_timestamp: token_data["obtained_at"],
+                },
+                synchronize_session=False,
+            )
+            session.commit()
+            if updated == 1:
+                return None
+            return json.loads(_load_system_config(session, slot).value)
+    
+    @staticmethod
+    async def _refresh_and_store(slot: int, seen_timestamp: Optional[int], refresh_token: str) -> str:
+        """Refresh (or, failing that, re-acquire) the slot's token and CAS it into place."""
+        try:
+            new_token_data = await TokenManager._refresh_existing_token(refresh_token)
+            logger.info(f"✓ System token {slot} refreshed")
+        except Exception as e:
+            logger.error(f"Failed to refresh system token {slot}: {e}")
+            # Try acquiring a brand new token as fallback
+            logger.info("Attempting to acquire brand new token...")
+            new_token_data = await TokenManager._acquire_new_token()
+            logger.info(f"✓ New system token {slot} acquired")
+        
+        winner = TokenManager._swap_system_token(slot, seen_timestamp, new_token_data)
+        if winner is not None:
+            # Lost the race (only possible after a lock wait timeout)
+            new_token_data = winner
+        system_token_pool.set(slot, new_token_data)
+        return new_token_data["access_token"]
+    
+    @staticmethod
+    async def _refresh_system_token(slot: int, seen_timestamp: Optional[int]) -> str:
+        """
+        Single-flight refresh of the slot's token last stored at seen_timestamp.
+        
+        If the row has moved on by the time we hold the locks, someone else
+        already refreshed it and their token is returned instead. Reads, the
+        cross-instance lock and the write each use their own short-lived
+        session or connection; the caller's session is never touched.
+        """
+        async with _refresh_lock(slot):
+            waited = 0.0
+            while True:
+                # A coroutine ahead of us, or another instance, may have refreshed already
+                config = _read_system_config(slot)
+                if config is None:
+                    raise RuntimeError(
+                        "System token not found. Run ensure_system_token_exists() first."
+                    )
+                token_data = json.loads(config.value)
+                if config.last_updated_timestamp != seen_timestamp:
+                    logger.info(f"System token {slot} was refreshed concurrently, reusing it")
+                    system_token_pool.set(slot, token_data)
+                    return token_data["access_token"]
+                
+                with _system_token_lock(slot) as locked:
+                    if locked:
+                        # Re-check under the lock: the holder before us may just have finished
+                        config = _read_system_config(slot)
+                        if config.last_updated_timestamp == seen_timestamp:
+                            return await TokenManager._refresh_and_store(
+                                slot, seen_timestamp, token_data["refresh_token"]
+                            )
+                        continue
+                
+                # Another instance is refreshing: wait for its result
+                if waited >= settings.SYSTEM_TOKEN_REFRESH_WAIT_SECONDS:
+                    logger.warning("Timed out waiting for another instance's token refresh")
+                    # The compare-and-swap still keeps a newer token from being clobbered
+                    return await TokenManager._refresh_and_store(
+                        slot, seen_timestamp, token_data["refresh_token"]
+                    )
+                await asyncio.sleep(REFRESH_POLL_SECONDS)
+                waited += REFRESH_POLL_SECONDS
+    
     @staticmethod
     async def get_user_token(user: User, db: Session) -> str:
         """
@@ -173,7 +514,7 @@ class TokenManager:
         # Refresh if expired or expiring within 5 minutes
         if user.sf311_token_expires_at and now >= (user.sf311_token_expires_at - 300):
             logger.info(f"User {user.phone} token expired/expiring, refreshing...")
-            new_token_data = TokenManager._refresh_existing_token(
+            new_token_data = await TokenManager._refresh_existing_token(
                 user.sf311_refresh_token
             )
             
@@ -198,7 +539,7 @@ class TokenManager:
         """
         logger.info(f"Assigning SF 311 token to user {user.phone}...")
         
-        token_data = TokenManager._acquire_new_token()
+        token_data = await TokenManager._acquire_new_token()
         
         user.sf311_access_token = token_data["access_token"]
         user.sf311_refresh_token = token_data["refresh_token"]
@@ -212,89 +553,107 @@ class TokenManager:
     @staticmethod
     async def refresh_system_token_proactively(db: Session) -> None:
         """
-        Proactively refresh the system token.
+        Proactively refresh every system token in the pool.
         Call this from a cron job every 12 hours.
         """
         logger.info("Proactive system token refresh (cron job)...")
         
+        for slot in range(len(system_token_pool.slots)):
+            config = _load_system_config(db, slot)
+            
+            if not config:
+                logger.warning(f"No system token {slot} to refresh, creating one...")
+                await TokenManager._create_system_token(slot)
+                continue
+            
+            try:
+                await TokenManager._refresh_system_token(slot, config.last_updated_timestamp)
+                logger.info(f"✓ System token {slot} proactively refreshed")
+            except Exception as e:
+                # Keep going: the other tokens still serve traffic
+                logger.error(f"Proactive refresh of system token {slot} failed: {e}")
+    
+    @staticmethod
+    def _load_refresh_cursor(db: Session) -> int:
+        """Last user id handled by an unfinished proactive refresh (0 = start over)."""
         config = db.query(SystemConfig).filter(
-            SystemConfig.key == SYSTEM_TOKEN_KEY
+            SystemConfig.key == USER_REFRESH_CURSOR_KEY
         ).first()
-        
-        if not config:
-            logger.warning("No system token to refresh, creating one...")
-            await TokenManager.ensure_system_token_exists(db)
-            return
-        
-        token_data = json.loads(config.value)
-        
-        try:
-            new_token_data = TokenManager._refresh_existing_token(
-                token_data["refresh_token"]
-            )
-            config.value = json.dumps(new_token_data)
-            config.last_updated_timestamp = new_token_data["obtained_at"]
-            db.commit()
-            logger.info("✓ System token proactively refreshed")
-        except Exception as e:
-            logger.error(f"Proactive refresh failed: {e}")
-            # Try acquiring a brand new token
-            logger.info("Acquiring brand new token as fallback...")
-            new_token_data = TokenManager._acquire_new_token()
-            config.value = json.dumps(new_token_data)
-            config.last_updated_timestamp = new_token_data["obtained_at"]
-            db.commit()
-            logger.info("✓ New system token acquired")
+        return json.loads(config.value).get("after_id", 0) if config else 0
+    
+    @staticmethod
+    def _save_refresh_cursor(db: Session, after_id: int) -> None:
+        """Stage the cursor in the current transaction (committed with the batch)."""
+        db.merge(SystemConfig(
+            key=USER_REFRESH_CURSOR_KEY,
+            value=json.dumps({"after_id": after_id}),
+            last_updated_timestamp=int(time.time()),
+        ))
     
     @staticmethod
-    async def refresh_user_tokens_proactively(db: Session) -> dict:
+    async def refresh_user_tokens_proactively(db: Session, budget_seconds: float = None) -> dict:
         """
         Proactively refresh all user tokens that expire within 24 hours.
         Call this from a cron job.
-        Returns dict with success/failure counts.
+        
+        Users are walked in id order, TOKEN_REFRESH_BATCH_SIZE at a time; each
+        batch is refreshed with up to TOKEN_REFRESH_CONCURRENCY requests in flight
+        and committed once, together with the id cursor. A run that reaches its
+        time budget stops after the current batch and the next run resumes after
+        the cursor; a run that reaches the end resets it.
+        Returns dict with success/failure counts and throughput.
         """
         logger.info("Proactive user token refresh (cron job)...")
         
+        start = time.monotonic()
+        budget = settings.TOKEN_REFRESH_RUN_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+        stats = UserRefreshStats(resumed_from=TokenManager._load_refresh_cursor(db))
+        cursor = stats.resumed_from
+        
         now = int(time.time())
         expiring_threshold = now + (24 * 3600)  # 24 hours from now
         
-        # Find users with tokens expiring soon
-        users = db.query(User).filter(
-            User.verified == True,
-            User.sf311_access_token.isnot(None),
-            User.sf311_refresh_token.isnot(None),
-            User.sf311_token_expires_at < expiring_threshold,
-        ).all()
-        
-        logger.info(f"Found {len(users)} users with tokens expiring within 24h")
-        
-        success_count = 0
-        failure_count = 0
+        async def refresh(user: User) -> dict:
+            return await TokenManager._refresh_existing_token(user.sf311_refresh_token)
         
-        for user in users:
-            try:
-                new_token_data = TokenManager._refresh_existing_token(
-                    user.sf311_refresh_token
-                )
+        while time.monotonic() - start < budget:
+            # Next batch of users with tokens expiring soon
+            users = db.query(User).filter(
+                User.verified == True,
+                User.sf311_access_token.isnot(None),
+                User.sf311_refresh_token.isnot(None),
+                User.sf311_token_expires_at < expiring_threshold,
+                User.id > cursor,
+            ).order_by(User.id).limit(settings.TOKEN_REFRESH_BATCH_SIZE).all()
+            
+            if not users:
+                stats.complete = True
+                cursor = 0
+                break
+            
+            results = await run_bounded(users, refresh, settings.TOKEN_REFRESH_CONCURRENCY)
+            for user, new_token_data in results:
+                if isinstance(new_token_data, BaseException):
+                    logger.error(f"Failed to refresh token for user {user.phone}: {new_token_data}")
+                    stats.failed += 1
+                    continue
                 user.sf311_access_token = new_token_data["access_token"]
                 user.sf311_refresh_token = new_token_data["refresh_token"]
                 user.sf311_token_expires_at = (
                     new_token_data["obtained_at"] + new_token_data["expires_in"]
                 )
-                db.commit()
-                success_count += 1
-                logger.info(f"✓ Refreshed token for user {user.phone}")
-            except Exception as e:
-                logger.error(f"Failed to refresh token for user {user.phone}: {e}")
-                failure_count += 1
+                stats.refreshed += 1
+            
+            cursor = users[-1].id
+            TokenManager._save_refresh_cursor(db, cursor)
+            db.commit()
+            stats.batches += 1
         
-        logger.info(
-            f"Proactive user token refresh complete: "
-            f"{success_count} succeeded, {failure_count} failed"
-        )
+        if stats.complete:
+            TokenManager._save_refresh_cursor(db, 0)
+            db.commit()
+        stats.cursor = cursor
+        stats.seconds = time.monotonic() - start
         
-        return {
-            "success_count": success_count,
-            "failure_count": failure_count,
-            "total_users": len(users),
-        }
+        logger.info(f"Proactive user token refresh: {stats.summary()}")
+        return stats.as_dict()
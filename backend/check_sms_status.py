@@ -1,26 +1,48 @@
 #!/usr/bin/env python3
-"""Check SMS delivery status from Twilio."""
+"""
+Check SMS delivery status from the delivery ledger.
+
+Statuses arrive through Twilio's status callback (/webhooks/twilio/status) and
+are applied by /cron/send-alerts, so no Twilio API calls are made here.
+
+Usage:
+    python check_sms_status.py            # status counts for the last 24h
+    python check_sms_status.py SM...      # one message
+"""
 import sys
+from datetime import datetime, timedelta
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from twilio.rest import Client
-from app.core.config import settings
-
-client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-
-# Check the message we just sent
-message_sid = "SMca4c8368c6f2693d94cae1997a995462"
+from sqlalchemy import func
 
-message = client.messages(message_sid).fetch()
+from app.core.database import SessionLocal
+from app.models import SMSDelivery, SMSStatusEvent
 
-print(f"Message SID: {message.sid}")
-print(f"Status: {message.status}")
-print(f"To: {message.to}")
-print(f"From: {message.from_}")
-print(f"Body: {message.body[:50]}...")
-print(f"Error Code: {message.error_code}")
-print(f"Error Message: {message.error_message}")
-print(f"Date Created: {message.date_created}")
-print(f"Date Updated: {message.date_updated}")
-print(f"Date Sent: {message.date_sent}")
+db = SessionLocal()
+try:
+    if len(sys.argv) > 1:
+        message_sid = sys.argv[1]
+        deliveries = db.query(SMSDelivery).filter(SMSDelivery.twilio_sid == message_sid).all()
+        if not deliveries:
+            print(f"No ledger entry for {message_sid}")
+        for delivery in deliveries:
+            print(f"Message SID: {delivery.twilio_sid}")
+            print(f"Report: {delivery.report_id}")
+            print(f"To: {delivery.phone}")
+            print(f"Status: {delivery.status or 'no callback yet'}")
+            print(f"Error Code: {delivery.error_code}")
+            print(f"Date Created: {delivery.created_at}")
+            print(f"Date Updated: {delivery.updated_at}")
+    else:
+        since = datetime.utcnow() - timedelta(hours=24)
+        counts = db.query(SMSDelivery.status, func.count(SMSDelivery.id)).filter(
+            SMSDelivery.created_at >= since
+        ).group_by(SMSDelivery.status).all()
+        print("Deliveries in the last 24h:")
+        for status, count in sorted(counts, key=lambda row: row[1], reverse=True):
+            print(f"  {status or 'no callback yet'}: {count}")
+        pending_events = db.query(func.count(SMSStatusEvent.id)).scalar()
+        print(f"Status callbacks waiting to be applied: {pending_events}")
+finally:
+    db.close()
@@ -0,0 +1,263 @@
+"""
+Async variant of auth.py's flows for use inside the API's event loop.
+
+Same four-step authorization_code flow and refresh grant as auth.acquire_tokens /
+auth.refresh_tokens, but over a caller-supplied (pooled, keep-alive) httpx
+transport instead of a fresh blocking urllib opener per call.
+
+Parity with the urllib opener:
+  - each flow runs on its own short-lived httpx.AsyncClient over the shared
+    transport, so it has its own cookie jar: the _spot_session cookie never
+    lands on the caller's long-lived client or in a concurrent flow
+  - http/https redirects are followed like urllib's HTTPRedirectHandler
+    (301/302/303 turn a POST into a GET; 307/308 only for GET/HEAD)
+  - a redirect to a custom scheme (sf311://auth?code=...) stops the flow by
+    raising NonHttpRedirect, like RedirectCatchingHandler
+
+The sync API in auth.py stays as-is for scripts.
+"""
+
+from __future__ import annotations
+
+import json
+import urllib.parse
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from auth import (
+    AuthTokens,
+    NonHttpRedirect,
+    _extract_code_from_sf311_redirect,
+    _extract_convey_form,
+    _pick_identity_provider_id,
+)
+
+# Same limit as urllib's HTTPRedirectHandler.max_redirections
+MAX_REDIRECTS = 10
+
+_HTML_ACCEPT = "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
+
+
+class _BorrowedTransport(httpx.AsyncBaseTransport):
+    """Lends the pooled transport to a flow client without letting it close the pool."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # The pool belongs to the long-lived client
+        pass
+
+
+def _flow_client(transport: httpx.AsyncBaseTransport) -> httpx.AsyncClient:
+    """Short-lived client (and cookie jar) for one flow, over the shared connection pool."""
+    return httpx.AsyncClient(transport=_BorrowedTransport(transport))
+
+
+async def _request(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    *,
+    headers: Optional[Dict[str, str]] = None,
+    data: Optional[bytes] = None,
+    timeout: float = 30,
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Send a request on a flow client, following http(s) redirects (cookies stay in its jar)."""
+    headers = dict(headers or {})
+    for _ in range(MAX_REDIRECTS + 1):
+        request = client.build_request(method, url, headers=headers, content=data, timeout=timeout)
+        response = await client.send(request, follow_redirects=False)
+        body = await response.aread()
+
+        location = response.headers.get("location")
+        if response.status_code not in (301, 302, 303, 307, 308) or not location:
+            return response.status_code, dict(response.headers), body
+
+        parsed = urllib.parse.urlparse(location)
+        if parsed.scheme and parsed.scheme not in ("http", "https"):
+            # Intentional escape hatch for sf311://auth?code=...
+            raise NonHttpRedirect(location)
+
+        method = method.upper()
+        if response.status_code in (307, 308) and method not in ("GET", "HEAD"):
+            # urllib refuses to re-POST on 307/308 and surfaces the response
+            return response.status_code, dict(response.headers), body
+        if response.status_code in (301, 302, 303) and method not in ("GET", "HEAD"):
+            method = "GET"
+            data = None
+            headers = {
+                k: v for k, v in headers.items()
+                if k.lower() not in ("content-type", "content-length")
+            }
+        url = urllib.parse.urljoin(url, location)
+
+    raise RuntimeError(f"Too many redirects fetching {url}")
+
+
+def _tokens_from_response(status: int, body: bytes, what: str) -> AuthTokens:
+    if status != 200:
+        raise RuntimeError(f"POST /auth/token ({what}) failed: HTTP {status}\n{body[:5000].decode('utf-8', errors='replace')}")
+
+    try:
+        token_json: Dict[str, Any] = json.loads(body.decode("utf-8"))
+    except Exception as e:
+        raise RuntimeError(f"Failed to parse /auth/token {what} JSON: {e}")
+
+    if (token_json.get("token_type") or "").lower() != "bearer":
+        raise RuntimeError(f"Unexpected token_type in {what} response: {token_json.get('token_type')!r}")
+    if not token_json.get("access_token") or not token_json.get("refresh_token"):
+        raise RuntimeError(f"Missing access_token/refresh_token in {what} response.")
+
+    return AuthTokens(
+        token_type=str(token_json["token_type"]),
+        access_token=str(token_json["access_token"]),
+        refresh_token=str(token_json["refresh_token"]),
+        id_token=str(token_json.get("id_token")) if token_json.get("id_token") else None,
+        expires_in=int(token_json.get("expires_in") or 0),
+        scope=str(token_json.get("scope") or ""),
+    )
+
+
+async def acquire_tokens(
+    transport: httpx.AsyncBaseTransport,
+    *,
+    base_url: str,
+    client_id: str,
+    redirect_uri: str,
+    scope: str,
+    identity_provider_id: Optional[str],
+    user_agent_web: str,
+    user_agent_app: str,
+    timeout: float,
+) -> AuthTokens:
+    """Async auth.acquire_tokens(): /auth -> /auth/convey -> /auth/callback -> /auth/token."""
+    async with _flow_client(transport) as client:
+        return await _acquire_tokens(
+            client,
+            base_url=base_url,
+            client_id=client_id,
+            redirect_uri=redirect_uri,
+            scope=scope,
+            identity_provider_id=identity_provider_id,
+            user_agent_web=user_agent_web,
+            user_agent_app=user_agent_app,
+            timeout=timeout,
+        )
+
+
+async def _acquire_tokens(
+    client: httpx.AsyncClient,
+    *,
+    base_url: str,
+    client_id: str,
+    redirect_uri: str,
+    scope: str,
+    identity_provider_id: Optional[str],
+    user_agent_web: str,
+    user_agent_app: str,
+    timeout: float,
+) -> AuthTokens:
+    # 1) GET /auth
+    auth_url = (
+        f"{base_url}/auth?"
+        + urllib.parse.urlencode(
+            {
+                "scope": scope,
+                "redirect_uri": redirect_uri,
+                "client_id": client_id,
+                "response_type": "code",
+            }
+        )
+    )
+    status, _, body = await _request(
+        client,
+        "GET",
+        auth_url,
+        headers={"Accept": _HTML_ACCEPT, "User-Agent": user_agent_web},
+        timeout=timeout,
+    )
+    if status != 200:
+        raise RuntimeError(f"GET /auth failed: HTTP {status}\n{body[:5000].decode('utf-8', errors='replace')}")
+
+    convey_action, form_fields = _extract_convey_form(body)
+    form_fields["client_id"] = client_id
+    form_fields["scope"] = scope
+    form_fields["response_type"] = "code"
+    form_fields["redirect_uri"] = redirect_uri
+    form_fields["identity_provider_id"] = _pick_identity_provider_id(form_fields, identity_provider_id)
+
+    # 2) POST /auth/convey -> 302 /auth/callback -> 302 sf311://auth?code=...
+    # The callback hop (sync step 3) is followed by _request like urllib does.
+    convey_url = urllib.parse.urljoin(base_url + "/", convey_action.lstrip("/"))
+    try:
+        status2, _, _ = await _request(
+            client,
+            "POST",
+            convey_url,
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Accept": _HTML_ACCEPT,
+                "Origin": base_url,
+                "Referer": auth_url,
+                "User-Agent": user_agent_web,
+            },
+            data=urllib.parse.urlencode(form_fields).encode("utf-8"),
+            timeout=timeout,
+        )
+    except NonHttpRedirect as e:
+        sf311_location = e.location
+    else:
+        raise RuntimeError(f"POST /auth/convey expected a redirect to {redirect_uri}, got HTTP {status2}")
+
+    code = _extract_code_from_sf311_redirect(sf311_location)
+
+    # 3) POST /auth/token (native app call)
+    status4, _, body4 = await _request(
+        client,
+        "POST",
+        f"{base_url}/auth/token",
+        headers={"Content-Type": "application/json", "Accept": "*/*", "User-Agent": user_agent_app},
+        data=json.dumps({
+            "code": code,
+            "redirect_uri": redirect_uri,
+            "client_id": client_id,
+            "grant_type": "authorization_code",
+        }).encode("utf-8"),
+        timeout=timeout,
+    )
+    return _tokens_from_response(status4, body4, "authorization_code")
+
+
+async def refresh_tokens(
+    transport: httpx.AsyncBaseTransport,
+    *,
+    base_url: str,
+    client_id: str,
+    redirect_uri: str,
+    scope: str,
+    refresh_token: str,
+    user_agent_app: str,
+    timeout: float,
+) -> AuthTokens:
+    """Async auth.refresh_tokens(): POST /auth/token with grant_type=refresh_token."""
+    async with _flow_client(transport) as client:
+        status, _, body = await _request(
+            client,
+            "POST",
+            f"{base_url}/auth/token",
+            headers={"Content-Type": "application/json", "Accept": "*/*", "User-Agent": user_agent_app},
+            data=json.dumps({
+                "refresh_token": refresh_token,
+                "redirect_uri": redirect_uri,
+                "client_id": client_id,
+                "grant_type": "refresh_token",
+                "scope": scope,
+            }).encode("utf-8"),
+            timeout=timeout,
+        )
+    return _tokens_from_response(status, body, "refresh")
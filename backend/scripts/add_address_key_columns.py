@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Add address_normalized / address_key columns to alerts and reports, and
+backfill existing rows. Safe to re-run: only rows not yet normalized are touched.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine, SessionLocal
+from app.models import Alert, Report
+from app.services.address_utils import address_fields
+from app.services.sf311 import ticket_address
+
+BATCH_SIZE = 1000
+
+
+def backfill(db, model, get_address) -> int:
+    """Fill the address columns for rows that don't have them yet, in id order."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.query(model).filter(
+            model.address_normalized.is_(None),
+            model.id > last_id,
+        ).order_by(model.id).limit(BATCH_SIZE).all()
+        if not rows:
+            return updated
+        
+        db.bulk_update_mappings(model, [
+            {"id": row.id, **address_fields(get_address(row))}
+            for row in rows
+        ])
+        db.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+
+
+if __name__ == "__main__":
+    print("Adding address key columns...")
+    
+    with engine.begin() as conn:
+        for table in ("alerts", "reports"):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS address_normalized VARCHAR"))
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS address_key VARCHAR"))
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS address_key_version INTEGER"))
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_address_key ON {table} (address_key)"
+            ))
+    
+    print("Backfilling existing rows...")
+    db = SessionLocal()
+    try:
+        alerts = backfill(db, Alert, lambda alert: alert.address)
+        reports = backfill(db, Report, lambda report: ticket_address(report.report_data or {}))
+    finally:
+        db.close()
+    
+    print(f"✓ Backfilled {alerts} alerts and {reports} reports")
+    print("  Rows whose address has no unambiguous key keep address_key NULL (fuzzy match).")
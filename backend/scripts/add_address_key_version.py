@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Add address_key_version to alerts and reports and recompute address_key /
+address_normalized for every row whose key was produced by an older parser
+(or never computed).
+
+Keys backfilled before parse_address() differ for some inputs (split ordinals
+like "32 11 Th St" -> "32 11th st", lettered numbers like "12A"). Until this
+runs, the poller ignores stale keys and parses those addresses on the fly.
+Safe to re-run: only rows not at ADDRESS_KEY_VERSION are touched.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import or_, text
+
+from app.core.database import engine, SessionLocal
+from app.models import Alert, Report
+from app.services.address_utils import ADDRESS_KEY_VERSION, address_fields
+from app.services.sf311 import ticket_address
+
+BATCH_SIZE = 1000
+
+
+def recompute(db, model, get_address) -> int:
+    """Rewrite the address columns of stale rows, in id order."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.query(model).filter(
+            or_(
+                model.address_key_version.is_(None),
+                model.address_key_version != ADDRESS_KEY_VERSION,
+            ),
+            model.id > last_id,
+        ).order_by(model.id).limit(BATCH_SIZE).all()
+        if not rows:
+            return updated
+        
+        db.bulk_update_mappings(model, [
+            {"id": row.id, **address_fields(get_address(row))}
+            for row in rows
+        ])
+        db.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+
+
+if __name__ == "__main__":
+    print("Adding address key version column...")
+    
+    with engine.begin() as conn:
+        for table in ("alerts", "reports"):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS address_normalized VARCHAR"))
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS address_key VARCHAR"))
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS address_key_version INTEGER"))
+    
+    print(f"Recomputing address keys (version {ADDRESS_KEY_VERSION})...")
+    db = SessionLocal()
+    try:
+        alerts = recompute(db, Alert, lambda alert: alert.address)
+        reports = recompute(db, Report, lambda report: ticket_address(report.report_data or {}))
+    finally:
+        db.close()
+    
+    print(f"✓ Recomputed {alerts} alerts and {reports} reports")
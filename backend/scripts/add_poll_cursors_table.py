@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Add poll_cursors table to existing database.
+Run this once to add the new table without dropping existing data.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.models.poll_cursor import PollCursor
+
+if __name__ == "__main__":
+    print("Adding poll_cursors table to database...")
+    
+    # Create only the PollCursor table (won't affect existing tables)
+    PollCursor.__table__.create(engine, checkfirst=True)
+    
+    # Columns added after the table was first created
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE poll_cursors ADD COLUMN IF NOT EXISTS ticket_rate FLOAT"))
+        conn.execute(text("ALTER TABLE poll_cursors ADD COLUMN IF NOT EXISTS catchup_seen_at TIMESTAMP"))
+        # end_cursor used to hold the last page's cursor; it now means "resume here"
+        conn.execute(text("UPDATE poll_cursors SET end_cursor = NULL WHERE catchup_seen_at IS NULL"))
+    
+    print("✓ poll_cursors table created successfully!")
+    print("  Table: poll_cursors")
+    print("  Columns: key (primary), last_seen_at, end_cursor, catchup_seen_at, ticket_rate, created_at, updated_at")
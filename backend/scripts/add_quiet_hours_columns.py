@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Add quiet hours (users.quiet_hours_start / quiet_hours_end / timezone) and the
+deferred-delivery queue (DEFERRED status, reports.deliver_after + index).
+Safe to re-run.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+
+if __name__ == "__main__":
+    print("Adding quiet hours columns...")
+    
+    # New enum values must be committed before use, so outside the main transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ALTER TYPE smsstatus ADD VALUE IF NOT EXISTS 'DEFERRED'"))
+    
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS quiet_hours_start VARCHAR"))
+        conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS quiet_hours_end VARCHAR"))
+        conn.execute(text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone VARCHAR DEFAULT 'America/Los_Angeles'"
+        ))
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS deliver_after TIMESTAMP"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_sms_status_deliver_after "
+            "ON reports (sms_status, deliver_after)"
+        ))
+    
+    print("✓ quiet hours columns added successfully!")
+    print("  Users: quiet_hours_start, quiet_hours_end, timezone")
+    print("  Reports: deliver_after (+ DEFERRED status, index on (sms_status, deliver_after))")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Add SMS outbox lease columns (lease_owner, lease_expires_at) to reports,
+plus the partial index used to claim pending rows. Safe to re-run.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+
+if __name__ == "__main__":
+    print("Adding outbox lease columns to reports...")
+    
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS lease_owner VARCHAR"))
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_outbox_pending "
+            "ON reports (lease_expires_at, id) WHERE sms_sent = false"
+        ))
+    
+    print("✓ reports outbox columns added successfully!")
+    print("  Columns: lease_owner, lease_expires_at")
+    print("  Index: ix_reports_outbox_pending (lease_expires_at, id) WHERE sms_sent = false")
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Add reports.sms_priority (dispatch lane: 0 = paid, 1 = free), backfill pending
+rows from the owning user's account type, and add the claim-order index.
+Safe to re-run.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+
+if __name__ == "__main__":
+    print("Adding sms_priority column to reports...")
+    
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS sms_priority INTEGER NOT NULL DEFAULT 1"))
+        conn.execute(text("""
+            UPDATE reports SET sms_priority = 0
+            FROM alerts, users
+            WHERE reports.alert_id = alerts.id
+              AND alerts.user_id = users.id
+              AND users.account_type = 'PAID'
+              AND reports.sms_status = 'PENDING'
+        """))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_sms_status_priority_next_attempt "
+            "ON reports (sms_status, sms_priority, sms_next_attempt_at)"
+        ))
+    
+    print("✓ reports.sms_priority added successfully!")
+    print("  Index: ix_reports_sms_status_priority_next_attempt (sms_status, sms_priority, sms_next_attempt_at)")
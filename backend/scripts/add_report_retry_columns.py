@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Add SMS retry / dead-letter columns to reports (sms_status, sms_attempts,
+sms_next_attempt_at, sms_last_error), backfill them from sms_sent, and
+replace the outbox index with (sms_status, sms_next_attempt_at). Safe to re-run.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+
+if __name__ == "__main__":
+    print("Adding SMS retry columns to reports...")
+    
+    with engine.begin() as conn:
+        conn.execute(text("""
+            DO $$ BEGIN
+                CREATE TYPE smsstatus AS ENUM ('PENDING', 'SENT', 'CANCELLED', 'DEAD');
+            EXCEPTION WHEN duplicate_object THEN NULL;
+            END $$;
+        """))
+        conn.execute(text(
+            "ALTER TABLE reports ADD COLUMN IF NOT EXISTS sms_status smsstatus NOT NULL DEFAULT 'PENDING'"
+        ))
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS sms_attempts INTEGER NOT NULL DEFAULT 0"))
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS sms_next_attempt_at TIMESTAMP"))
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS sms_last_error VARCHAR"))
+        
+        # Existing rows: sent ones are SENT, pending ones are due now
+        conn.execute(text(
+            "UPDATE reports SET sms_status = 'SENT', sms_next_attempt_at = NULL "
+            "WHERE sms_sent = true AND sms_status = 'PENDING'"
+        ))
+        conn.execute(text(
+            "UPDATE reports SET sms_next_attempt_at = COALESCE(lease_expires_at, created_at) "
+            "WHERE sms_status = 'PENDING' AND sms_next_attempt_at IS NULL"
+        ))
+        
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_sms_status_next_attempt "
+            "ON reports (sms_status, sms_next_attempt_at)"
+        ))
+        conn.execute(text("DROP INDEX IF EXISTS ix_reports_outbox_pending"))
+    
+    print("✓ reports retry columns added successfully!")
+    print("  Columns: sms_status, sms_attempts, sms_next_attempt_at, sms_last_error")
+    print("  Index: ix_reports_sms_status_next_attempt (sms_status, sms_next_attempt_at)")
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Add reports.sms_sent_at (used by digest mode's per-user rate cap). Safe to re-run.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+
+if __name__ == "__main__":
+    print("Adding sms_sent_at column to reports...")
+    
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS sms_sent_at TIMESTAMP"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reports_sms_sent_at ON reports (sms_sent_at)"
+        ))
+    
+    print("✓ reports.sms_sent_at added successfully!")
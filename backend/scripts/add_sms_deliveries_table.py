@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Add sms_deliveries table (idempotency ledger: Twilio SID per report + phone).
+Run this once to add the new table without dropping existing data.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import engine
+from app.models.sms_delivery import SMSDelivery
+
+if __name__ == "__main__":
+    print("Adding sms_deliveries table to database...")
+    
+    # Create only the SMSDelivery table (won't affect existing tables)
+    SMSDelivery.__table__.create(engine, checkfirst=True)
+    
+    print("✓ sms_deliveries table created successfully!")
+    print("  Table: sms_deliveries")
+    print("  Columns: id, report_id, phone, twilio_sid, created_at, updated_at")
+    print("  Unique: (report_id, phone)")
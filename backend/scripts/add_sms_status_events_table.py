@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Add sms_status_events table (buffer for Twilio status callbacks) and the
+status / error_code columns on sms_deliveries. Safe to re-run.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.models.sms_delivery import SMSStatusEvent
+
+if __name__ == "__main__":
+    print("Adding sms_status_events table to database...")
+    
+    # Create only the SMSStatusEvent table (won't affect existing tables)
+    SMSStatusEvent.__table__.create(engine, checkfirst=True)
+    
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE sms_deliveries ADD COLUMN IF NOT EXISTS status VARCHAR"))
+        conn.execute(text("ALTER TABLE sms_deliveries ADD COLUMN IF NOT EXISTS error_code INTEGER"))
+    
+    print("✓ sms_status_events table created successfully!")
+    print("  Table: sms_status_events (id, message_sid, status, error_code, created_at, updated_at)")
+    print("  Columns added: sms_deliveries.status, sms_deliveries.error_code")
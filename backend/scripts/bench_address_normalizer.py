@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: compiled single-pass normalize_addr vs the original
+chain of str.replace calls, on a corpus of real SF311 / alert addresses.
+
+Also verifies the new normalizer's output is identical on every address.
+
+    python scripts/bench_address_normalizer.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.address_utils import normalize_addr
+
+# Ticket addresses as returned by SF311 (location.address) and alert addresses
+# as typed/geocoded on the frontend (with city/state/zip suffixes).
+CORPUS = [
+    "131 Fell St",
+    "1341 Jessie St",
+    "1338 Jessie St",
+    "1321 Jessie St",
+    "32 11 Th St",
+    "10 Th St",
+    "62 Polk St",
+    "455 Fell St",
+    "197 Fell St",
+    "129 Oak St",
+    "99 Oak St",
+    "189 Oak St",
+    "196 Oak St",
+    "79 Franklin St",
+    "410 Linden St",
+    "124 Lily St",
+    "110 Minna St",
+    "140 Mason St",
+    "1045 Mission St",
+    "1465 Market St",
+    "555 Market St, San Francisco, CA",
+    "580 California St",
+    "580 California St, San Francisco, CA",
+    "580 California St, San Francisco, CA 94104",
+    "580 California Street, San Francisco, CA",
+    "61 Chattanooga St",
+    "61 Chattanooga Street",
+    "61 Chattanooga Street, San Francisco, California 94114",
+    "336 Scott St, San Francisco",
+    "Intersection Annie St, Stevenson St",
+    "Intersection of Mission St & 16th St",
+    "1 Dr Carlton B Goodlett Pl",
+    "1 Dr. Carlton B. Goodlett Place, San Francisco, CA 94102",
+    "2300 Lombard Street",
+    "100 Van Ness Avenue",
+    "3251 20th Ave",
+    "501 Stanyan St, Golden Gate Park",
+    "1 Ferry Building, San Francisco, CA 94111",
+    "Embarcadero Center, Drumm St",
+    "2001 Jerrold Avenue",
+    "400 South Van Ness Ave.",
+    "1200 Great Hwy",
+    "50 Lansing Street",
+    "24 Presidio Terrace",
+    "101 Grove Street",
+    "1000 Bush Street, Apt. 4",
+    "Alemany Blvd & Mission St",
+    "1650 Mission Street, Suite 400",
+    "Hagiwara Tea Garden Dr",
+    "2 Marina Boulevard",
+    "Mount Davidson Court",
+    "150 Otis St",
+    "900 Market St",
+    "Twin Peaks Blvd",
+    "3 Embarcadero Center",
+    "750 Kearny Street",
+    "1 Telegraph Hill Blvd",
+    "600 Montgomery Street",
+    "Lake Merced Blvd, John Muir Dr",
+    "499 Alabama St",
+    "1 Zoo Road",
+    "Sunset Boulevard & Lincoln Way",
+    "20 Cedar Lane",
+    "Jackson Square",
+    "Crissy Field Avenue",
+    "O'Farrell St & Jones St",
+    "Portola Drive",
+    "100 Font Blvd",
+    "Marina Green Dr",
+    "Hunters Point Boulevard",
+    "Cesar Chavez Street & Bayshore Boulevard",
+    "Union Square, San Francisco",
+    "80 Heron Court",
+    "2130 Fulton Street",
+    "10 Pier",
+    "Valencia St Between 18th St & 19th St",
+    "1399 Parkway Drive",
+    "Junipero Serra Blvd & 19th Ave",
+    "John F Kennedy Dr",
+    "Sloat Blvd & Great Highway",
+    "Bernal Heights Boulevard",
+]
+
+_LEGACY_REPLACEMENTS = [
+    (" boulevard", " blvd"),
+    (" terrace", " ter"),
+    (" avenue", " ave"),
+    (" street", " st"),
+    (" drive", " dr"),
+    (" court", " ct"),
+    (" place", " pl"),
+    (" lane", " ln"),
+    (" road", " rd"),
+    (" circle", " cir"),
+    (" highway", " hwy"),
+    (" parkway", " pkwy"),
+    (" square", " sq"),
+]
+
+
+def legacy_normalize_addr(a: str) -> str:
+    """The original implementation (lowercase, 2 punctuation + 13 sequential replaces)."""
+    a = a.lower().strip()
+    a = a.replace(".", "").replace(",", "")
+    for full, abbr in _LEGACY_REPLACEMENTS:
+        a = a.replace(full, abbr)
+    return a
+
+
+def main() -> int:
+    # 1) Identical output on the corpus
+    mismatches = [
+        (addr, legacy_normalize_addr(addr), normalize_addr(addr))
+        for addr in CORPUS
+        if legacy_normalize_addr(addr) != normalize_addr(addr)
+    ]
+    if mismatches:
+        for addr, old, new in mismatches:
+            print(f"MISMATCH {addr!r}: legacy={old!r} new={new!r}")
+        return 1
+    print(f"✓ Output identical on {len(CORPUS)} addresses")
+
+    # 2) Speed: legacy vs compiled (uncached) vs compiled + memo (warm)
+    uncached = normalize_addr.__wrapped__
+    number = 2000
+
+    def run(fn):
+        for addr in CORPUS:
+            fn(addr)
+
+    results = {
+        "legacy str.replace chain": timeit.timeit(lambda: run(legacy_normalize_addr), number=number),
+        "compiled single pass": timeit.timeit(lambda: run(uncached), number=number),
+        "compiled + memo (warm)": timeit.timeit(lambda: run(normalize_addr), number=number),
+    }
+
+    calls = number * len(CORPUS)
+    baseline = results["legacy str.replace chain"]
+    for name, seconds in results.items():
+        print(f"{name:28s} {seconds / calls * 1e9:8.0f} ns/call  {baseline / seconds:5.1f}x")
+    print(f"cache: {normalize_addr.cache_info()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
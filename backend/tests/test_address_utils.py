@@ -0,0 +1,196 @@
+"""parse_address variants, street probes, AddressIndex matching, and the stored report address columns."""
+import pytest
+
+from app.models import Alert, User
+from app.services.address_utils import (
+    ADDRESS_KEY_VERSION,
+    MAX_RANGE_PROBES,
+    AddressIndex,
+    ParsedAddress,
+    normalize_addr,
+    parse_address,
+)
+from app.services.poller import store_new_reports
+
+
+@pytest.mark.parametrize(
+    "address, number, street, suffix, unit",
+    [
+        ("580 California Street, San Francisco, CA 94104", "580", "california", "st", None),
+        ("580 CALIFORNIA ST", "580", "california", "st", None),
+        ("1000 Bush Street, Apt. 4", "1000", "bush", "st", "4"),
+        ("1000 Bush St Apt 4", "1000", "bush", "st", "4"),
+        ("1 Market St #200", "1", "market", "st", "200"),
+        ("2 Mission St Suite 400, San Francisco", "2", "mission", "st", "400"),
+        ("12a Park Avenue", "12", "park", "ave", None),
+        ("100 St Francis Blvd", "100", "st francis", "blvd", None),
+        ("32 11 Th St", "32", "11th", "st", None),
+        ("800 Presidio Way", "800", "presidio", "way", None),
+        ("Golden Gate Park", None, "golden gate park", None, None),
+    ],
+)
+def test_parse_address_units_and_street_types(address, number, street, suffix, unit):
+    parsed = parse_address(address)
+    assert (parsed.number, parsed.street, parsed.suffix, parsed.unit) == (number, street, suffix, unit)
+
+
+@pytest.mark.parametrize(
+    "address",
+    ["100 Market St", "100 Market Street", "100 market st.", "100 Market St, San Francisco, CA 94105"],
+)
+def test_street_type_spellings_share_a_key(address):
+    assert parse_address(address).key == "100 market st"
+
+
+def test_directional_street_names_are_kept_distinct():
+    assert parse_address("100 South Van Ness Ave").key == "100 south van ness ave"
+    assert parse_address("100 Van Ness Ave").key == "100 van ness ave"
+    assert parse_address("100 South Van Ness Ave").street_probes() != parse_address("100 Van Ness Ave").street_probes()
+
+
+def test_number_range_has_no_key():
+    parsed = parse_address("100-110 Main St")
+    assert (parsed.number, parsed.number_high, parsed.key) == ("100", "110", None)
+
+
+@pytest.mark.parametrize(
+    "address",
+    ["Intersection Annie St, Stevenson St", "Stevenson St & Annie St", "Annie Street / Stevenson Street"],
+)
+def test_intersections_are_order_independent(address):
+    parsed = parse_address(address)
+    assert parsed.is_intersection
+    assert parsed.key is None
+    assert parsed.intersection_key == "annie st & stevenson st"
+
+
+def test_street_probes():
+    assert parse_address("580 California St").street_probes() == [("580", "california")]
+    assert parse_address("100-106 Main St").street_probes() == [
+        ("100", "main"), ("102", "main"), ("104", "main"), ("106", "main"),
+    ]
+    # Backwards or absurdly wide ranges probe only the low number
+    assert parse_address("110-100 Main St").street_probes() == [("110", "main")]
+    wide = f"1-{2 * MAX_RANGE_PROBES + 1} Main St"
+    assert parse_address(wide).street_probes() == [("1", "main")]
+    # No number, or an intersection: nothing to probe
+    assert parse_address("Market St").street_probes() == []
+    assert parse_address("Mission St & 16th St").street_probes() == []
+    assert ParsedAddress().street_probes() == []
+
+
+def index_of(*addresses):
+    index = AddressIndex()
+    for address in addresses:
+        index.add(address, address)
+    return index
+
+
+def test_index_hits_and_misses():
+    index = index_of("580 California Street", "1 Main St", "Intersection Annie St, Stevenson St", "Market Street")
+
+    assert index.lookup("580 California St, San Francisco, CA 94104") == ["580 California Street"]
+    assert index.lookup("1 Main St, Unit 2") == ["1 Main St"]
+    assert index.lookup("11 Main St") == []
+    assert index.lookup("1 Main Ave") == []
+    assert index.lookup("Stevenson St & Annie St") == ["Intersection Annie St, Stevenson St"]
+    assert index.lookup("1200 Market St, San Francisco") == ["Market Street"]
+    assert index.lookup("") == []
+
+
+def test_index_range_ticket_hits_each_number_on_that_side():
+    index = index_of("102 Main St", "103 Main St", "112 Main St")
+    assert index.lookup("100-110 Main St") == ["102 Main St"]
+
+
+def test_index_uses_persisted_key_and_normalized_address():
+    index = AddressIndex()
+    index.add("ignored", "keyed", key="580 california st")
+    index.add("Golden Gate Park", "fuzzy", normalized=normalize_addr("Golden Gate Park"))
+
+    assert index.lookup("580 California Street") == ["keyed"]
+    assert index.lookup("Golden Gate Park, San Francisco") == ["fuzzy"]
+
+
+def old_nearby_filter(address, ticket_address):
+    """The normalized-string filter /reports/nearby used before AddressIndex."""
+    target_addr = normalize_addr(address)
+    ticket_addr = normalize_addr(ticket_address)
+    if target_addr in ticket_addr or ticket_addr in target_addr:
+        return True
+    if address.split()[0].isdigit():
+        target_number = address.split()[0]
+        if ticket_addr.startswith(target_number + " "):
+            target_street = " ".join(target_addr.split()[1:])
+            ticket_street = " ".join(ticket_addr.split()[1:])
+            return target_street in ticket_street or ticket_street in target_street
+    return False
+
+
+TARGETS = [
+    "580 California Street",
+    "580 California St, San Francisco, CA 94104",
+    "61 Chattanooga Street",
+    "1 Main St",
+    "Market Street",
+    "100 Main St Apt 4",
+    "1000 Bush Street",
+]
+TICKETS = [
+    "580 California St, San Francisco, CA 94104",
+    "580 CALIFORNIA ST",
+    "580 California Ave",
+    "58 California St",
+    "61 Chattanooga St, San Francisco, CA",
+    "11 Main St",
+    "1 Main St",
+    "1 Main St, Unit 2",
+    "100 Main St",
+    "100-110 Main St",
+    "1000 Bush St, Apt. 4",
+    "Market St & 5th St",
+    "1200 Market St, San Francisco",
+    "Intersection Annie St, Stevenson St",
+]
+# Intended differences: the old filter's substring test let "1 Main St" match
+# "11 Main St", and it never expanded number ranges.
+CHANGED = {
+    ("1 Main St", "11 Main St"): False,
+    ("100 Main St Apt 4", "100-110 Main St"): True,
+}
+
+
+@pytest.mark.parametrize("target", TARGETS)
+def test_nearby_filter_parity_with_the_old_string_filter(target):
+    index = AddressIndex()
+    index.add(target, True)
+    for ticket in TICKETS:
+        expected = CHANGED.get((target, ticket), old_nearby_filter(target, ticket))
+        assert bool(index.lookup(ticket)) == expected, ticket
+
+
+def test_new_reports_store_the_ticket_address_columns():
+    statements = []
+
+    class RecordingSession:
+        def query(self, *entities):
+            return self
+
+        def filter(self, *criteria):
+            return iter(())
+
+        def execute(self, stmt):
+            statements.append(stmt)
+            return []
+
+        def commit(self):
+            pass
+
+    alert = Alert(id=7, user=User(id=1, phone="+14155550000"))
+    ticket = {"location": {"address": "580 California Street, San Francisco, CA 94104"}}
+    store_new_reports(RecordingSession(), {"r1": (alert, ticket)})
+
+    params = statements[0].compile().params
+    assert params["address_key_m0"] == "580 california st"
+    assert params["address_normalized_m0"] == "580 california st san francisco ca 94104"
+    assert params["address_key_version_m0"] == ADDRESS_KEY_VERSION
@@ -0,0 +1,81 @@
+"""SF 311 auth flows on the shared connection pool keep their cookies to themselves."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.sf311 import sf311_client
+from app.services.token_manager import TokenManager
+
+AUTH_PAGE = b"""
+<html><body>
+<form method="post" action="/auth/convey">
+  <input type="hidden" name="identity_provider_id" value="guest">
+  <input type="hidden" name="state" value="xyz">
+</form>
+</body></html>
+"""
+
+
+def sf311_server(seen):
+    """MockTransport handler for /auth -> /auth/convey -> /auth/callback -> /auth/token."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.method, request.url.path, request.headers.get("cookie")))
+        path = request.url.path
+        if path == "/auth":
+            return httpx.Response(200, content=AUTH_PAGE, headers={"set-cookie": "_spot_session=s1; Path=/"})
+        if path == "/auth/convey":
+            return httpx.Response(302, headers={"location": "/auth/callback", "set-cookie": "_spot_session=s2; Path=/"})
+        if path == "/auth/callback":
+            return httpx.Response(302, headers={"location": "sf311://auth?code=abc"})
+        if path == "/auth/token":
+            return httpx.Response(
+                200,
+                json={"token_type": "Bearer", "access_token": "at", "refresh_token": "rt", "expires_in": 3600},
+                headers={"set-cookie": "_spot_session=s3; Path=/"},
+            )
+        return httpx.Response(404)
+    return handler
+
+
+@pytest.fixture
+def pooled_client(monkeypatch):
+    """Point the shared sf311_client at a mock SF 311 server."""
+    seen = []
+    monkeypatch.setattr(sf311_client, "base_url", "https://sf311.test")
+    monkeypatch.setattr("app.services.token_manager.settings.SF311_BASE_URL", "https://sf311.test")
+    transport = httpx.MockTransport(sf311_server(seen))
+    monkeypatch.setattr(sf311_client, "_transport", transport)
+    monkeypatch.setattr(sf311_client, "_http", httpx.AsyncClient(transport=transport))
+    yield seen
+    asyncio.run(sf311_client.http.aclose())
+
+
+def test_acquire_flow_leaves_shared_cookie_jar_empty(pooled_client):
+    tokens = asyncio.run(TokenManager._acquire_new_token())
+
+    assert tokens["access_token"] == "at"
+    assert len(sf311_client.http.cookies) == 0
+    # The flow still carries its own session across steps
+    cookies = {path: cookie for _, path, cookie in pooled_client}
+    assert cookies["/auth"] is None
+    assert cookies["/auth/convey"] == "_spot_session=s1"
+    assert cookies["/auth/callback"] == "_spot_session=s2"
+
+
+def test_refresh_flow_leaves_shared_cookie_jar_empty(pooled_client):
+    tokens = asyncio.run(TokenManager._refresh_existing_token("old-rt"))
+
+    assert tokens["refresh_token"] == "rt"
+    assert len(sf311_client.http.cookies) == 0
+
+
+def test_concurrent_flows_do_not_share_cookies(pooled_client):
+    async def run_both():
+        await asyncio.gather(TokenManager._acquire_new_token(), TokenManager._acquire_new_token())
+
+    asyncio.run(run_both())
+
+    # Each flow starts without a session, even while the other one holds one
+    assert [cookie for _, path, cookie in pooled_client if path == "/auth"] == [None, None]
+    assert len(sf311_client.http.cookies) == 0
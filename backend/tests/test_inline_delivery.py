@@ -0,0 +1,40 @@
+"""Pipeline-mode delivery (POLL_NOTIFY_INLINE) combined with SMS digests."""
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services import sms_outbox
+
+
+def record_claims(monkeypatch):
+    claims = []
+
+    def fake_claim_batch(db, owner, limit=None, lease_seconds=None, report_ids=None):
+        claims.append(report_ids)
+        return []
+
+    monkeypatch.setattr(sms_outbox, "claim_batch", fake_claim_batch)
+    return claims
+
+
+def test_inline_delivery_is_skipped_and_logged_in_digest_mode(monkeypatch, caplog):
+    claims = record_claims(monkeypatch)
+    monkeypatch.setattr(settings, "SMS_DIGEST_ENABLED", True)
+
+    with caplog.at_level(logging.INFO, logger=sms_outbox.logger.name):
+        stats = asyncio.run(sms_outbox.deliver_reports(None, ["r1", "r2"]))
+
+    assert claims == []
+    assert stats.held_for_digest == 2
+    assert "2 left for the digest sweep" in stats.summary()
+    assert "Inline delivery skipped for 2 reports" in caplog.text
+
+
+def test_inline_delivery_claims_the_new_reports_without_digests(monkeypatch):
+    claims = record_claims(monkeypatch)
+    monkeypatch.setattr(settings, "SMS_DIGEST_ENABLED", False)
+
+    stats = asyncio.run(sms_outbox.deliver_reports(None, ["r1", "r2"]))
+
+    assert claims == [["r1", "r2"]]
+    assert stats.held_for_digest == 0
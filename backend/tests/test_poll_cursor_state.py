@@ -0,0 +1,74 @@
+"""High-water mark / endCursor transitions of next_cursor_state for both stream orders."""
+from datetime import datetime, timedelta
+
+from app.models import Alert, PollCursor
+from app.services.poller import AlertBucket, next_cursor_state
+from app.services.sf311 import TicketPage
+
+T0 = datetime(2026, 1, 1, 12, 0)
+T1 = T0 + timedelta(minutes=5)
+T2 = T0 + timedelta(minutes=10)
+
+
+def bucket(citywide, **cursor):
+    alert = Alert(id=1, latitude=37.78, longitude=-122.41, address="1 Market St", report_type_id="t")
+    return AlertBucket(
+        key="k",
+        report_type_id="t",
+        alerts=[alert],
+        citywide=citywide,
+        cursor=PollCursor(key="k", **cursor) if cursor else None,
+    )
+
+
+def page(truncated=False, end_cursor=None):
+    return TicketPage(tickets=[], end_cursor=end_cursor, has_next_page=truncated, truncated=truncated)
+
+
+# Cell (distance-ordered) buckets: only the mark is ever stored
+
+def test_cell_first_run_sets_mark():
+    assert next_cursor_state(bucket(False), page(), T1) == (T1, None, None)
+
+
+def test_cell_mark_advances_and_never_goes_back():
+    b = bucket(False, last_seen_at=T1)
+    assert next_cursor_state(b, page(), T2) == (T2, None, None)
+    assert next_cursor_state(b, page(), T0) == (T1, None, None)
+    assert next_cursor_state(b, page(), None) == (T1, None, None)
+
+
+def test_cell_truncated_run_keeps_mark_and_stores_no_cursor():
+    b = bucket(False, last_seen_at=T1)
+    assert next_cursor_state(b, page(truncated=True, end_cursor="c5"), T2) == (T1, None, None)
+
+
+def test_cell_clears_a_stored_end_cursor():
+    b = bucket(False, last_seen_at=T0, end_cursor="c9", catchup_seen_at=T1)
+    assert b.resume_cursor is None and b.catchup_seen_at is None
+    state = next_cursor_state(b, page(), T2)
+    assert state == (T2, None, None)
+    assert state != b.stored_state
+
+
+# Citywide (opened-order) buckets: truncated runs are caught up from end_cursor
+
+def test_citywide_complete_run_advances_mark():
+    b = bucket(True, last_seen_at=T0)
+    assert next_cursor_state(b, page(), T1) == (T1, None, None)
+
+
+def test_citywide_truncated_run_keeps_mark_and_saves_catchup():
+    b = bucket(True, last_seen_at=T0)
+    assert next_cursor_state(b, page(truncated=True, end_cursor="c5"), T2) == (T0, "c5", T2)
+
+
+def test_citywide_catchup_in_progress_moves_the_cursor_only():
+    b = bucket(True, last_seen_at=T0, end_cursor="c5", catchup_seen_at=T1)
+    assert b.resume_cursor == "c5"
+    assert next_cursor_state(b, page(truncated=True, end_cursor="c10"), T2) == (T0, "c10", T2)
+
+
+def test_citywide_finished_catchup_moves_mark_to_newest_seen():
+    b = bucket(True, last_seen_at=T0, end_cursor="c5", catchup_seen_at=T2)
+    assert next_cursor_state(b, page(), T1) == (T2, None, None)
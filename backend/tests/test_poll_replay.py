@@ -0,0 +1,138 @@
+"""Replay a distance-ordered SF 311 stream through the cell poller, run after run."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Alert, PollCursor
+from app.services.poller import (
+    AlertBucket,
+    fetch_bucket,
+    next_cursor_state,
+    next_ticket_rate,
+    tickets_after,
+    tickets_in_radius,
+)
+from app.services.sf311 import SF311Client, TicketPage
+from app.services.spatial_index import METERS_PER_DEGREE_LAT
+
+CENTER = (37.7800, -122.4100)
+START = datetime(2026, 1, 1, 12, 0)
+
+
+def ticket(ticket_id, meters_north, opened_at):
+    return {
+        "id": ticket_id,
+        "openedAt": opened_at.isoformat() + "Z",
+        "location": {
+            "address": f"{ticket_id} Market St",
+            "latitude": CENTER[0] + meters_north / METERS_PER_DEGREE_LAT,
+            "longitude": CENTER[1],
+        },
+    }
+
+
+class DistanceOrderedStream(SF311Client):
+    """SF311Client whose GraphQL page call serves an in-memory stream ordered by distance."""
+
+    def __init__(self, tickets):
+        super().__init__()
+        self.tickets = list(tickets)
+        self.calls = 0
+
+    def add(self, new_ticket):
+        self.tickets.append(new_ticket)
+
+    async def search_reports_page(self, latitude, longitude, limit=20, after=None, **kwargs):
+        self.calls += 1
+        ordered = sorted(
+            self.tickets,
+            key=lambda t: abs(t["location"]["latitude"] - latitude),
+        )
+        start = int(after or 0)
+        end = start + limit
+        return TicketPage(
+            tickets=ordered[start:end],
+            end_cursor=str(end),
+            has_next_page=end < len(ordered),
+        )
+
+
+def make_bucket():
+    alert = Alert(id=1, latitude=CENTER[0], longitude=CENTER[1], address="1 Market St", report_type_id="t")
+    return AlertBucket(key="t:cell", report_type_id="t", alerts=[alert])
+
+
+def poll(client, bucket):
+    """One cron run for one bucket: fetch, filter, and store the cursor like _poll_reports."""
+    client.calls = 0
+    page = asyncio.run(fetch_bucket(client, bucket))
+    tickets = tickets_in_radius(bucket, page.tickets)
+    reports, newest = tickets_after(tickets, bucket.last_seen_at)
+    last_seen_at, end_cursor, catchup_seen_at = next_cursor_state(bucket, page, newest)
+    old_rate = bucket.cursor.ticket_rate if bucket.cursor else None
+    bucket.cursor = PollCursor(
+        key=bucket.key,
+        last_seen_at=last_seen_at,
+        end_cursor=end_cursor,
+        catchup_seen_at=catchup_seen_at,
+        ticket_rate=next_ticket_rate(old_rate, len(tickets)),
+    )
+    return client.calls, page, [r["id"] for r in reports]
+
+
+@pytest.fixture
+def stream():
+    # 400 recently opened tickets: 3 near the alert, the rest 1-20 km away
+    near = [ticket(f"near{i}", 20 * i, START - timedelta(hours=i)) for i in range(3)]
+    far = [ticket(f"far{i}", 1_000 + 50 * i, START - timedelta(minutes=i)) for i in range(397)]
+    return DistanceOrderedStream(near + far)
+
+
+def test_quiet_cell_costs_one_call_per_run(stream):
+    bucket = make_bucket()
+
+    for run in range(6):
+        calls, page, reports = poll(stream, bucket)
+        assert calls == 1
+        assert not page.truncated
+        assert bucket.cursor.end_cursor is None
+        assert reports == (["near0", "near1", "near2"] if run == 0 else [])
+
+
+def test_new_nearby_ticket_is_picked_up_on_the_next_run(stream):
+    bucket = make_bucket()
+    poll(stream, bucket)
+
+    stream.add(ticket("fresh", 60, START + timedelta(minutes=5)))
+    calls, _, reports = poll(stream, bucket)
+
+    assert calls == 1
+    assert reports == ["fresh"]
+    assert bucket.last_seen_at == START + timedelta(minutes=5)
+
+
+def test_busy_cell_grows_its_pages_to_one_call(stream):
+    bucket = make_bucket()
+    for i in range(30):
+        stream.add(ticket(f"busy{i}", 60 + i, START - timedelta(days=1, minutes=i)))
+
+    first_calls, first_page, _ = poll(stream, bucket)
+    second_calls, second_page, _ = poll(stream, bucket)
+
+    # 33 tickets in radius: two default-size pages, then one page sized from the rate
+    assert first_calls == 2
+    assert second_calls == 1
+    assert not first_page.truncated and not second_page.truncated
+
+
+def test_cell_never_resumes_from_a_stored_end_cursor(stream):
+    bucket = make_bucket()
+    # Left behind by an older version that resumed cell sweeps
+    bucket.cursor = PollCursor(key=bucket.key, last_seen_at=START - timedelta(days=1), end_cursor="380")
+
+    calls, page, reports = poll(stream, bucket)
+
+    assert calls == 1
+    assert sorted(reports) == ["near0", "near1", "near2"]
+    assert bucket.cursor.end_cursor is None
@@ -0,0 +1,58 @@
+"""PollStats counts the GraphQL calls actually made, not one per bucket."""
+import asyncio
+import json
+
+import httpx
+
+from app.models import Alert
+from app.services.poller import AlertBucket, PollStats, fetch_bucket, fetch_buckets
+from app.services.sf311 import SF311Client
+
+
+def graphql_server(request: httpx.Request) -> httpx.Response:
+    """Type "busy" has three pages; type "flaky" fails on its second page."""
+    variables = json.loads(request.content)["variables"]
+    ticket_type = variables["filters"]["ticket_type_id"][0]
+    page = int(variables.get("after") or 0)
+    if ticket_type == "flaky" and page == 1:
+        return httpx.Response(500)
+    last = 2 if ticket_type == "busy" else 1
+    return httpx.Response(200, json={"data": {"tickets": {
+        "nodes": [{"id": f"{ticket_type}-{page}"}],
+        "pageInfo": {"endCursor": str(page + 1), "hasNextPage": page < last},
+    }}})
+
+
+def citywide_bucket(report_type_id, alert_count):
+    alerts = [
+        Alert(id=i, latitude=37.78, longitude=-122.41, address=f"{i} Market St", report_type_id=report_type_id)
+        for i in range(alert_count)
+    ]
+    return AlertBucket(
+        key=f"citywide:{report_type_id}",
+        report_type_id=report_type_id,
+        alerts=alerts,
+        citywide=True,
+        access_token="token",
+    )
+
+
+def test_upstream_calls_count_every_page_including_failed_fetches():
+    client = SF311Client()
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(graphql_server))
+    stats = PollStats(alerts=10)
+    buckets = [citywide_bucket("busy", 6), citywide_bucket("flaky", 4)]
+
+    async def run():
+        try:
+            return await fetch_buckets(buckets, lambda bucket: fetch_bucket(client, bucket), stats)
+        finally:
+            await client.aclose()
+
+    results = dict((bucket.report_type_id, result) for bucket, result in asyncio.run(run()))
+
+    assert results["busy"].pages == 3
+    assert isinstance(results["flaky"], httpx.HTTPStatusError)
+    # 3 pages + the flaky bucket's good page and its failed one
+    assert stats.upstream_calls == 5
+    assert stats.calls_saved == 5
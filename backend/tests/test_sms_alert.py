@@ -0,0 +1,63 @@
+"""SMS alert formatting: address shortening and the GSM-7 one-segment template."""
+import pytest
+
+from app.core.config import settings
+from app.services.sms_alert import _short_address, sms_alert_service
+from app.services.sms_encoding import GSM7, segment_info
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("580 California Street, San Francisco, CA 94104", "580 California St"),
+        ("100 Park Avenue", "100 Park Ave"),
+        ("Long Street Name Blvd", "Long Street Name Blvd"),
+        ("Mission Street & 16th Street", "Mission Street & 16th St"),
+        ("100 Main Street Apt 4", "100 Main St Apt 4"),
+        ("1 Market Street #200", "1 Market St #200"),
+        ("Streetview Ave", "Streetview Ave"),
+    ],
+)
+def test_short_address_abbreviates_only_the_street_type(address, expected):
+    assert _short_address(address) == expected
+
+
+def ticket(n, address, ticket_type="Street and Sidewalk Cleaning - Human or Animal Waste"):
+    return {
+        "publicId": f"10{n:07d}",
+        "ticketType": {"name": ticket_type},
+        "location": {"address": address},
+        "submittedAt": "2026-10-17T14:05:00Z",
+        "status": "open",
+    }
+
+
+LONG_ADDRESS = "2750 Martin Luther King Junior Boulevard Apartment 1204, San Francisco, CA 94124"
+
+
+@pytest.mark.parametrize(
+    "reports",
+    [
+        [ticket(1, "580 California Street, San Francisco, CA 94104")],
+        [ticket(2, LONG_ADDRESS, ticket_type="Encampment – “tent” blocking sidewalk 🚫 " * 3)],
+        [ticket(n, LONG_ADDRESS) for n in range(12)],
+    ],
+    ids=["single", "single-long", "digest"],
+)
+def test_gsm7_template_fits_one_segment(monkeypatch, reports):
+    monkeypatch.setattr(settings, "SMS_ENCODING", GSM7)
+
+    message = sms_alert_service._format_alert_message(reports)
+
+    assert segment_info(message) == (GSM7, 1)
+
+
+def test_gsm7_digest_counts_the_reports_it_could_not_fit(monkeypatch):
+    monkeypatch.setattr(settings, "SMS_ENCODING", GSM7)
+    reports = [ticket(n, LONG_ADDRESS) for n in range(12)]
+
+    message = sms_alert_service._format_alert_message(reports)
+
+    listed = sum(1 for line in message.splitlines() if line.startswith("- "))
+    assert listed < len(reports)
+    assert message.splitlines()[-1] == f"+{len(reports) - listed} more"
@@ -0,0 +1,157 @@
+"""SMS outbox: claim statement shape and pure send-path helpers."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from twilio.base.exceptions import TwilioRestException
+
+from app.core.config import settings
+from app.models import Alert, Report, SMSStatus, User
+from app.services import sms_outbox
+from app.services.sms_dispatcher import is_permanent_failure
+
+
+def compiled_claim(**kwargs):
+    statements = []
+
+    class RecordingSession:
+        def execute(self, stmt):
+            statements.append(stmt)
+            return []
+
+        def commit(self):
+            pass
+
+    sms_outbox.claim_batch(RecordingSession(), "owner", **kwargs)
+    return str(statements[0].compile(dialect=postgresql.dialect()))
+
+
+def test_claim_leases_released_siblings_of_the_batch_users():
+    sql = compiled_claim(limit=10)
+
+    # Seeds are capped and skip-locked; each seed user's released reports come along
+    assert "WITH claimed AS" in sql and "LIMIT" in sql
+    assert "companions AS" in sql
+    assert "deliver_after IS NOT NULL" in sql
+    assert "alerts.user_id IN" in sql
+    assert sql.count("SKIP LOCKED") == 2
+    assert "FROM claimed UNION SELECT companions.id" in sql
+
+
+# build_jobs: quiet-hour deferral and the per-user hourly cap
+
+def make_report(report_id, user, deliver_after=None, priority=1):
+    alert = Alert(id=report_id, active=True, user=user)
+    return Report(
+        id=report_id,
+        alert=alert,
+        report_id=f"r{report_id}",
+        report_data={"publicId": f"10{report_id}", "ticketType": {"name": "Graffiti"}},
+        sms_status=SMSStatus.PENDING,
+        sms_priority=priority,
+        deliver_after=deliver_after,
+        lease_owner="owner",
+    )
+
+
+def make_user(user_id, **fields):
+    return User(id=user_id, phone=f"+1415555{user_id:04d}", verified=True, **fields)
+
+
+def build(monkeypatch, reports, sent_recently=None, quiet=None):
+    monkeypatch.setattr(sms_outbox, "recent_message_counts", lambda db, user_ids, since: sent_recently or {})
+    monkeypatch.setattr(sms_outbox, "quiet_until", lambda start, end, tz: (quiet or {}).get(start))
+    stats = sms_outbox.OutboxStats()
+    return sms_outbox.build_jobs(None, reports, stats), stats
+
+
+def test_build_jobs_defers_users_in_quiet_hours(monkeypatch):
+    until = datetime(2026, 1, 2, 7, 0)
+    quiet_user = make_user(1, quiet_hours_start="22:00", quiet_hours_end="07:00")
+    awake_user = make_user(2)
+    quiet_report, awake_report = make_report(1, quiet_user), make_report(2, awake_user)
+
+    jobs, stats = build(monkeypatch, [quiet_report, awake_report], quiet={"22:00": until})
+
+    assert [job.reports for job in jobs] == [[awake_report]]
+    assert stats.deferred == 1
+    assert quiet_report.sms_status == SMSStatus.DEFERRED
+    assert quiet_report.deliver_after == until
+    assert quiet_report.lease_owner is None
+
+
+def test_build_jobs_caps_each_user_per_hour(monkeypatch):
+    monkeypatch.setattr(settings, "SMS_USER_MAX_PER_HOUR", 2)
+    busy, fresh = make_user(1), make_user(2)
+    busy_reports = [make_report(n, busy) for n in (1, 2, 3)]
+    fresh_reports = [make_report(n, fresh) for n in (4, 5, 6)]
+
+    jobs, stats = build(monkeypatch, busy_reports + fresh_reports, sent_recently={1: 1, 2: 0})
+
+    assert [job.reports for job in jobs] == [[busy_reports[0]], [fresh_reports[0]], [fresh_reports[1]]]
+    assert stats.capped == 3
+    # Capped reports keep their lease for a later run
+    assert all(report.lease_owner == "owner" for report in busy_reports[1:] + fresh_reports[2:])
+
+
+def test_build_jobs_sends_released_reports_as_one_message_within_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "SMS_USER_MAX_PER_HOUR", 1)
+    user = make_user(1)
+    released = [make_report(n, user, deliver_after=datetime(2026, 1, 2, 7, 0)) for n in (1, 2)]
+    new = make_report(3, user)
+
+    jobs, stats = build(monkeypatch, released + [new])
+
+    assert [job.reports for job in jobs] == [released]
+    assert stats.capped == 1
+
+
+def test_build_jobs_puts_the_paid_lane_first(monkeypatch):
+    jobs, _ = build(monkeypatch, [make_report(1, make_user(1), priority=1), make_report(2, make_user(2), priority=0)])
+    assert [job.priority for job in jobs] == [0, 1]
+
+
+# Retry backoff and permanent-failure classification
+
+@pytest.mark.parametrize("attempts, base_delay", [(0, 60), (1, 60), (2, 120), (4, 480), (9, 15360), (10, 6 * 3600), (30, 6 * 3600)])
+def test_retry_delay_is_jittered_exponential_backoff_with_a_cap(monkeypatch, attempts, base_delay):
+    monkeypatch.setattr(settings, "SMS_RETRY_BASE_SECONDS", 60)
+    monkeypatch.setattr(settings, "SMS_RETRY_MAX_SECONDS", 6 * 3600)
+    delays = [sms_outbox.retry_delay(attempts).total_seconds() for _ in range(200)]
+    assert 0.8 * base_delay <= min(delays) <= max(delays) <= 1.2 * base_delay
+
+
+@pytest.mark.parametrize(
+    "error, permanent",
+    [
+        (TwilioRestException(400, "/Messages", code=21211), True),  # invalid 'To' number
+        (TwilioRestException(400, "/Messages", code=21610), True),  # recipient opted out
+        (TwilioRestException(400, "/Messages", code=30006), True),  # landline
+        (TwilioRestException(404, "/Messages"), True),
+        (TwilioRestException(429, "/Messages", code=20429), False),
+        (TwilioRestException(400, "/Messages", code=20429), False),
+        (TwilioRestException(401, "/Messages", code=20003), False),
+        (TwilioRestException(403, "/Messages"), False),
+        (TwilioRestException(500, "/Messages"), False),
+        (TwilioRestException(503, "/Messages"), False),
+        (ConnectionError("reset"), False),
+        (TimeoutError(), False),
+    ],
+)
+def test_is_permanent_failure(error, permanent):
+    assert is_permanent_failure(error) is permanent
+
+
+def test_record_failure_retries_transient_errors_and_dead_letters_permanent_ones():
+    stats = sms_outbox.OutboxStats()
+    transient = Report(id=1, sms_attempts=1, lease_owner="owner")
+    permanent = Report(id=2, sms_attempts=1, lease_owner="owner")
+    exhausted = Report(id=3, sms_attempts=settings.SMS_MAX_ATTEMPTS, lease_owner="owner")
+
+    sms_outbox.record_failure(transient, TwilioRestException(503, "/Messages"), stats)
+    sms_outbox.record_failure(permanent, TwilioRestException(400, "/Messages", code=21211), stats)
+    sms_outbox.record_failure(exhausted, TwilioRestException(503, "/Messages"), stats)
+
+    assert transient.sms_next_attempt_at is not None and transient.lease_owner is None
+    assert permanent.sms_status == exhausted.sms_status == SMSStatus.DEAD
+    assert (stats.retried, stats.dead) == (1, 2)
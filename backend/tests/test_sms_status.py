@@ -0,0 +1,65 @@
+"""Twilio status callbacks: collapsing out-of-order events and requeueing failures."""
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.models import Report, SMSStatus
+from app.services.sms_status import StatusStats, collapse_events, requeue_failed
+
+
+def events(*rows):
+    return [SimpleNamespace(message_sid=sid, status=status, error_code=code) for sid, status, code in rows]
+
+
+def test_collapse_keeps_the_furthest_state_regardless_of_arrival_order():
+    latest = collapse_events(events(
+        ("SM1", "delivered", None),
+        ("SM1", "sent", None),
+        ("SM1", "queued", None),
+        ("SM2", "sending", None),
+        ("SM2", "undelivered", 30003),
+        ("SM2", "sent", None),
+    ))
+    assert latest == {"SM1": ("delivered", None), "SM2": ("undelivered", 30003)}
+
+
+def test_collapse_later_event_wins_a_tie_and_read_beats_delivered():
+    assert collapse_events(events(("SM1", "delivered", None), ("SM1", "failed", 30008))) == {
+        "SM1": ("failed", 30008)
+    }
+    assert collapse_events(events(("SM1", "read", None), ("SM1", "delivered", None))) == {"SM1": ("read", None)}
+
+
+def test_collapse_ranks_unknown_statuses_below_everything():
+    assert collapse_events(events(("SM1", "queued", None), ("SM1", "unknown", None))) == {"SM1": ("queued", None)}
+
+
+def sent_report(attempts=1):
+    return Report(id=1, sms_status=SMSStatus.SENT, sms_sent=True, sms_attempts=attempts, lease_owner="owner")
+
+
+def test_requeue_failed_reschedules_transient_failures():
+    stats = StatusStats()
+    report = sent_report()
+    requeue_failed(report, "undelivered", 30008, stats)
+
+    assert report.sms_status == SMSStatus.PENDING
+    assert report.sms_sent is False and report.sms_next_attempt_at is not None
+    assert report.sms_last_error == "Twilio undelivered (error 30008)"
+    assert (stats.requeued, stats.dead) == (1, 0)
+
+
+def test_requeue_failed_dead_letters_permanent_codes_and_exhausted_reports():
+    stats = StatusStats()
+    permanent, exhausted = sent_report(), sent_report(attempts=settings.SMS_MAX_ATTEMPTS)
+    requeue_failed(permanent, "failed", 30006, stats)
+    requeue_failed(exhausted, "undelivered", None, stats)
+
+    assert permanent.sms_status == exhausted.sms_status == SMSStatus.DEAD
+    assert (stats.requeued, stats.dead) == (0, 2)
+
+
+def test_requeue_failed_leaves_reports_that_moved_on():
+    stats = StatusStats()
+    report = Report(id=1, sms_status=SMSStatus.CANCELLED, sms_sent=True)
+    requeue_failed(report, "failed", None, stats)
+    assert report.sms_status == SMSStatus.CANCELLED and report.sms_sent is True
@@ -0,0 +1,128 @@
+"""AlertSpatialIndex: sync/overlay/tombstone bookkeeping and the haversine radius boundary."""
+import math
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import spatial_index
+from app.services.spatial_index import EARTH_RADIUS_M, AlertSpatialIndex, haversine_meters
+
+LAT, LNG = 37.7793, -122.4193
+T0 = datetime(2026, 1, 1, 12, 0)
+
+
+def alert(alert_id, lat=LAT, lng=LNG, report_type_id="t", updated_at=T0):
+    return SimpleNamespace(
+        id=alert_id, latitude=lat, longitude=lng, report_type_id=report_type_id, updated_at=updated_at
+    )
+
+
+def destination(lat, lng, meters, bearing_deg):
+    """Point `meters` away along a great circle (inverse of haversine_meters)."""
+    delta = meters / EARTH_RADIUS_M
+    theta = math.radians(bearing_deg)
+    phi1, lam1 = math.radians(lat), math.radians(lng)
+    phi2 = math.asin(math.sin(phi1) * math.cos(delta) + math.cos(phi1) * math.sin(delta) * math.cos(theta))
+    lam2 = lam1 + math.atan2(
+        math.sin(theta) * math.sin(delta) * math.cos(phi1), math.cos(delta) - math.sin(phi1) * math.sin(phi2)
+    )
+    return math.degrees(phi2), math.degrees(lam2)
+
+
+def test_sync_rebuilds_only_when_the_generation_changes():
+    index = AlertSpatialIndex()
+    alerts = [alert(1), alert(2, lat=LAT + 0.01)]
+
+    assert index.sync(alerts) is True
+    assert index.sync(alerts) is False
+    assert sorted(index.within(LAT, LNG, 100)) == [1]
+
+    # Another instance edited alert 2
+    alerts[1] = alert(2, lat=LAT, updated_at=T0 + timedelta(minutes=1))
+    assert index.sync(alerts) is True
+    assert sorted(index.within(LAT, LNG, 100)) == [1, 2]
+
+
+def test_overlay_and_tombstones_after_sync():
+    index = AlertSpatialIndex()
+    index.sync([alert(1), alert(2)])
+
+    moved = alert(1, lat=LAT + 0.01, updated_at=T0 + timedelta(minutes=1))
+    index.upsert(moved)
+    index.upsert(alert(3, updated_at=T0 + timedelta(minutes=2)))
+    index.remove(2)
+
+    assert index._tombstones == {1, 2}
+    assert set(index._overlay) == {1, 3}
+    assert sorted(index.within(LAT, LNG, 100)) == [3]
+    assert index.within(LAT + 0.01, LNG, 100) == [1]
+    assert len(index) == 2
+
+    # The DB now holds exactly what the incremental updates produced: no rebuild
+    db_alerts = [moved, alert(3, updated_at=T0 + timedelta(minutes=2))]
+    assert index.generation == spatial_index.alert_generation(db_alerts)
+    assert index.sync(db_alerts) is False
+    assert index._tombstones == {1, 2}
+
+
+def test_rebuild_clears_the_overlay():
+    index = AlertSpatialIndex()
+    index.sync([alert(1)])
+    index.upsert(alert(2, updated_at=T0 + timedelta(minutes=1)))
+
+    assert index.sync([alert(1), alert(5)]) is True
+    assert index._overlay == {} and index._tombstones == set()
+    assert sorted(index.within(LAT, LNG, 10)) == [1, 5]
+
+
+def test_overlay_is_compacted_past_the_threshold(monkeypatch):
+    monkeypatch.setattr(spatial_index, "COMPACT_THRESHOLD", 2)
+    index = AlertSpatialIndex()
+    index.sync([alert(1)])
+    for alert_id in (2, 3, 4):
+        index.upsert(alert(alert_id))
+
+    assert index._overlay == {} and index._tombstones == set()
+    assert sorted(index.within(LAT, LNG, 10)) == [1, 2, 3, 4]
+
+
+def test_upserts_before_the_first_sync_are_ignored():
+    index = AlertSpatialIndex()
+    index.upsert(alert(1))
+    index.remove(1)
+    assert not index.loaded and len(index) == 0
+
+
+def test_report_type_filter():
+    index = AlertSpatialIndex()
+    index.sync([alert(1, report_type_id="a"), alert(2, report_type_id="b")])
+    assert index.within(LAT, LNG, 10, report_type_id="a") == [1]
+    assert index.within(LAT, LNG, 10, report_type_id="unknown") == []
+
+
+@pytest.mark.parametrize("bearing", [0, 45, 90, 135, 180, 225, 270, 315])
+@pytest.mark.parametrize("overlay", [False, True], ids=["arrays", "overlay"])
+def test_matches_exactly_at_the_radius_boundary(bearing, overlay):
+    radius = settings.POLL_MATCH_RADIUS_M
+    index = AlertSpatialIndex()
+    points = {
+        1: destination(LAT, LNG, radius * (1 - 1e-9), bearing),
+        2: destination(LAT, LNG, radius * (1 + 1e-6), bearing),
+    }
+    alerts = [alert(alert_id, lat, lng) for alert_id, (lat, lng) in points.items()]
+    if overlay:
+        index.sync([])
+        for a in alerts:
+            index.upsert(a)
+    else:
+        index.sync(alerts)
+
+    found = index.within(LAT, LNG, radius)
+
+    # The index agrees with haversine_meters on both sides of the boundary
+    assert found == [
+        alert_id for alert_id, (lat, lng) in points.items() if haversine_meters(LAT, LNG, lat, lng) <= radius
+    ]
+    assert found == [1]
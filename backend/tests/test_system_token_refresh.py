@@ -0,0 +1,113 @@
+"""System token refresh: single-flight across instances without touching the caller's session."""
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from app.services import token_manager
+from app.services.token_manager import TokenManager, system_token_pool
+
+
+def token(name, obtained_at, expires_in=3600):
+    return {"access_token": name, "refresh_token": f"{name}-rt", "expires_in": expires_in, "obtained_at": obtained_at}
+
+
+def row(token_data):
+    return SimpleNamespace(value=json.dumps(token_data), last_updated_timestamp=token_data["obtained_at"])
+
+
+@pytest.fixture
+def env(monkeypatch):
+    """Fake DB rows, advisory lock, SF 311 refresh and CAS; returns the shared state."""
+    now = int(time.time())
+    state = SimpleNamespace(
+        rows=[],  # successive _read_system_config results (last one repeats)
+        lock_results=[],  # successive pg_try_advisory_lock results
+        lock_exits=0,
+        refreshed=[],
+        swapped=[],
+        stale=row(token("old", now - 4000)),
+    )
+
+    def read(slot):
+        return state.rows.pop(0) if len(state.rows) > 1 else state.rows[0]
+
+    @contextmanager
+    def lock(slot):
+        locked = state.lock_results.pop(0)
+        try:
+            yield locked
+        finally:
+            state.lock_exits += 1
+
+    async def refresh(refresh_token):
+        state.refreshed.append(refresh_token)
+        return token("new", now)
+
+    def swap(slot, seen_timestamp, token_data):
+        state.swapped.append(seen_timestamp)
+        return None
+
+    monkeypatch.setattr(token_manager, "_read_system_config", read)
+    monkeypatch.setattr(token_manager, "_system_token_lock", lock)
+    monkeypatch.setattr(token_manager, "REFRESH_POLL_SECONDS", 0)
+    monkeypatch.setattr(TokenManager, "_refresh_existing_token", staticmethod(refresh))
+    monkeypatch.setattr(TokenManager, "_swap_system_token", staticmethod(swap))
+    system_token_pool.invalidate()
+    yield state
+    system_token_pool.invalidate()
+
+
+def caller_session(config):
+    """Request session whose only allowed use is reading the slot's row."""
+    db = mock.MagicMock()
+    db.query.return_value.filter.return_value.populate_existing.return_value.first.return_value = config
+    return db
+
+
+def test_refresh_holds_the_lock_and_leaves_the_caller_session_alone(env):
+    env.rows = [env.stale]
+    env.lock_results = [True]
+    db = caller_session(env.stale)
+
+    access_token = asyncio.run(TokenManager.get_system_token(db))
+
+    assert access_token == "new"
+    assert env.refreshed == ["old-rt"]
+    assert env.swapped == [env.stale.last_updated_timestamp]
+    assert env.lock_exits == 1
+    db.rollback.assert_not_called()
+    db.commit.assert_not_called()
+    db.execute.assert_not_called()
+
+
+def test_waits_for_another_instance_and_reuses_its_token(env):
+    fresh = row(token("theirs", int(time.time())))
+    env.rows = [env.stale, env.stale, fresh]
+    env.lock_results = [False, False]
+    db = caller_session(env.stale)
+
+    access_token = asyncio.run(TokenManager.get_system_token(db))
+
+    assert access_token == "theirs"
+    assert env.refreshed == []
+    db.rollback.assert_not_called()
+
+
+def test_lock_is_released_when_the_refresh_fails(env, monkeypatch):
+    env.rows = [env.stale]
+    env.lock_results = [True]
+
+    async def fail(*args):
+        raise RuntimeError("SF 311 down")
+
+    monkeypatch.setattr(TokenManager, "_refresh_existing_token", staticmethod(fail))
+    monkeypatch.setattr(TokenManager, "_acquire_new_token", staticmethod(fail))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(TokenManager.get_system_token(caller_session(env.stale)))
+    assert env.lock_exits == 1
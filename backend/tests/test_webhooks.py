@@ -0,0 +1,64 @@
+"""Twilio status callback: disabled without TWILIO_STATUS_CALLBACK_URL, signature-checked with it."""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from twilio.request_validator import RequestValidator
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.routes import webhooks
+
+CALLBACK_URL = "https://example.test/webhooks/twilio/status"
+PARAMS = {"MessageSid": "SM123", "MessageStatus": "delivered"}
+
+
+def make_client():
+    app = FastAPI()
+    app.include_router(webhooks.router)
+    app.dependency_overrides[get_db] = lambda: None
+    return TestClient(app)
+
+
+def fake_record(recorded):
+    return lambda db, params: recorded.append(params)
+
+
+def test_rejects_callbacks_when_callback_url_unset(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(settings, "TWILIO_STATUS_CALLBACK_URL", None)
+    monkeypatch.setattr(webhooks, "record_status_event", fake_record(recorded))
+
+    response = make_client().post("/webhooks/twilio/status", data=PARAMS)
+
+    assert response.status_code == 404
+    assert recorded == []
+
+
+def test_rejects_bad_signature(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(settings, "TWILIO_STATUS_CALLBACK_URL", CALLBACK_URL)
+    monkeypatch.setattr(webhooks, "record_status_event", fake_record(recorded))
+
+    response = make_client().post(
+        "/webhooks/twilio/status",
+        data=PARAMS,
+        headers={"X-Twilio-Signature": "forged"},
+    )
+
+    assert response.status_code == 403
+    assert recorded == []
+
+
+def test_records_signed_callback(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(settings, "TWILIO_STATUS_CALLBACK_URL", CALLBACK_URL)
+    monkeypatch.setattr(webhooks, "record_status_event", fake_record(recorded))
+    signature = RequestValidator(settings.TWILIO_AUTH_TOKEN).compute_signature(CALLBACK_URL, PARAMS)
+
+    response = make_client().post(
+        "/webhooks/twilio/status",
+        data=PARAMS,
+        headers={"X-Twilio-Signature": signature},
+    )
+
+    assert response.status_code == 204
+    assert recorded == [PARAMS]